@@ -0,0 +1,111 @@
+"""Module for deleting leftover test tables"""
+
+from __future__ import annotations
+
+import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from bquest.scheduler import TableOperationScheduler, get_default_scheduler
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery as bq
+else:
+    bq = lazy_import("google.cloud.bigquery")
+
+
+class TableFilter:
+    """
+    Selects tables by labels, age and name prefix, a table has to match all given criteria.
+    """
+
+    def __init__(
+        self,
+        labels: Optional[Dict[str, Optional[str]]] = None,
+        older_than: Optional[datetime.timedelta] = None,
+        prefix: Optional[str] = None,
+    ) -> None:
+        """
+
+        Args:
+            labels: label keys mapped to their required value, None only requires the label to be present
+                e.g. {"bquest_run": None, "bquest_session": "nightly"}
+            older_than: minimal age of the tables
+            prefix: prefix of the table names
+        """
+        if not labels and older_than is None and not prefix:
+            raise ValueError("At least one of 'labels', 'older_than' or 'prefix' is required.")
+
+        self._labels = labels or {}
+        self._older_than = older_than
+        self._prefix = prefix
+        self._now = datetime.datetime.now(datetime.timezone.utc)
+
+    def matches(self, table: Any) -> bool:
+        """Checks if a table matches the filter
+
+        Args:
+            table: table as listed by the BigQuery client, e.g. bigquery.table.TableListItem
+
+        Returns:
+            bool if the table matches all criteria
+        """
+        if self._prefix and not table.table_id.startswith(self._prefix):
+            return False
+        table_labels = table.labels or {}
+        for key, value in self._labels.items():
+            if key not in table_labels or (value is not None and table_labels[key] != value):
+                return False
+        if self._older_than is not None:
+            return table.created is not None and table.created <= self._now - self._older_than
+        return True
+
+
+def collect_garbage(
+    bq_client: bq.Client,
+    dataset: str,
+    table_filter: TableFilter,
+    max_workers: int = 8,
+    page_size: int = 1000,
+    scheduler: Optional[TableOperationScheduler] = None,
+    dry_run: bool = False,
+) -> List[str]:
+    """Deletes the tables of a dataset which match a filter
+
+    The dataset is listed page by page and the deletes of a page run in parallel while the next page
+    is listed. The deletes go through the table operation scheduler, which keeps them within the rate
+    limits of the dataset.
+
+    Args:
+        bq_client: BigQuery client for interacting with BigQuery
+        dataset: fully qualified dataset, e.g. my-project.bquest
+        table_filter: selects the tables which are deleted
+        max_workers: number of parallel deletes
+        page_size: number of tables listed per request
+        scheduler: scheduler of the deletes, the shared default scheduler if None
+        dry_run: only returns the matching tables without deleting them
+
+    Returns:
+        fully qualified ids of the deleted tables
+    """
+    scheduler = scheduler or get_default_scheduler()
+    matching: List[str] = []
+    futures: List[Future] = []
+
+    def delete(table_id: str) -> None:
+        # tables may expire or be deleted by a concurrent sweep in the meantime
+        scheduler.run(dataset, lambda _: bq_client.delete_table(table_id, not_found_ok=True))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for table in bq_client.list_tables(dataset, page_size=page_size):
+            if not table_filter.matches(table):
+                continue
+            table_id = f"{table.project}.{table.dataset_id}.{table.table_id}"
+            matching.append(table_id)
+            if not dry_run:
+                futures.append(executor.submit(delete, table_id))
+
+    for future in futures:
+        future.result()
+    return matching
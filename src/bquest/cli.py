@@ -0,0 +1,79 @@
+"""Command-line interface of bquest"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from bquest.cleanup import TableFilter, collect_garbage
+from bquest.scheduler import TableOperationScheduler
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery as bq
+else:
+    bq = lazy_import("google.cloud.bigquery")
+
+
+def _parse_labels(labels: List[str]) -> Dict[str, Optional[str]]:
+    parsed: Dict[str, Optional[str]] = {}
+    for label in labels:
+        key, separator, value = label.partition("=")
+        parsed[key] = value if separator else None
+    return parsed
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="bquest")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    gc_parser = subparsers.add_parser("gc", help="delete leftover test tables")
+    gc_parser.add_argument("datasets", nargs="+", help="datasets to sweep, e.g. bquest or my-project.bquest")
+    gc_parser.add_argument("--project", help="project of the BigQuery client and of datasets without a project")
+    gc_parser.add_argument(
+        "--label",
+        action="append",
+        default=[],
+        help="key=value or key of a label the tables need to have, can be repeated, e.g. bquest_run",
+    )
+    gc_parser.add_argument("--older-than-hours", type=float, help="minimal age of the tables in hours")
+    gc_parser.add_argument("--prefix", help="prefix of the table names")
+    gc_parser.add_argument("--workers", type=int, default=8, help="number of parallel deletes")
+    gc_parser.add_argument("--operations-per-second", type=float, default=5.0, help="deletes per second and dataset")
+    gc_parser.add_argument("--dry-run", action="store_true", help="only list the tables that would be deleted")
+    return parser
+
+
+def _run_gc(args: argparse.Namespace) -> None:
+    table_filter = TableFilter(
+        labels=_parse_labels(args.label),
+        older_than=datetime.timedelta(hours=args.older_than_hours) if args.older_than_hours is not None else None,
+        prefix=args.prefix,
+    )
+    bq_client = bq.Client(project=args.project)
+    scheduler = TableOperationScheduler(operations_per_second=args.operations_per_second)
+
+    for dataset in args.datasets:
+        fq_dataset = dataset if "." in dataset else f"{bq_client.project}.{dataset}"
+        table_ids = collect_garbage(
+            bq_client, fq_dataset, table_filter, max_workers=args.workers, scheduler=scheduler, dry_run=args.dry_run
+        )
+        if args.dry_run:
+            for table_id in table_ids:
+                print(table_id)  # noqa: T201
+        print(f"{'Found' if args.dry_run else 'Deleted'} {len(table_ids)} tables in {fq_dataset}.")  # noqa: T201
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Entry point of the bquest command
+
+    Args:
+        argv: command-line arguments, sys.argv if None
+    """
+    args = _create_parser().parse_args(argv)
+    if args.command == "gc":
+        try:
+            _run_gc(args)
+        except ValueError as e:
+            raise SystemExit(f"bquest gc: {e}") from e
@@ -1,13 +1,43 @@
 """Helpers for dealing with pandas.DataFrames"""
 
-from typing import Any
+from __future__ import annotations
 
-import numpy as np
-import pandas
-import pandas as pd
-from pandas import testing as pd_test
+import os
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Tuple, Union
 
-POSSIBLE_INTEGER_DTYPES = (int, pd.Int8Dtype, pd.Int16Dtype, pd.Int32Dtype, pd.Int64Dtype)
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from pandas import testing as pd_test
+else:
+    np = lazy_import("numpy")
+    pandas = pd = lazy_import("pandas")
+    pa = lazy_import("pyarrow")
+    pc = lazy_import("pyarrow.compute")
+    pq = lazy_import("pyarrow.parquet")
+    pd_test = lazy_import("pandas.testing")
+
+SNAPSHOT_HASH_KEY = b"bquest.content_hash"
+UPDATE_SNAPSHOTS_ENV_VAR = "BQUEST_UPDATE_SNAPSHOTS"
+TRUTHY_VALUES = ("1", "true", "yes", "on")
+
+
+def _possible_integer_dtypes() -> Tuple[Any, ...]:
+    return (int, pd.Int8Dtype, pd.Int16Dtype, pd.Int32Dtype, pd.Int64Dtype)
+
+
+def __getattr__(name: str) -> Any:
+    # POSSIBLE_INTEGER_DTYPES needs pandas, which is only imported on first use
+    if name == "POSSIBLE_INTEGER_DTYPES":
+        return _possible_integer_dtypes()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def standardize_frame_numerics(df: pandas.DataFrame, float_precision: int = 2) -> pandas.DataFrame:
@@ -23,7 +53,7 @@ def standardize_frame_numerics(df: pandas.DataFrame, float_precision: int = 2) -
     """
     df = df.round(float_precision)
 
-    integer_columns = df.select_dtypes(POSSIBLE_INTEGER_DTYPES).columns
+    integer_columns = df.select_dtypes(_possible_integer_dtypes()).columns
 
     for col in integer_columns:
         df[col] = df[col].astype(float)
@@ -40,14 +70,94 @@ def _fix_integer_dtypes(df: pandas.DataFrame) -> None:
     df[df.select_dtypes("Int64").columns] = df[df.select_dtypes("Int64").columns].astype("Int64")
 
 
-def assert_frame_equal(left: pandas.DataFrame, right: pandas.DataFrame, **kwargs: Any) -> None:
+def _is_polars_frame(df: Any) -> bool:
+    return type(df).__module__.split(".")[0] == "polars"
+
+
+def _pandas_to_arrow(df: pandas.DataFrame) -> pa.Table:
+    """Converts a dataframe to an Arrow table, strings are always typed as BigQuery returns them"""
+    table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(None)
+    # newer pandas versions convert their string dtype to large strings
+    schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_large_string(f.type) else f for f in table.schema])
+    return table.cast(schema)
+
+
+def _assert_arrow_tables_equal(
+    left: pa.Table, right: pa.Table, check_dtype: bool = True, rtol: float = 1e-5, atol: float = 1e-8
+) -> None:
+    """Asserts that two Arrow tables are equal regardless of their order of rows and columns
+
+    Args:
+        left: An Arrow table, usually the result of a function under test
+        right: Another Arrow table, usually what we expect in a test
+        check_dtype: Whether to check that the column types are identical
+        rtol: Relative tolerance for floating point columns
+        atol: Absolute tolerance for floating point columns
+    """
+    if sorted(left.column_names) != sorted(right.column_names):
+        raise AssertionError(f"Columns differ: {sorted(left.column_names)} != {sorted(right.column_names)}")
+    if left.num_rows != right.num_rows:
+        raise AssertionError(f"Number of rows differ: {left.num_rows} != {right.num_rows}")
+
+    columns = sorted(left.column_names)
+    left = left.select(columns)
+    right = right.select(columns)
+    if check_dtype and not left.schema.equals(right.schema):
+        raise AssertionError(f"Schemas differ:\n{left.schema}\n!=\n{right.schema}")
+    if not check_dtype:
+        right = right.cast(left.schema)
+
+    # nested columns can't be sorted by, rows only differing in those have to be in the same order
+    sort_keys = [(column, "ascending") for column in columns if not pa.types.is_nested(left.schema.field(column).type)]
+    left = left.sort_by(sort_keys)
+    right = right.sort_by(sort_keys)
+    for column in columns:
+        left_column, right_column = left.column(column), right.column(column)
+        if pa.types.is_floating(left_column.type):
+            close = pc.or_(
+                pc.less_equal(
+                    pc.abs(pc.subtract(left_column, right_column)),
+                    pc.add(atol, pc.multiply(rtol, pc.abs(right_column))),
+                ),
+                pc.and_(pc.is_nan(left_column), pc.is_nan(right_column)),
+            )
+            equal = pc.all(pc.and_kleene(pc.equal(pc.is_null(left_column), pc.is_null(right_column)), close)).as_py()
+        else:
+            equal = left_column.equals(right_column)
+        if not equal:
+            raise AssertionError(f"Values of column {column} differ")
+
+
+def assert_frame_equal(left: Any, right: Any, **kwargs: Any) -> None:
     """Asserts that two dataframes are equal regardless of their order of rows
 
+    Besides pandas dataframes, pyarrow Tables and polars DataFrames are compared natively. Pandas dataframes
+    compared with one of these are converted to the format of the other one.
+
     Args:
         left: A dataframe, usually the result of a function under test
         right: Another dataframe, usually what we expect in a test
-        **kwargs: Keyword arguments of pandas.testing.assert_frame_equal <https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.testing.assert_frame_equal.html>
+        **kwargs: Keyword arguments of pandas.testing.assert_frame_equal <https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.testing.assert_frame_equal.html>,
+            of polars.testing.assert_frame_equal for polars DataFrames and check_dtype, rtol and atol for Arrow tables
     """
+    if isinstance(left, pa.Table) or isinstance(right, pa.Table):
+        if isinstance(left, pandas.DataFrame):
+            left = _pandas_to_arrow(left)
+        if isinstance(right, pandas.DataFrame):
+            right = _pandas_to_arrow(right)
+        _assert_arrow_tables_equal(left, right, **kwargs)
+        return
+
+    if _is_polars_frame(left) or _is_polars_frame(right):
+        import polars
+        from polars import testing as pl_test
+
+        if isinstance(left, pandas.DataFrame):
+            left = polars.from_pandas(left)
+        if isinstance(right, pandas.DataFrame):
+            right = polars.from_pandas(right)
+        pl_test.assert_frame_equal(left, right, check_row_order=False, check_column_order=False, **kwargs)
+        return
 
     _fix_integer_dtypes(left)
     _fix_integer_dtypes(right)
@@ -56,3 +166,106 @@ def assert_frame_equal(left: pandas.DataFrame, right: pandas.DataFrame, **kwargs
     right_sorted = right[sorted(right.columns)].sort_values(sorted(right.columns)).reset_index(drop=True)
 
     pd_test.assert_frame_equal(left_sorted, right_sorted, **kwargs)
+
+
+def _hash_rows(df: pandas.DataFrame) -> pandas.Series:
+    """Hashes all rows of a dataframe regardless of the order of its columns
+
+    Args:
+        df: A dataframe whose rows are hashed
+
+    Returns:
+        Series with one unsigned 64 bit hash per row
+    """
+    return pd.util.hash_pandas_object(df[sorted(df.columns)], index=False)
+
+
+def _content_hash(df: pandas.DataFrame) -> str:
+    """Hashes the content of a dataframe regardless of the order of its rows and columns
+
+    Args:
+        df: A dataframe whose content is hashed
+
+    Returns:
+        Hex digest of the columns, the number of rows and the sum of all row hashes
+    """
+    row_hash_sum = int(_hash_rows(df).to_numpy().sum(dtype=np.uint64))
+    columns = ",".join(f"{column}:{df[column].dtype}" for column in sorted(df.columns))
+    return f"{columns}|{len(df)}|{row_hash_sum:016x}"
+
+
+def assert_batches_equal(batches: Iterable[Union[pandas.DataFrame, Any]], expected: pandas.DataFrame) -> None:
+    """Asserts that a stream of batches contains the same rows as a dataframe regardless of their order
+
+    Streamed rows are matched against the hashes of the expected rows and only counted if they are unexpected,
+    so the memory doesn't grow with the streamed result beyond a single batch.
+    Values are compared exactly, standardize the batches first if necessary (e.g. with standardize_frame_numerics).
+
+    Args:
+        batches: pandas DataFrames or pyarrow RecordBatches, usually streamed from a result table
+        expected: A dataframe, usually what we expect in a test
+    """
+    expected_hashes = _hash_rows(expected)
+    missing: Counter = Counter(expected_hashes.tolist())
+    unexpected = 0
+    for batch in batches:
+        df = batch if isinstance(batch, pandas.DataFrame) else batch.to_pandas()
+        for row_hash, count in _hash_rows(df).value_counts().items():
+            matched = min(count, missing.get(row_hash, 0))
+            if matched:
+                missing[row_hash] -= matched
+            unexpected += count - matched
+
+    missing = +missing
+    if missing or unexpected:
+        raise AssertionError(
+            f"Batches differ from the expected dataframe: {sum(missing.values())} expected rows are missing "
+            f"and {unexpected} rows are unexpected. Missing rows:\n"
+            f"{expected[expected_hashes.isin(list(missing)).to_numpy()]}"
+        )
+
+
+def write_snapshot(df: pandas.DataFrame, path: str) -> None:
+    """Writes a dataframe as zstd compressed Parquet file together with its content hash
+
+    Args:
+        df: A dataframe, usually the result of a function under test
+        path: Path of the snapshot file
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), SNAPSHOT_HASH_KEY: _content_hash(df)})
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    pq.write_table(table, path, compression="zstd")
+
+
+def assert_frame_matches_snapshot(
+    df: pandas.DataFrame, path: str, update: Optional[bool] = None, **kwargs: Any
+) -> None:
+    """Asserts that a dataframe equals a snapshot regardless of their order of rows
+
+    Only the content hash stored in the Parquet footer is read if the dataframe matches the snapshot.
+    The snapshot is loaded and compared with assert_frame_equal only if the hashes differ.
+
+    Args:
+        df: A dataframe, usually the result of a function under test
+        path: Path of the snapshot file
+        update: Rewrites the snapshot instead of comparing, defaults to the BQUEST_UPDATE_SNAPSHOTS environment variable
+        **kwargs: Keyword arguments of pandas.testing.assert_frame_equal
+    """
+    if update is None:
+        update = os.environ.get(UPDATE_SNAPSHOTS_ENV_VAR, "").strip().lower() in TRUTHY_VALUES
+
+    if update:
+        write_snapshot(df, path)
+        return
+
+    if not os.path.exists(path):
+        raise AssertionError(f"Snapshot {path} does not exist, run with {UPDATE_SNAPSHOTS_ENV_VAR}=1 to create it.")
+
+    metadata = pq.read_schema(path).metadata or {}
+    if metadata.get(SNAPSHOT_HASH_KEY) == _content_hash(df).encode():
+        return
+
+    assert_frame_equal(df.copy(), pd.read_parquet(path), **kwargs)
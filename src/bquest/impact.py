@@ -0,0 +1,311 @@
+"""Module for selecting tests by fingerprints of the SQL files, configurations and fixtures they use
+
+While a test runs, runners record its inputs into the active fingerprint: the SQL and configuration
+files read by SQLFileRunner and BQConfigFileRunner, the substitutions and the content hashes of the
+table definitions. Once file reads are tracked, the files table definitions are built from, i.e. the
+modules creating them and the files read before, are recorded as well. An ImpactIndex stores the
+fingerprints of the last run, so tests whose files are unchanged since they last passed can be skipped,
+see the --bquest-impact pytest option.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import glob
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from bquest.tables import BQTableDefinition
+
+
+def hash_value(value: Any) -> str:
+    """Returns a stable hash of a JSON-like value, other values are hashed by their string representation"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def hash_file(path: str) -> Optional[str]:
+    """Returns the hash of the content of a file, None if it does not exist"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+class Fingerprint:
+    """
+    Inputs of a test: files by path with their content hashes and further inputs by name with their hashes.
+    """
+
+    def __init__(
+        self, files: Optional[Dict[str, str]] = None, inputs: Optional[Dict[str, str]] = None, complete: bool = True
+    ) -> None:
+        """
+
+        Args:
+            files: content hashes by relative file path
+            inputs: hashes by input name, e.g. fixture:abc.orders
+            complete: whether the files of all table definitions are known
+        """
+        self.files: Dict[str, str] = dict(files or {})
+        self.inputs: Dict[str, str] = dict(inputs or {})
+        # False if the files of a table definition are unknown, so that changes of the fixture can't be detected
+        self.complete = complete
+        # random test table names are replaced by their original table ids, so that inputs are reproducible
+        self._table_names: Dict[str, str] = {}
+        # absolute paths of the files read while the test runs, added by add_read_files
+        self._read_files: Set[str] = set()
+
+    @property
+    def digest(self) -> str:
+        """Returns the hash of all files and inputs"""
+        return hash_value({"files": self.files, "inputs": self.inputs})
+
+    def add_file(self, path: str) -> None:
+        """Adds a file read by the test
+
+        Args:
+            path: path of the file
+        """
+        relative_path = os.path.relpath(path)
+        self.files[relative_path] = hash_file(relative_path) or ""
+
+    def add_table_definitions(self, table_definitions: Iterable[BQTableDefinition]) -> None:
+        """Adds the content hashes of table definitions used by the test
+
+        Args:
+            table_definitions: table definitions
+        """
+        for table_def in table_definitions:
+            self._table_names[table_def.table_name] = table_def.original_table_id
+            self._add(f"fixture:{table_def.original_table_id}", table_def.fingerprint)
+            if table_def.source_files is None:
+                self.complete = False
+            else:
+                for path in table_def.source_files:
+                    self.add_file(path)
+
+    def add_read_files(self) -> None:
+        """Adds the files read while the fingerprint was recorded, if file reads are tracked"""
+        with _reads_lock:
+            read_files = sorted(self._read_files)
+        for path in read_files:
+            self.add_file(path)
+
+    def add_input(self, name: str, value: Any) -> None:
+        """Adds a further input of the test, e.g. substitutions
+
+        Args:
+            name: name of the input
+            value: JSON-like value, names of added table definitions are replaced by their original table ids
+        """
+        text = json.dumps(value, sort_keys=True, default=str)
+        for table_name, original_table_id in self._table_names.items():
+            text = text.replace(table_name, original_table_id)
+        self._add(name, hashlib.sha256(text.encode()).hexdigest())
+
+    def _add(self, name: str, value_hash: str) -> None:
+        # tests may run several queries or use several definitions of a table, which are numbered
+        key, number = name, 1
+        while key in self.inputs and self.inputs[key] != value_hash:
+            number += 1
+            key = f"{name}#{number}"
+        self.inputs[key] = value_hash
+
+    def files_unchanged(self) -> bool:
+        """Returns whether all files still have the content they had when they were added"""
+        return all(hash_file(path) == file_hash for path, file_hash in self.files.items())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"files": self.files, "inputs": self.inputs, "complete": self.complete, "digest": self.digest}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Fingerprint":
+        return cls(data.get("files"), data.get("inputs"), bool(data.get("complete")))
+
+
+_current_fingerprint: contextvars.ContextVar[Optional[Fingerprint]] = contextvars.ContextVar(
+    "bquest_fingerprint", default=None
+)
+
+
+def current_fingerprint() -> Optional[Fingerprint]:
+    """Returns the fingerprint recorded for the running test, None if no fingerprint is recorded"""
+    return _current_fingerprint.get()
+
+
+_tracked_dir: Optional[str] = None
+# files read outside of recorded tests, e.g. while test modules are imported
+_untracked_reads: Set[str] = set()
+_reads_lock = threading.Lock()
+
+
+def _is_tracked(path: str) -> bool:
+    return (
+        _tracked_dir is not None
+        and path.startswith(_tracked_dir + os.sep)
+        and not path.startswith(os.path.dirname(os.path.abspath(__file__)) + os.sep)
+        and "site-packages" not in path
+        and "__pycache__" not in path
+    )
+
+
+def _track_read(event: str, args: Tuple[Any, ...]) -> None:
+    if event != "open" or _tracked_dir is None or not isinstance(args[0], str):
+        return
+    mode = args[1]
+    if isinstance(mode, str) and any(flag in mode for flag in "wax+"):
+        return
+    path = os.path.abspath(args[0])
+    if _is_tracked(path):
+        fingerprint = _current_fingerprint.get()
+        with _reads_lock:
+            (fingerprint._read_files if fingerprint is not None else _untracked_reads).add(path)
+
+
+def track_file_reads(root_dir: str) -> None:
+    """Tracks the files read below a directory from now on, so that table definitions know their files
+
+    Args:
+        root_dir: directory of the tests and the files they read, installed packages are ignored
+    """
+    global _tracked_dir
+    if _tracked_dir is None:
+        sys.addaudithook(_track_read)
+    _tracked_dir = os.path.abspath(root_dir)
+
+
+def find_source_files() -> Optional[List[str]]:
+    """Returns the files a table definition created by the caller may be built from
+
+    These are the modules of the calling code and the files read before, by the running test or, outside
+    of tests, by the process, e.g. data files read by test modules when they are imported.
+
+    Returns:
+        absolute paths of the files, None if file reads are not tracked
+    """
+    if _tracked_dir is None:
+        return None
+    files = set()
+    frame = inspect.currentframe()
+    while frame is not None:
+        # code without a file, e.g. frozen modules, has pseudo file names like <frozen runpy>
+        if not frame.f_code.co_filename.startswith("<"):
+            path = os.path.abspath(frame.f_code.co_filename)
+            if _is_tracked(path):
+                files.add(path)
+        frame = frame.f_back
+    fingerprint = _current_fingerprint.get()
+    with _reads_lock:
+        files.update(fingerprint._read_files if fingerprint is not None else _untracked_reads)
+    return sorted(files)
+
+
+@contextlib.contextmanager
+def recording(fingerprint: Optional[Fingerprint] = None) -> Iterator[Fingerprint]:
+    """Records the inputs of runners into a fingerprint while the context is active
+
+    Args:
+        fingerprint: fingerprint which is extended, a new one if None
+
+    Returns:
+        context manager yielding the fingerprint
+    """
+    fingerprint = fingerprint or Fingerprint()
+    token = _current_fingerprint.set(fingerprint)
+    try:
+        yield fingerprint
+    finally:
+        _current_fingerprint.reset(token)
+
+
+class ImpactIndex:
+    """
+    Local index of the fingerprints of tests and whether they passed, stored as JSON file.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str) -> None:
+        """
+
+        Args:
+            path: path of the index file, which is created on save if it doesn't exist
+        """
+        self._path = path
+        self._tests = self._load(path)
+        self._recorded: Dict[str, Dict[str, Any]] = {}
+
+    def _load(self, path: str) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="UTF-8") as f:
+            data = json.load(f)
+        return data["tests"] if data.get("version") == self.VERSION else {}
+
+    def _write(self, path: str, tests: Dict[str, Dict[str, Any]]) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="UTF-8") as f:
+            json.dump({"version": self.VERSION, "tests": tests}, f, indent=1, sort_keys=True)
+
+    def get(self, test_id: str) -> Optional[Fingerprint]:
+        """Returns the fingerprint of a test, None if the test is unknown"""
+        entry = self._tests.get(test_id)
+        return Fingerprint.from_dict(entry["fingerprint"]) if entry else None
+
+    def passed(self, test_id: str) -> bool:
+        """Returns whether a test passed when it was recorded last"""
+        return bool(self._tests.get(test_id, {}).get("passed"))
+
+    def is_unchanged(self, test_id: str) -> bool:
+        """Returns whether a test passed last time and the files of its fingerprint are unchanged
+
+        Tests using table definitions whose files are unknown are never unchanged.
+
+        Args:
+            test_id: id of the test, e.g. the pytest node id
+
+        Returns:
+            True if the test doesn't need to run again
+        """
+        fingerprint = self.get(test_id)
+        return (
+            fingerprint is not None and fingerprint.complete and self.passed(test_id) and fingerprint.files_unchanged()
+        )
+
+    def record(self, test_id: str, fingerprint: Fingerprint, passed: bool) -> None:
+        """Stores the fingerprint of a test
+
+        Args:
+            test_id: id of the test, e.g. the pytest node id
+            fingerprint: fingerprint recorded while the test ran
+            passed: whether the test passed
+        """
+        self._recorded[test_id] = {"fingerprint": fingerprint.to_dict(), "passed": passed}
+        self._tests[test_id] = self._recorded[test_id]
+
+    def save(self) -> None:
+        """Writes the index to its file, including the fingerprints saved by workers with save_part"""
+        for part_path in sorted(glob.glob(glob.escape(self._path) + ".part-*")):
+            self._tests.update(self._load(part_path))
+            os.remove(part_path)
+        self._write(self._path, self._tests)
+
+    def save_part(self, worker_id: str) -> None:
+        """Writes only the fingerprints recorded by this process next to the index, merged by the next save
+
+        Parallel workers, e.g. of pytest-xdist, save parts instead of overwriting each other's index.
+
+        Args:
+            worker_id: id of the worker, e.g. gw0
+        """
+        self._write(f"{self._path}.part-{worker_id}", self._recorded)
@@ -0,0 +1,140 @@
+"""Module for writing test tables through the BigQuery Storage Write API"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from google.auth.credentials import Credentials
+    from google.cloud import bigquery as bq
+    from google.cloud import bigquery_storage_v1 as bq_storage
+else:
+    bq = lazy_import("google.cloud.bigquery")
+    bq_storage = lazy_import("google.cloud.bigquery_storage_v1")
+    pa = lazy_import("pyarrow")
+
+INGESTION_MODES = ("load_job", "write_api")
+# AppendRows requests are limited to 10 MB, the remainder is left for the schema and the request itself
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+
+_write_clients: Dict[Any, Any] = {}
+_write_clients_lock = threading.Lock()
+
+
+def get_write_client(credentials: Optional[Credentials] = None) -> bq_storage.BigQueryWriteClient:
+    """Returns a Storage Write API client, one per credentials
+
+    Args:
+        credentials: credentials of the client, the default credentials of the environment if None
+
+    Returns:
+        the Storage Write API client
+    """
+    with _write_clients_lock:
+        if credentials not in _write_clients:
+            _write_clients[credentials] = bq_storage.BigQueryWriteClient(credentials=credentials)
+        return _write_clients[credentials]
+
+
+def _bq_field_type(name: str, arrow_type: pa.DataType) -> str:
+    if pa.types.is_boolean(arrow_type):
+        return "BOOLEAN"
+    if pa.types.is_integer(arrow_type):
+        return "INTEGER"
+    if pa.types.is_floating(arrow_type):
+        return "FLOAT"
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return "STRING"
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return "BYTES"
+    if pa.types.is_timestamp(arrow_type):
+        return "DATETIME" if arrow_type.tz is None else "TIMESTAMP"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    if pa.types.is_time(arrow_type):
+        return "TIME"
+    if pa.types.is_decimal(arrow_type):
+        return "NUMERIC" if arrow_type.precision <= 38 and arrow_type.scale <= 9 else "BIGNUMERIC"
+    if pa.types.is_struct(arrow_type):
+        return "RECORD"
+    raise ValueError(f"Column {name} of Arrow type {arrow_type} has no BigQuery type.")
+
+
+def arrow_to_bq_schema(schema: pa.Schema) -> List[bq.SchemaField]:
+    """Derives a BigQuery schema from an Arrow schema, lists become REPEATED fields
+
+    Args:
+        schema: Arrow schema, e.g. of a converted pandas DataFrame
+
+    Returns:
+        the BigQuery schema
+    """
+
+    def to_field(field: pa.Field) -> bq.SchemaField:
+        arrow_type, mode = field.type, "NULLABLE" if field.nullable else "REQUIRED"
+        if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+            arrow_type, mode = arrow_type.value_type, "REPEATED"
+        fields = [to_field(child) for child in arrow_type] if pa.types.is_struct(arrow_type) else ()
+        return bq.SchemaField(field.name, _bq_field_type(field.name, arrow_type), mode=mode, fields=fields)
+
+    return [to_field(field) for field in schema]
+
+
+def _split_batches(table: pa.Table, max_request_bytes: int) -> Iterator[pa.RecordBatch]:
+    # estimates the rows per request from the average row size, so each request stays below the limit
+    rows_per_request = max(1, int(table.num_rows * max_request_bytes / max(table.nbytes, 1)))
+    yield from table.combine_chunks().to_batches(max_chunksize=rows_per_request)
+
+
+def write_arrow_table(
+    write_client: bq_storage.BigQueryWriteClient,
+    fq_table_id: str,
+    table: pa.Table,
+    max_request_bytes: int = MAX_REQUEST_BYTES,
+) -> None:
+    """Writes an Arrow table to an existing BigQuery table through a committed write stream
+
+    Each append carries its offset in the stream, so an append which is retried after its response got
+    lost fails instead of writing the rows twice. The rows are visible as soon as they are appended.
+
+    Args:
+        write_client: Storage Write API client
+        fq_table_id: fully qualified id of the table, e.g. my-project.bquest.orders_1234
+        table: rows of the table, the column types have to match the table's schema
+        max_request_bytes: maximum size of the rows of a single append request
+    """
+    if table.num_rows == 0:
+        return
+
+    project, dataset, table_id = fq_table_id.split(".")
+    write_stream = write_client.create_write_stream(
+        parent=write_client.table_path(project, dataset, table_id),
+        write_stream=bq_storage.types.WriteStream(type_=bq_storage.types.WriteStream.Type.COMMITTED),
+    )
+    writer_schema = bq_storage.types.ArrowSchema(serialized_schema=table.schema.serialize().to_pybytes())
+
+    requests = []
+    offset = 0
+    for batch in _split_batches(table, max_request_bytes):
+        request = bq_storage.types.AppendRowsRequest(
+            write_stream=write_stream.name,
+            offset=offset,
+            arrow_rows=bq_storage.types.AppendRowsRequest.ArrowData(
+                rows=bq_storage.types.ArrowRecordBatch(
+                    serialized_record_batch=batch.serialize().to_pybytes(), row_count=batch.num_rows
+                ),
+                # the schema is only required in the first request of a connection
+                writer_schema=writer_schema if offset == 0 else None,
+            ),
+        )
+        requests.append(request)
+        offset += batch.num_rows
+
+    for response in write_client.append_rows(iter(requests)):
+        if response.error.code or response.row_errors:
+            raise ValueError(f"Could not write rows to {fq_table_id}: {response.error.message} {response.row_errors}")
+    write_client.finalize_write_stream(name=write_stream.name)
@@ -0,0 +1,96 @@
+"""Module for passing values to queries as typed BigQuery query parameters"""
+
+from __future__ import annotations
+
+import datetime
+import decimal
+import re
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery as bq
+else:
+    bq = lazy_import("google.cloud.bigquery")
+
+_DATE_PATTERN = re.compile(r"^(\d{4})-?(\d{2})-?(\d{2})$")
+
+
+def parse_date(value: Any) -> Any:
+    """Converts date strings like 20190301 or 2019-03-01 to dates, all other values are returned as they are
+
+    Args:
+        value: a value, e.g. the start date of a BQ configuration
+
+    Returns:
+        datetime.date if the value is a date string, else the value
+    """
+    if isinstance(value, str):
+        match = _DATE_PATTERN.match(value)
+        if match:
+            return datetime.date(*(int(part) for part in match.groups()))
+    return value
+
+
+def _scalar_type(name: str, value: Any) -> str:
+    # bool is a subclass of int and datetime a subclass of date, so the order of the checks matters
+    if isinstance(value, bool):
+        return "BOOL"
+    if isinstance(value, int):
+        return "INT64"
+    if isinstance(value, float):
+        return "FLOAT64"
+    if isinstance(value, decimal.Decimal):
+        return "NUMERIC"
+    if isinstance(value, str):
+        return "STRING"
+    if isinstance(value, bytes):
+        return "BYTES"
+    if isinstance(value, datetime.datetime):
+        return "DATETIME" if value.tzinfo is None else "TIMESTAMP"
+    if isinstance(value, datetime.date):
+        return "DATE"
+    if isinstance(value, datetime.time):
+        return "TIME"
+    raise ValueError(
+        f"Can't infer the type of query parameter {name} from {value!r}, pass a ScalarQueryParameter instead."
+    )
+
+
+def to_query_parameter(name: str, value: Any) -> Any:
+    """Converts a value to a query parameter whose type is inferred from the value
+
+    Lists become ARRAY parameters and dicts STRUCT parameters, query parameters are returned as they are.
+
+    Args:
+        name: name of the parameter, referenced as @name in the query
+        value: value of the parameter
+
+    Returns:
+        ScalarQueryParameter, ArrayQueryParameter or StructQueryParameter
+    """
+    if isinstance(value, (bq.ScalarQueryParameter, bq.ArrayQueryParameter, bq.StructQueryParameter)):
+        return value
+    if isinstance(value, dict):
+        return bq.StructQueryParameter(name, *[to_query_parameter(key, item) for key, item in value.items()])
+    if isinstance(value, (list, tuple)):
+        if not value:
+            raise ValueError(f"Can't infer the type of the empty query parameter {name}, pass an ArrayQueryParameter.")
+        if isinstance(value[0], dict):
+            structs = [bq.StructQueryParameter(None, *to_query_parameters(item)) for item in value]
+            return bq.ArrayQueryParameter(name, "STRUCT", structs)
+        return bq.ArrayQueryParameter(name, _scalar_type(name, value[0]), list(value))
+    return bq.ScalarQueryParameter(name, _scalar_type(name, value), value)
+
+
+def to_query_parameters(values: Dict[str, Any]) -> List[Any]:
+    """Converts values by name to query parameters whose types are inferred from the values
+
+    Args:
+        values: values by parameter name
+
+    Returns:
+        query parameters for QueryJobConfig.query_parameters
+    """
+    return [to_query_parameter(name, value) for name, value in values.items()]
@@ -0,0 +1,245 @@
+"""Module for checking the performance of queries against budgets and baselines"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence
+
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    from google.cloud import bigquery as bq
+else:
+    np = lazy_import("numpy")
+
+METRICS = ("slot_millis", "bytes_processed", "shuffle_bytes")
+
+
+class QueryStatistics:
+    """
+    Represents the statistics of a finished query job.
+    """
+
+    def __init__(
+        self,
+        slot_millis: int,
+        bytes_processed: int,
+        shuffle_bytes: int,
+        stage_millis: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """
+
+        Args:
+            slot_millis: slot time consumed by the query in milliseconds
+            bytes_processed: bytes processed by the query
+            shuffle_bytes: bytes written to shuffle by all stages of the query
+            stage_millis: wall-clock time per stage of the query plan in milliseconds
+        """
+        self._slot_millis = slot_millis
+        self._bytes_processed = bytes_processed
+        self._shuffle_bytes = shuffle_bytes
+        self._stage_millis = stage_millis or {}
+
+    @classmethod
+    def from_query_job(cls, query_job: bq.QueryJob) -> "QueryStatistics":
+        """Collects the statistics of a finished query job
+
+        Args:
+            query_job: a finished query job
+
+        Returns:
+            statistics of the query job
+        """
+        stage_millis = {}
+        shuffle_bytes = 0
+        for stage in query_job.query_plan:
+            shuffle_bytes += stage.shuffle_output_bytes or 0
+            if stage.start and stage.end:
+                stage_millis[stage.name] = int((stage.end - stage.start).total_seconds() * 1000)
+        return cls(
+            query_job.slot_millis or 0,
+            query_job.total_bytes_processed or 0,
+            shuffle_bytes,
+            stage_millis,
+        )
+
+    @property
+    def slot_millis(self) -> int:
+        return self._slot_millis
+
+    @property
+    def bytes_processed(self) -> int:
+        return self._bytes_processed
+
+    @property
+    def shuffle_bytes(self) -> int:
+        return self._shuffle_bytes
+
+    @property
+    def stage_millis(self) -> Dict[str, int]:
+        return self._stage_millis
+
+    def metric(self, name: str) -> int:
+        """Returns a metric by name, one of slot_millis, bytes_processed or shuffle_bytes"""
+        if name not in METRICS:
+            raise ValueError(f"Unknown metric {name}, expected one of {METRICS}.")
+        value: int = getattr(self, name)
+        return value
+
+
+class ScalingCurve:
+    """
+    Query statistics measured at several fixture scales, e.g. numbers of input rows.
+
+    Each metric is fitted to a power law `metric = factor * scale ** exponent`, so an exponent of one
+    means that the metric grows linearly with the scale.
+    """
+
+    def __init__(self, scales: Sequence[int], statistics: Sequence[QueryStatistics]) -> None:
+        """
+
+        Args:
+            scales: fixture scales, e.g. numbers of input rows
+            statistics: query statistics measured at each scale
+        """
+        if len(scales) != len(statistics):
+            raise ValueError("'scales' and 'statistics' need to have the same length.")
+        if len(set(scales)) < 2:
+            raise ValueError("At least two different scales are required for a scaling curve.")
+
+        self._scales = list(scales)
+        self._statistics = list(statistics)
+
+    @property
+    def scales(self) -> List[int]:
+        return self._scales
+
+    @property
+    def statistics(self) -> List[QueryStatistics]:
+        return self._statistics
+
+    def values(self, metric: str) -> List[int]:
+        """Returns the measured values of a metric in the order of the scales"""
+        return [statistics.metric(metric) for statistics in self._statistics]
+
+    def _fit(self, metric: str) -> np.ndarray:
+        # metrics of zero (e.g. no shuffle at all) are clipped to one to stay defined in log space
+        values = np.maximum(np.asarray(self.values(metric), dtype=float), 1.0)
+        return np.polyfit(np.log(self._scales), np.log(values), 1)
+
+    def exponent(self, metric: str = "slot_millis") -> float:
+        """Returns the fitted exponent of a metric, e.g. 1.0 for linear growth"""
+        return float(self._fit(metric)[0])
+
+    def predict(self, metric: str, scale: int) -> float:
+        """Returns the measured value of a metric at the given scale or else the value of the fitted curve"""
+        if scale in self._scales:
+            return float(self.values(metric)[self._scales.index(scale)])
+        slope, intercept = self._fit(metric)
+        return float(np.exp(intercept) * scale**slope)
+
+    def assert_exponent(self, max_exponent: float, metric: str = "slot_millis", tolerance: float = 0.2) -> None:
+        """Asserts that a metric grows at most with the given exponent of the scale
+
+        Args:
+            max_exponent: maximal exponent, e.g. 1.0 for linear growth
+            metric: one of slot_millis, bytes_processed or shuffle_bytes
+            tolerance: allowed deviation of the fitted exponent, slot time in particular is noisy
+        """
+        exponent = self.exponent(metric)
+        if exponent > max_exponent + tolerance:
+            raise AssertionError(
+                f"{metric} grows with exponent {exponent:.2f} of the scale, expected at most {max_exponent:.2f}."
+            )
+
+    def assert_linear(self, metric: str = "slot_millis", tolerance: float = 0.2) -> None:
+        """Asserts that a metric grows at most linearly with the scale"""
+        self.assert_exponent(1.0, metric, tolerance)
+
+    def assert_budget(self, budget: float, scale: int, metric: str = "slot_millis") -> None:
+        """Asserts that a metric stays within a budget at the given scale
+
+        Args:
+            budget: maximal value of the metric, e.g. 60_000 slot milliseconds
+            scale: scale of the budget, extrapolated from the fitted curve if it was not measured
+            metric: one of slot_millis, bytes_processed or shuffle_bytes
+        """
+        value = self.predict(metric, scale)
+        if value > budget:
+            raise AssertionError(f"{metric} of {value:.0f} at scale {scale} exceeds the budget of {budget:.0f}.")
+
+
+def measure_scaling(run_at_scale: Callable[[int], QueryStatistics], scales: Sequence[int]) -> ScalingCurve:
+    """Runs a query at several scales and collects its statistics
+
+    Args:
+        run_at_scale: runs the query on fixtures of the given scale, usually via SQLRunner.profile
+        scales: fixture scales, e.g. numbers of input rows
+
+    Returns:
+        scaling curve of the query
+    """
+    return ScalingCurve(scales, [run_at_scale(scale) for scale in scales])
+
+
+class PerformanceBaseline:
+    """
+    Stores scaling curves in a JSON file and flags regressions against them.
+    """
+
+    def __init__(self, path: str, tolerance: float = 0.25, update: bool = False) -> None:
+        """
+
+        Args:
+            path: path of the JSON file holding the baselines
+            tolerance: allowed relative increase of a metric before it counts as regression
+            update: rewrites the baselines with the checked curves instead of comparing against them
+        """
+        self._path = path
+        self._tolerance = tolerance
+        self._update = update
+
+    def _read(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        if not os.path.exists(self._path):
+            return {}
+        with open(self._path, "r", encoding="UTF-8") as f:
+            baselines: Dict[str, Dict[str, Dict[str, int]]] = json.load(f)
+            return baselines
+
+    def _write(self, baselines: Dict[str, Dict[str, Dict[str, int]]]) -> None:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self._path, "w", encoding="UTF-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+
+    def check(self, name: str, curve: ScalingCurve, metrics: Sequence[str] = METRICS) -> None:
+        """Compares a scaling curve with its baseline, the curve becomes the baseline if there is none yet
+
+        Args:
+            name: unique name of the curve, e.g. the name of the test
+            curve: measured scaling curve
+            metrics: metrics that are compared
+        """
+        baselines = self._read()
+        measured = {
+            metric: {str(scale): value for scale, value in zip(curve.scales, curve.values(metric), strict=True)}
+            for metric in metrics
+        }
+
+        if self._update or name not in baselines:
+            baselines[name] = measured
+            self._write(baselines)
+            return
+
+        regressions = []
+        for metric, values in measured.items():
+            for scale, value in values.items():
+                baseline = baselines[name].get(metric, {}).get(scale)
+                if baseline is not None and value > baseline * (1 + self._tolerance):
+                    regressions.append(f"{metric} at scale {scale}: {value} (baseline {baseline})")
+
+        if regressions:
+            raise AssertionError(f"Performance regressions of {name}:\n" + "\n".join(regressions))
@@ -0,0 +1,102 @@
+"""Module for loading the table definitions of upcoming tests while the current test runs"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from bquest.tables import BQTableDefinition
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery as bq
+
+T = TypeVar("T")
+
+
+class FixturePrefetcher:
+    """
+    Loads table definitions in the background, so that BigQuery loads of upcoming tests overlap with the
+    queries and downloads of the current test.
+
+    Runners load source tables with BQTableDefinition.load_prefetched, which returns a prefetched table or
+    waits for its load to finish. Definitions which were not prefetched are loaded by each test. Errors of
+    prefetched loads are not raised here, the load is retried and the error is raised when the test itself
+    loads the table.
+    """
+
+    def __init__(self, bq_client: bq.Client, max_workers: int = 4) -> None:
+        """
+
+        Args:
+            bq_client: BigQuery client for interacting with BigQuery
+            max_workers: number of tables loaded in parallel
+        """
+        self._bq_client = bq_client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bquest-prefetch")
+        self._futures: Dict[BQTableDefinition, Future] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, table_definitions: Iterable[BQTableDefinition]) -> List[Future]:
+        """Starts loading table definitions in the background, definitions are loaded at most once
+
+        Args:
+            table_definitions: definitions of an upcoming test
+
+        Returns:
+            futures of the loaded tables
+        """
+        futures = []
+        with self._lock:
+            for table_definition in table_definitions:
+                if table_definition not in self._futures:
+                    table_definition.mark_prefetched()
+                    future = self._executor.submit(table_definition.load_once, self._bq_client)
+                    self._futures[table_definition] = future
+                futures.append(self._futures[table_definition])
+        return futures
+
+    def close(self) -> None:
+        """Waits for running loads and stops the background threads"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "FixturePrefetcher":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+
+def run_pipelined(
+    bq_client: bq.Client,
+    tests: Sequence[Tuple[List[BQTableDefinition], Callable[[], T]]],
+    look_ahead: int = 1,
+    max_workers: int = 4,
+    prefetcher: Optional[FixturePrefetcher] = None,
+) -> List[T]:
+    """Runs tests one after the other while the table definitions of the next tests are loaded
+
+    Args:
+        bq_client: BigQuery client for interacting with BigQuery
+        tests: table definitions of each test and a function running the test, usually with a runner
+            which is given the same table definitions
+        look_ahead: number of upcoming tests whose table definitions are loaded in the background
+        max_workers: number of tables loaded in parallel
+        prefetcher: prefetcher shared with other batches, a new one is created and closed if None
+
+    Returns:
+        the results of the tests in their order
+    """
+    own_prefetcher = prefetcher is None
+    prefetcher = prefetcher or FixturePrefetcher(bq_client, max_workers)
+    try:
+        results = []
+        for index, (table_definitions, run_test) in enumerate(tests):
+            prefetcher.prefetch(table_definitions)
+            for upcoming_definitions, _ in tests[index + 1 : index + 1 + look_ahead]:
+                prefetcher.prefetch(upcoming_definitions)
+            results.append(run_test())
+        return results
+    finally:
+        if own_prefetcher:
+            prefetcher.close()
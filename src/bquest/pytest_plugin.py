@@ -0,0 +1,192 @@
+"""Pytest plugin loading the table definitions of upcoming tests in the background
+
+Tests declare the table definitions they load with the bquest_tables marker, e.g.
+
+    @pytest.mark.bquest_tables(ORDERS, CUSTOMERS)
+    def test_revenue(sql_runner): ...
+
+Running pytest with --bquest-prefetch=N loads the tables of the current and the next N marked tests
+in the background, so that they are ready when the runners of these tests load them.
+
+Running pytest with --bquest-impact=PATH records a fingerprint of every test which uses bquest runners
+in the index file PATH and skips tests which passed last time if their test module, conftest files,
+the SQL and configuration files read by file runners and the files their table definitions are built
+from are unchanged. These are the modules creating the definitions and the files read before, e.g. data
+files. Tests using definitions created before the plugin was configured are never skipped. Delete the
+index to run all tests again. With pytest-xdist, the workers' fingerprints are merged by the controller.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+import pytest
+
+from bquest.impact import Fingerprint, ImpactIndex, recording, track_file_reads
+from bquest.prefetch import FixturePrefetcher
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery as bq
+else:
+    bq = lazy_import("google.cloud.bigquery")
+
+MARKER = "bquest_tables"
+
+
+def pytest_addoption(parser: Any) -> None:
+    group = parser.getgroup("bquest")
+    group.addoption(
+        "--bquest-prefetch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="load the tables of the next N tests marked with bquest_tables in the background",
+    )
+    group.addoption("--bquest-prefetch-workers", type=int, default=4, help="number of tables loaded in parallel")
+    group.addoption(
+        "--bquest-impact",
+        default=None,
+        metavar="PATH",
+        help="skip tests whose test, SQL and configuration files are unchanged since they last passed, "
+        "with fingerprints stored in the index file PATH",
+    )
+    group.addoption(
+        "--bquest-impact-record-only",
+        action="store_true",
+        default=False,
+        help="only record the fingerprints of --bquest-impact without skipping tests",
+    )
+
+
+def pytest_configure(config: Any) -> None:
+    config.addinivalue_line(
+        "markers", f"{MARKER}(*table_definitions): table definitions loaded by the test, see --bquest-prefetch"
+    )
+    look_ahead = config.getoption("bquest_prefetch")
+    if look_ahead > 0:
+        config.pluginmanager.register(
+            PrefetchPlugin(look_ahead, config.getoption("bquest_prefetch_workers")), "bquest-prefetch"
+        )
+    impact_index = config.getoption("bquest_impact")
+    if impact_index:
+        config.pluginmanager.register(
+            ImpactPlugin(
+                ImpactIndex(impact_index), str(config.rootpath), not config.getoption("bquest_impact_record_only")
+            ),
+            "bquest-impact",
+        )
+
+
+class PrefetchPlugin:
+    """
+    Prefetches the marked table definitions of upcoming tests when a test is set up.
+    """
+
+    def __init__(self, look_ahead: int, max_workers: int, prefetcher: Optional[FixturePrefetcher] = None) -> None:
+        """
+
+        Args:
+            look_ahead: number of upcoming tests whose table definitions are loaded
+            max_workers: number of tables loaded in parallel
+            prefetcher: prefetcher of the tables, created with a client of the default project on first use if None
+        """
+        self._look_ahead = look_ahead
+        self._max_workers = max_workers
+        self._prefetcher = prefetcher
+        self._items: List[Any] = []
+        self._indices: Dict[str, int] = {}
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items: List[Any]) -> None:
+        self._items = [item for item in items if item.get_closest_marker(MARKER) is not None]
+        self._indices = {item.nodeid: index for index, item in enumerate(self._items)}
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item: Any) -> None:
+        index = self._indices.get(item.nodeid)
+        if index is None:
+            return
+        if self._prefetcher is None:
+            self._prefetcher = FixturePrefetcher(bq.Client(), self._max_workers)
+        for upcoming_item in self._items[index : index + 1 + self._look_ahead]:
+            for marker in upcoming_item.iter_markers(MARKER):
+                self._prefetcher.prefetch(marker.args)
+
+    def pytest_unconfigure(self) -> None:
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+
+
+class ImpactPlugin:
+    """
+    Records the fingerprints of tests using bquest runners and skips tests which are unchanged since they
+    last passed.
+    """
+
+    def __init__(self, index: ImpactIndex, root_dir: str, skip_unchanged: bool = True) -> None:
+        """
+
+        Args:
+            index: index of the fingerprints of the last run, saved at the end of the session
+            root_dir: root directory of the tests, conftest files up to it are part of the fingerprints
+            skip_unchanged: skips unchanged tests if True, else only records fingerprints
+        """
+        self._index = index
+        self._root_dir = os.path.abspath(root_dir)
+        self._skip_unchanged = skip_unchanged
+        self._fingerprints: Dict[str, Fingerprint] = {}
+        track_file_reads(self._root_dir)
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items: List[Any]) -> None:
+        if not self._skip_unchanged:
+            return
+        for item in items:
+            if self._index.is_unchanged(item.nodeid):
+                item.add_marker(pytest.mark.skip(reason="bquest: unchanged since the test last passed"))
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item: Any) -> Iterator[None]:
+        # fixtures creating table definitions are set up before the test is called
+        with recording(self._fingerprints.setdefault(item.nodeid, Fingerprint())):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item: Any) -> Iterator[None]:
+        with recording(self._fingerprints.setdefault(item.nodeid, Fingerprint())):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item: Any) -> Iterator[None]:
+        outcome = yield
+        report = outcome.get_result()
+        fingerprint = self._fingerprints.pop(item.nodeid, None) if report.when == "call" else None
+        # tests which don't use bquest runners always run
+        if fingerprint is not None and fingerprint.inputs:
+            fingerprint.add_read_files()
+            for path in self._test_files(str(item.path)):
+                fingerprint.add_file(path)
+            self._index.record(item.nodeid, fingerprint, report.passed)
+
+    def _test_files(self, test_path: str) -> List[str]:
+        """Returns the test module and the conftest files of its directory and the directories above it"""
+        files = [test_path]
+        directory = os.path.dirname(os.path.abspath(test_path))
+        while directory.startswith(self._root_dir):
+            conftest = os.path.join(directory, "conftest.py")
+            if os.path.exists(conftest):
+                files.append(conftest)
+            if directory == self._root_dir:
+                break
+            directory = os.path.dirname(directory)
+        return files
+
+    def pytest_sessionfinish(self, session: Any) -> None:
+        worker_input = getattr(session.config, "workerinput", None)
+        if worker_input is not None:
+            # pytest-xdist workers leave their fingerprints to the controller instead of overwriting the index
+            self._index.save_part(worker_input["workerid"])
+        else:
+            self._index.save()
@@ -1,40 +1,102 @@
 """Module for Running BQuest Tests"""
 
+from __future__ import annotations
+
 import ast
-import copy
+import contextvars
 import os
-from typing import Any, Callable, Dict, List, Optional
-
-import pandas
-from google.cloud import bigquery as bq
-
-from bquest.tables import BQTable, BQTableDefinition, BQTableDefinitionBuilder
+from collections import ChainMap
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, MutableMapping, Optional, Set, Tuple, Union
+
+from bquest.impact import current_fingerprint
+from bquest.parameters import parse_date, to_query_parameters
+from bquest.performance import QueryStatistics
+from bquest.session import BQSession
+from bquest.sql import extract_cte, find_column_references
+from bquest.tables import (
+    BQLazyResult,
+    BQTable,
+    BQTableDefinition,
+    BQTableDefinitionBuilder,
+    convert_result,
+    iter_row_batches,
+)
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    import pandas
+    from google.cloud import bigquery as bq
+else:
+    bq = lazy_import("google.cloud.bigquery")
 
 
 class BQConfigSubstitutor:
     """Substitutes parameters inside a BQ configuration"""
 
-    def __init__(self, config: Dict[str, Any], allow_partial: Optional[bool] = False):
+    def __init__(
+        self, config: Dict[str, Any], allow_partial: Optional[bool] = False, use_query_parameters: bool = False
+    ):
+        """
+
+        Args:
+            config: BQ configuration
+            allow_partial: allows source tables without substitution
+            use_query_parameters: adds the dates and templating vars as typed query parameters to the
+                substituted configuration, see substitute
+        """
         self._config = config
         self._allow_partial = allow_partial
+        self._use_query_parameters = use_query_parameters
+        # e.g. { "abc.feed": ["feed", "feed_copy"] }
+        self._source_table_keys: Dict[str, List[str]] = {}
+        for table_key, table_id in config["source_tables"].items():
+            self._source_table_keys.setdefault(table_id, []).append(table_key)
 
     @property
     def original_feature_table_name(self) -> str:
         return str(self._config["feature_table_name"])
 
+    @property
+    def query(self) -> Optional[str]:
+        """Returns the query of the BQ configuration, None if it has none"""
+        query = self._config.get("query")
+        return query if isinstance(query, str) else None
+
+    def reference_source_tables(self, sql: str, table_ids: Dict[str, str]) -> str:
+        """Replaces the placeholders of source tables in a query (e.g. {feed}) with table ids
+
+        Args:
+            sql: query of the BQ configuration
+            table_ids: table ids by original source table id (e.g. abc.feed)
+
+        Returns:
+            the query with replaced placeholders, other placeholders are kept
+        """
+        for original_table_id, table_id in table_ids.items():
+            for table_key in self._source_table_keys.get(original_table_id, []):
+                sql = sql.replace(f"{{{table_key}}}", table_id)
+        return sql
+
+    @property
+    def source_table_ids(self) -> List[str]:
+        """Returns the original ids of the source tables (e.g. abc.feed)"""
+        return list(self._source_table_keys)
+
     def _map_source_table_ids_to_mock_table_ids(self, source_tables: List[BQTable]) -> Dict[str, str]:
         """Match source tables with their mocks."""
-        result = {}
-        table_id_mapping = {t.original_table_id: t.fq_test_table_id for t in source_tables}
-
         # e.g. { "feed": "bquest.example_id" }
-        for table_key, table_id in self._config["source_tables"].items():
-            if table_id in table_id_mapping:
-                result[table_key] = table_id_mapping[table_id]
-            else:
-                if not self._allow_partial:
+        result = dict(self._config["source_tables"])
+        substituted = set()
+        for table in source_tables:
+            for table_key in self._source_table_keys.get(table.original_table_id, []):
+                result[table_key] = table.fq_test_table_id
+                substituted.add(table.original_table_id)
+
+        if not self._allow_partial:
+            for table_id in self._source_table_keys:
+                if table_id not in substituted:
                     raise ValueError(f"Found no substitution for table {table_id}")
-                result[table_key] = table_id
         return result
 
     def substitute(
@@ -43,40 +105,127 @@ class BQConfigSubstitutor:
         end_date: str,
         feature_table_name: BQTable,
         test_tables: List[BQTable],
-    ) -> Dict[str, Any]:
+        templating_vars: Optional[Dict[str, Any]] = None,
+    ) -> MutableMapping[str, Any]:
         """Substitutes a wide array of parameters inside a BQ configuration.
 
+        The original configuration is neither copied nor modified. Substituted parameters are
+        layered on top of it, all other entries are shared with the original configuration.
+
+        With use_query_parameters, the configuration additionally contains the entry query_parameters,
+        a list of typed query parameters for QueryJobConfig.query_parameters. It holds @start_date,
+        @end_date (as DATE if given as YYYYMMDD or YYYY-MM-DD) and the templating vars, so the query text
+        stays the same for all dates and values.
+
         Args:
             start_date: the start date
             end_date: the end date
             feature_table_name: the test table where the results will be stored
             test_tables: test tables that replace the original source tables
+            templating_vars: variables that are passed as query parameters with use_query_parameters
 
         Returns:
-            Dict: a new BQ configuration where parameters have been substituted.
+            MutableMapping: a new BQ configuration where parameters have been substituted.
         """
-        config = copy.deepcopy(self._config)
-        config["start_date"] = start_date
-        config["end_date"] = end_date
-        config["feature_table_name"] = feature_table_name.fq_test_table_id
-        config["source_tables"] = self._map_source_table_ids_to_mock_table_ids(test_tables)
-        return config
+        substitutions = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "feature_table_name": feature_table_name.fq_test_table_id,
+            "source_tables": self._map_source_table_ids_to_mock_table_ids(test_tables),
+        }
+        if self._use_query_parameters:
+            substitutions["query_parameters"] = to_query_parameters(
+                {"start_date": parse_date(start_date), "end_date": parse_date(end_date), **(templating_vars or {})}
+            )
+        return ChainMap(substitutions, self._config)
 
 
 class BaseRunner:
     """Base class for runners"""
 
-    def __init__(self, bq_client: bq.Client, dataset: str = "bquest"):
+    def __init__(
+        self,
+        bq_client: bq.Client,
+        dataset: str = "bquest",
+        datasets: Optional[List[str]] = None,
+        prune_columns: bool = False,
+        use_session: bool = False,
+    ):
         self._bq_client = bq_client
-        self._bq_table_def_builder = BQTableDefinitionBuilder(bq_client.project, dataset)
+        self._bq_table_def_builder = BQTableDefinitionBuilder(bq_client.project, dataset, datasets=datasets)
+        self._prune_columns = prune_columns
+        self._session = BQSession(bq_client) if use_session else None
+
+    @property
+    def session(self) -> Optional[BQSession]:
+        """Returns the session holding the source tables as temporary tables, None without use_session"""
+        return self._session
 
-    def _create_source_tables(self, table_definitions: List[BQTableDefinition]) -> List[BQTable]:
+    def close(self) -> None:
+        """Closes the session of the runner, which drops its temporary tables"""
+        if self._session is not None:
+            self._session.close()
+
+    def __enter__(self) -> "BaseRunner":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    @staticmethod
+    def _select_referenced_columns(
+        queries: List[str], table_definitions: List[BQTableDefinition]
+    ) -> List[BQTableDefinition]:
+        """Replaces table definitions by definitions of only the columns the queries possibly read
+
+        Args:
+            queries: queries referencing the tables by their table names
+            table_definitions: definitions of the tables read by the queries
+
+        Returns:
+            the definitions in the same order, definitions of unreferenced and prefetched tables are kept as they are
+        """
+        table_names = [table_def.table_name for table_def in table_definitions]
+        references = [find_column_references(sql, table_names) for sql in queries]
         result = []
         for table_def in table_definitions:
-            test_table = table_def.load_to_bq(self._bq_client)
-            result.append(test_table)
+            name = table_def.table_name.lower()
+            reads = [query_references[name] for query_references in references if name in query_references]
+            if not reads or any(columns is None for columns in reads) or table_def.prefetched:
+                # a selection of a prefetched definition would be loaded again instead of its prefetched table
+                result.append(table_def)
+            else:
+                result.append(table_def.select_columns(set().union(*reads)))
         return result
 
+    @staticmethod
+    def _record_inputs(table_definitions: List[BQTableDefinition], **inputs: Any) -> None:
+        """Adds table definitions and inputs to the fingerprint of the running test, see bquest.impact"""
+        fingerprint = current_fingerprint()
+        if fingerprint is not None:
+            fingerprint.add_table_definitions(table_definitions)
+            for name, value in inputs.items():
+                fingerprint.add_input(name, value)
+
+    def _create_source_tables(
+        self, table_definitions: List[BQTableDefinition], executor: Optional[ThreadPoolExecutor] = None
+    ) -> List[BQTable]:
+        self._record_inputs(table_definitions)
+
+        def create(table_def: BQTableDefinition) -> BQTable:
+            if self._session is not None:
+                return self._session.load(table_def)
+            # tables prefetched by a FixturePrefetcher are loaded already
+            return table_def.load_prefetched(self._bq_client)
+
+        if executor is None:
+            return [create(table_def) for table_def in table_definitions]
+        # threads don't inherit context variables, so each table is loaded in its own copy of the caller's context
+        futures = [
+            executor.submit(contextvars.copy_context().run, create, table_def) for table_def in table_definitions
+        ]
+        return [future.result() for future in futures]
+
     def _create_result_table_from_def(self, table_definition: BQTableDefinition) -> BQTable:
         return table_definition.load_to_bq(self._bq_client)
 
@@ -91,11 +240,28 @@ class BQConfigRunner(BaseRunner):
     def __init__(
         self,
         bq_client: bq.Client,
-        bq_executor_func: Callable[[Dict[str, Any], Optional[Dict[str, str]]], None],
+        bq_executor_func: Callable[[MutableMapping[str, Any], Optional[Dict[str, str]]], None],
         dataset: str = "bquest",
         clean_up: bool = True,
+        datasets: Optional[List[str]] = None,
+        prune_columns: bool = False,
+        use_session: bool = False,
     ):
-        super().__init__(bq_client, dataset)
+        """
+
+        Args:
+            bq_client: BigQuery client used for interaction with BigQuery
+            bq_executor_func: executes a substituted BQ configuration
+            dataset: dataset which will be used for testing
+            clean_up: boolean if tables should be cleaned up
+            datasets: pool of datasets result tables are spread across instead of a single dataset
+            prune_columns: loads only the columns of source tables the query of the BQ configuration
+                possibly reads, see bquest.sql.find_column_references
+            use_session: loads the source tables as temporary tables of a BigQuery session, which is closed
+                by close. The substituted configuration contains the entry connection_properties, which
+                bq_executor_func has to set on its QueryJobConfig to run the query inside the session.
+        """
+        super().__init__(bq_client, dataset, datasets, prune_columns, use_session)
         self._bq_executor_func = bq_executor_func
         self._clean_up = clean_up
 
@@ -107,7 +273,8 @@ class BQConfigRunner(BaseRunner):
         substitutor: BQConfigSubstitutor,
         result_table_definition: Optional[BQTableDefinition] = None,
         templating_vars: Optional[Dict[str, str]] = None,
-    ) -> pandas.DataFrame:
+        result_format: str = "pandas",
+    ) -> Union[pandas.DataFrame, Any]:
         """Runs a BQ configuration with custom table definitions.
 
         Args:
@@ -117,22 +284,193 @@ class BQConfigRunner(BaseRunner):
             substitutor:  a substitutor for BQ configurations
             result_table_definition: optional result table definition used for creating an empty result table
             templating_vars: variables that are inserted into the given bq configuration
+            result_format: one of pandas, pandas_arrow, pandas_categorical, arrow or polars
         Returns:
             the contents of the results table
         """
-        source_tables = self._create_source_tables(source_table_definitions)
-        result_table = (
-            self._create_result_table_from_def(result_table_definition)
-            if result_table_definition
-            else self._create_empty_result_table(substitutor.original_feature_table_name)
+        result_table = self._run_config(
+            start_date, end_date, source_table_definitions, substitutor, result_table_definition, templating_vars
+        )
+        return result_table.to_df(result_format)
+
+    def run_config_batches(
+        self,
+        start_date: str,
+        end_date: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutor: BQConfigSubstitutor,
+        result_table_definition: Optional[BQTableDefinition] = None,
+        templating_vars: Optional[Dict[str, str]] = None,
+        as_arrow: bool = False,
+        max_stream_count: Optional[int] = None,
+        bqstorage_client: Optional[Any] = None,
+    ) -> Iterator[Union[pandas.DataFrame, Any]]:
+        """Runs a BQ configuration with custom table definitions and streams the results table in batches.
+
+        Args:
+            start_date: the start date (e.g. 20190301)
+            end_date: the end date (e.g. 20190308)
+            source_table_definitions: custom table definitions that replace the source tables of the BQ configuration
+            substitutor:  a substitutor for BQ configurations
+            result_table_definition: optional result table definition used for creating an empty result table
+            templating_vars: variables that are inserted into the given bq configuration
+            as_arrow: yields pyarrow.RecordBatch instead of pandas DataFrame chunks if True
+            max_stream_count: maximum number of parallel read streams, determined by BigQuery if None
+            bqstorage_client: BigQuery Storage client, created with the credentials of the BigQuery client if None
+        Returns:
+            iterator over the contents of the results table
+        """
+        result_table = self._run_config(
+            start_date, end_date, source_table_definitions, substitutor, result_table_definition, templating_vars
+        )
+        return result_table.iter_batches(
+            as_arrow=as_arrow, max_stream_count=max_stream_count, bqstorage_client=bqstorage_client
         )
 
-        test_bq_config = substitutor.substitute(start_date, end_date, result_table, source_tables)
+    def run_config_lazy(
+        self,
+        start_date: str,
+        end_date: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutor: BQConfigSubstitutor,
+        result_table_definition: Optional[BQTableDefinition] = None,
+        templating_vars: Optional[Dict[str, str]] = None,
+    ) -> BQLazyResult:
+        """Runs a BQ configuration with custom table definitions without fetching the results table.
+
+        Args:
+            start_date: the start date (e.g. 20190301)
+            end_date: the end date (e.g. 20190308)
+            source_table_definitions: custom table definitions that replace the source tables of the BQ configuration
+            substitutor:  a substitutor for BQ configurations
+            result_table_definition: optional result table definition used for creating an empty result table
+            templating_vars: variables that are inserted into the given bq configuration
+        Returns:
+            a lazy handle on the results table
+        """
+        result_table = self._run_config(
+            start_date, end_date, source_table_definitions, substitutor, result_table_definition, templating_vars
+        )
+        return result_table.lazy()
+
+    def run_config_sweep(
+        self,
+        date_windows: List[Tuple[str, str]],
+        source_table_definitions: List[BQTableDefinition],
+        substitutor: BQConfigSubstitutor,
+        templating_vars: Optional[Dict[str, str]] = None,
+        result_format: str = "pandas",
+        max_workers: int = 4,
+    ) -> Dict[Tuple[str, str], Union[pandas.DataFrame, Any]]:
+        """Runs a BQ configuration for several date windows on the same source tables.
+
+        The source tables are loaded once and the windows run in parallel, each into its own result table,
+        so N windows cost N runs of the configuration instead of N set-ups of the source tables.
+        bq_executor_func is called from several threads if max_workers is greater than one. With use_session,
+        the windows run one after another, because a BigQuery session runs a single query at a time.
+
+        Args:
+            date_windows: start and end dates of the windows (e.g. [("20190301", "20190308")])
+            source_table_definitions: custom table definitions that replace the source tables of the BQ configuration
+            substitutor: a substitutor for BQ configurations
+            templating_vars: variables that are inserted into the given bq configuration
+            result_format: one of pandas, pandas_arrow, pandas_categorical, arrow or polars
+            max_workers: number of windows run in parallel, ignored with use_session
+        Returns:
+            the contents of the results table by window, in the order of the windows
+        """
+        windows = list(dict.fromkeys(date_windows))
+        for start_date, end_date in windows:
+            self._record_config(start_date, end_date, source_table_definitions, substitutor, templating_vars)
+        source_tables = self._create_config_source_tables(source_table_definitions, substitutor)
+
+        def run_window(window: Tuple[str, str]) -> Union[pandas.DataFrame, Any]:
+            start_date, end_date = window
+            # the inputs of all windows are recorded above in the order of the windows
+            result_table = self._run_config(
+                start_date,
+                end_date,
+                [],
+                substitutor,
+                None,
+                templating_vars,
+                existing_source_tables=source_tables,
+                record_inputs=False,
+            )
+            return result_table.to_df(result_format)
+
+        if self._session is not None:
+            max_workers = 1
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bquest-sweep") as executor:
+            # threads don't inherit context variables, so each window runs in its own copy of the caller's context
+            futures = [executor.submit(contextvars.copy_context().run, run_window, window) for window in windows]
+            results = [future.result() for future in futures]
+        return dict(zip(windows, results, strict=True))
+
+    def _record_config(
+        self,
+        start_date: str,
+        end_date: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutor: BQConfigSubstitutor,
+        templating_vars: Optional[Dict[str, str]],
+    ) -> None:
+        self._record_inputs(
+            source_table_definitions,
+            config={
+                "start_date": start_date,
+                "end_date": end_date,
+                "query": substitutor.query,
+                "source_table_ids": substitutor.source_table_ids,
+                "feature_table_name": substitutor.original_feature_table_name,
+                "templating_vars": templating_vars,
+            },
+        )
+
+    def _create_config_source_tables(
+        self, source_table_definitions: List[BQTableDefinition], substitutor: BQConfigSubstitutor
+    ) -> List[BQTable]:
+        if self._prune_columns and substitutor.query is not None:
+            table_names = {table_def.original_table_id: table_def.table_name for table_def in source_table_definitions}
+            source_table_definitions = self._select_referenced_columns(
+                [substitutor.reference_source_tables(substitutor.query, table_names)], source_table_definitions
+            )
+        return self._create_source_tables(source_table_definitions)
+
+    def _run_config(
+        self,
+        start_date: str,
+        end_date: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutor: BQConfigSubstitutor,
+        result_table_definition: Optional[BQTableDefinition],
+        templating_vars: Optional[Dict[str, str]],
+        existing_source_tables: Optional[List[BQTable]] = None,
+        record_inputs: bool = True,
+    ) -> BQTable:
+        if record_inputs:
+            self._record_config(start_date, end_date, source_table_definitions, substitutor, templating_vars)
+        source_tables = (existing_source_tables or []) + self._create_config_source_tables(
+            source_table_definitions, substitutor
+        )
+        empty_result_table_definition = None
+        if result_table_definition is None:
+            empty_result_table_definition = self._bq_table_def_builder.create_empty(
+                substitutor.original_feature_table_name
+            )
+        result_table = self._create_result_table_from_def(result_table_definition or empty_result_table_definition)
+
+        test_bq_config = substitutor.substitute(start_date, end_date, result_table, source_tables, templating_vars)
+        if self._session is not None:
+            test_bq_config["connection_properties"] = self._session.connection_properties
 
         # run config with substituted table identifiers
         self._bq_executor_func(test_bq_config, templating_vars)
+        if empty_result_table_definition is not None:
+            # the configuration creates the result table, so it is labeled for bquest gc afterwards
+            empty_result_table_definition.label_created_table(self._bq_client)
 
-        return result_table.to_df()
+        return result_table
 
 
 class BQConfigFileRunner:
@@ -151,9 +489,14 @@ class BQConfigFileRunner:
         result_table_definition: Optional[BQTableDefinition] = None,
         allow_partial_table_substitutions: Optional[bool] = False,
         templating_vars: Optional[Dict[str, str]] = None,
-    ) -> pandas.DataFrame:
+        result_format: str = "pandas",
+    ) -> Union[pandas.DataFrame, Any]:
         """Runs a BQ configuration file"""
-        with open(os.path.join(self._config_base_path, path_to_config), "r", encoding="UTF-8") as f:
+        file = os.path.join(self._config_base_path, path_to_config)
+        fingerprint = current_fingerprint()
+        if fingerprint is not None:
+            fingerprint.add_file(file)
+        with open(file, "r", encoding="UTF-8") as f:
             try:
                 config = ast.literal_eval(f.read())
             except ValueError as e:
@@ -165,8 +508,139 @@ class BQConfigFileRunner:
                 BQConfigSubstitutor(config, allow_partial=allow_partial_table_substitutions),
                 result_table_definition=result_table_definition,
                 templating_vars=templating_vars,
+                result_format=result_format,
+            )
+
+
+class BQConfigPipelineRunner(BQConfigRunner):
+    """Runs chains of BQ configurations, where results of one configuration are sources of others"""
+
+    def __init__(
+        self,
+        bq_client: bq.Client,
+        bq_executor_func: Callable[[MutableMapping[str, Any], Optional[Dict[str, str]]], None],
+        dataset: str = "bquest",
+        clean_up: bool = True,
+        datasets: Optional[List[str]] = None,
+        max_workers: int = 4,
+        prune_columns: bool = False,
+        use_session: bool = False,
+    ):
+        """
+
+        Args:
+            bq_client: BigQuery client used for interaction with BigQuery
+            bq_executor_func: function executing a single BQ configuration
+            dataset: dataset which will be used for testing
+            clean_up: boolean if tables should be cleaned up
+            datasets: pool of datasets result tables are spread across instead of a single dataset
+            max_workers: maximum number of source tables loaded and configurations executed in parallel
+            prune_columns: loads only the columns of source tables the queries of the BQ configurations
+                possibly read, see bquest.sql.find_column_references
+            use_session: loads the source tables as temporary tables of a BigQuery session, see BQConfigRunner.
+                The configurations run one after another, because a session runs a single query at a time.
+        """
+        super().__init__(bq_client, bq_executor_func, dataset, clean_up, datasets, prune_columns, use_session)
+        self._max_workers = max_workers
+
+    @staticmethod
+    def _find_upstream_steps(substitutors: List[BQConfigSubstitutor]) -> Dict[str, Set[str]]:
+        """Maps the feature table of each step to the feature tables of the steps it reads from."""
+        feature_tables = {substitutor.original_feature_table_name for substitutor in substitutors}
+        if len(feature_tables) != len(substitutors):
+            raise ValueError("Every configuration of a pipeline needs a distinct feature table.")
+        return {
+            substitutor.original_feature_table_name: set(substitutor.source_table_ids) & feature_tables
+            for substitutor in substitutors
+        }
+
+    def run_pipeline(
+        self,
+        start_date: str,
+        end_date: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutors: List[BQConfigSubstitutor],
+        outputs: Optional[List[str]] = None,
+        templating_vars: Optional[Dict[str, str]] = None,
+        result_format: str = "pandas",
+    ) -> Dict[str, Union[pandas.DataFrame, Any]]:
+        """Runs BQ configurations in the order of their dependencies.
+
+        A configuration depends on another one if one of its source tables is the feature table of the other one.
+        Its result table is then substituted directly, without downloading it. Independent configurations run
+        in parallel.
+
+        Args:
+            start_date: the start date (e.g. 20190301)
+            end_date: the end date (e.g. 20190308)
+            source_table_definitions: custom table definitions that replace the source tables of the pipeline
+            substitutors: substitutors of the BQ configurations of the pipeline
+            outputs: original feature table names which are downloaded, defaults to those no configuration reads
+            templating_vars: variables that are inserted into all given bq configurations
+            result_format: one of pandas, pandas_arrow, pandas_categorical, arrow or polars
+        Returns:
+            the contents of the output tables by original feature table name
+        """
+        upstream_steps = self._find_upstream_steps(substitutors)
+        substitutors_by_table = {substitutor.original_feature_table_name: substitutor for substitutor in substitutors}
+        if outputs is None:
+            consumed = set().union(*upstream_steps.values())
+            outputs = [table for table in substitutors_by_table if table not in consumed]
+        unknown_outputs = [table for table in outputs if table not in substitutors_by_table]
+        if unknown_outputs:
+            raise ValueError(f"Found no configuration for outputs {unknown_outputs}")
+
+        # the inputs of all configurations are recorded in their order, so that fingerprints are reproducible
+        for substitutor in substitutors:
+            self._record_config(start_date, end_date, [], substitutor, templating_vars)
+
+        queries = [substitutor.query for substitutor in substitutors]
+        if self._prune_columns and all(query is not None for query in queries):
+            table_names = {table_def.original_table_id: table_def.table_name for table_def in source_table_definitions}
+            source_table_definitions = self._select_referenced_columns(
+                [
+                    substitutor.reference_source_tables(query, table_names)
+                    for substitutor, query in zip(substitutors, queries, strict=True)
+                ],
+                source_table_definitions,
             )
 
+        max_workers = 1 if self._session is not None else self._max_workers
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            tables = self._create_source_tables(source_table_definitions, executor)
+            result_tables: Dict[str, BQTable] = {}
+            running: Dict[Future, str] = {}
+            pending = set(substitutors_by_table)
+
+            while pending or running:
+                ready = [table for table in pending if upstream_steps[table] <= result_tables.keys()]
+                if not ready and not running:
+                    raise ValueError(f"Found cyclic dependencies between configurations {sorted(pending)}")
+                for table in ready:
+                    pending.remove(table)
+                    upstream_tables = tables + [result_tables[upstream] for upstream in upstream_steps[table]]
+                    # each configuration runs in its own copy of the caller's context, like the source tables
+                    future = executor.submit(
+                        contextvars.copy_context().run,
+                        self._run_config,
+                        start_date,
+                        end_date,
+                        [],
+                        substitutors_by_table[table],
+                        None,
+                        templating_vars,
+                        upstream_tables,
+                        record_inputs=False,
+                    )
+                    running[future] = table
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result_tables[running.pop(future)] = future.result()
+
+            output_dfs = executor.map(lambda table: result_tables[table].to_df(result_format), outputs)
+            return dict(zip(outputs, output_dfs, strict=True))
+
 
 class SQLRunner(BaseRunner):
     """Runs SQL queries on custom data for testing"""
@@ -176,6 +650,9 @@ class SQLRunner(BaseRunner):
         bq_client: bq.Client,
         dataset: str = "bquest",
         clean_up: Optional[bool] = True,
+        datasets: Optional[List[str]] = None,
+        prune_columns: bool = False,
+        use_session: bool = False,
     ):
         """
 
@@ -183,8 +660,13 @@ class SQLRunner(BaseRunner):
             bq_client: BigQuery client used for interaction with BigQuery
             dataset: dataset which will be used for testing
             clean_up:  boolean if tables should be cleaned up
+            datasets: pool of datasets result tables are spread across instead of a single dataset
+            prune_columns: loads only the columns of source tables the substituted query possibly reads,
+                see bquest.sql.find_column_references
+            use_session: loads the source tables as temporary tables of a BigQuery session, which is closed
+                by close, and runs the queries inside the session
         """
-        super(SQLRunner, self).__init__(bq_client, dataset)
+        super(SQLRunner, self).__init__(bq_client, dataset, datasets, prune_columns, use_session)
         self._bq_client = bq_client
         self._clean_up = clean_up
 
@@ -195,7 +677,9 @@ class SQLRunner(BaseRunner):
         substitutions: Optional[Dict[str, str]] = None,
         string_replacements: Optional[Dict[str, str]] = None,
         result_table_definition: Optional[BQTableDefinition] = None,
-    ) -> pandas.DataFrame:
+        result_format: str = "pandas",
+        query_parameters: Optional[Dict[str, Any]] = None,
+    ) -> Union[pandas.DataFrame, Any]:
         """
 
         Args:
@@ -206,32 +690,245 @@ class SQLRunner(BaseRunner):
             This leads to error when trying to substitute the regex which shouldn't be substituted.
             string_replacements: entire string replacements for the query, substitutions are placed before
             result_table_definition: result table definition
+            result_format: one of pandas, pandas_arrow, pandas_categorical, arrow or polars
+            query_parameters: values by name passed as typed query parameters, referenced as @name in the query,
+                so the query text stays the same for different values
+
+        Returns:
+            pandas DataFrame of result table or the result in the requested result format
+        """
+        rows = self._run_query(
+            sql, source_table_definitions, substitutions, string_replacements, result_table_definition, query_parameters
+        )
+        return convert_result(rows, result_format)
+
+    def run_batches(
+        self,
+        sql: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutions: Optional[Dict[str, str]] = None,
+        string_replacements: Optional[Dict[str, str]] = None,
+        result_table_definition: Optional[BQTableDefinition] = None,
+        as_arrow: bool = False,
+        max_stream_count: Optional[int] = None,
+        query_parameters: Optional[Dict[str, Any]] = None,
+        bqstorage_client: Optional[Any] = None,
+    ) -> Iterator[Union[pandas.DataFrame, Any]]:
+        """Runs the query like run, but streams the result in batches instead of loading it at once
+
+        Args:
+            sql: SQL query that is being executed in BigQuery
+            source_table_definitions: source table definitions, list of BQTableDefinition
+            substitutions: substitutions for the given query
+            string_replacements: entire string replacements for the query, substitutions are placed before
+            result_table_definition: result table definition
+            as_arrow: yields pyarrow.RecordBatch instead of pandas DataFrame chunks if True
+            max_stream_count: maximum number of parallel read streams, determined by BigQuery if None
+            query_parameters: values by name passed as typed query parameters, referenced as @name in the query,
+                so the query text stays the same for different values
+            bqstorage_client: BigQuery Storage client, created with the credentials of the BigQuery client if None
+
+        Returns:
+            iterator over pandas DataFrames or pyarrow RecordBatches of the result
+        """
+        rows = self._run_query(
+            sql, source_table_definitions, substitutions, string_replacements, result_table_definition, query_parameters
+        )
+        return iter_row_batches(rows, as_arrow, max_stream_count, bqstorage_client)
+
+    def run_cte(
+        self,
+        sql: str,
+        cte_name: str,
+        source_table_definitions: List[BQTableDefinition],
+        cte_table_definitions: Optional[Dict[str, BQTableDefinition]] = None,
+        substitutions: Optional[Dict[str, str]] = None,
+        string_replacements: Optional[Dict[str, str]] = None,
+        result_format: str = "pandas",
+        query_parameters: Optional[Dict[str, Any]] = None,
+    ) -> Union[pandas.DataFrame, Any]:
+        """Runs only a single CTE of the query and the CTEs it depends on
+
+        Args:
+            sql: SQL query starting with a WITH clause
+            cte_name: name of the CTE whose result is returned
+            source_table_definitions: source table definitions of the tables read by the executed CTEs
+            cte_table_definitions: table definitions replacing upstream CTEs by name, the CTEs these depend on
+                are not executed
+            substitutions: substitutions for the given query
+            string_replacements: entire string replacements for the query, substitutions are placed before
+            result_format: one of pandas, pandas_arrow, pandas_categorical, arrow or polars
+            query_parameters: values by name passed as typed query parameters, referenced as @name in the query,
+                so the query text stays the same for different values
+
+        Returns:
+            pandas DataFrame of the CTE's result or the result in the requested result format
+        """
+        cte_tables = {
+            name: self._create_source_tables([table_def])[0].fq_test_table_id
+            for name, table_def in (cte_table_definitions or {}).items()
+        }
+        query_job = self._start_query(
+            sql,
+            source_table_definitions,
+            substitutions,
+            string_replacements,
+            None,
+            bq.QueryJobConfig(),
+            query_parameters,
+            rewrite_sql=lambda query: extract_cte(query, cte_name, cte_tables),
+        )
+        return convert_result(query_job.result(), result_format)
+
+    def run_lazy(
+        self,
+        sql: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutions: Optional[Dict[str, str]] = None,
+        string_replacements: Optional[Dict[str, str]] = None,
+        result_table_definition: Optional[BQTableDefinition] = None,
+        query_parameters: Optional[Dict[str, Any]] = None,
+    ) -> BQLazyResult:
+        """Runs the query like run, but returns a lazy handle on its result instead of fetching it
+
+        Args:
+            sql: SQL query that is being executed in BigQuery
+            source_table_definitions: source table definitions, list of BQTableDefinition
+            substitutions: substitutions for the given query
+            string_replacements: entire string replacements for the query, substitutions are placed before
+            result_table_definition: result table definition
+            query_parameters: values by name passed as typed query parameters, referenced as @name in the query,
+                so the query text stays the same for different values
 
         Returns:
-            pandas DataFrame of result table
+            lazy handle on the destination table of the query
         """
+        query_job = self._start_query(
+            sql,
+            source_table_definitions,
+            substitutions,
+            string_replacements,
+            result_table_definition,
+            bq.QueryJobConfig(),
+            query_parameters,
+        )
+        query_job.result()
+        destination = query_job.destination
+        return BQLazyResult(f"{destination.project}.{destination.dataset_id}.{destination.table_id}", self._bq_client)
 
+    def profile(
+        self,
+        sql: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutions: Optional[Dict[str, str]] = None,
+        string_replacements: Optional[Dict[str, str]] = None,
+        result_table_definition: Optional[BQTableDefinition] = None,
+        query_parameters: Optional[Dict[str, Any]] = None,
+    ) -> QueryStatistics:
+        """Runs the query like run, but returns its job statistics instead of its result
+
+        The query cache is disabled, so the statistics always reflect a full execution of the query.
+
+        Args:
+            sql: SQL query that is being executed in BigQuery
+            source_table_definitions: source table definitions, list of BQTableDefinition
+            substitutions: substitutions for the given query
+            string_replacements: entire string replacements for the query, substitutions are placed before
+            result_table_definition: result table definition
+            query_parameters: values by name passed as typed query parameters, referenced as @name in the query,
+                so the query text stays the same for different values
+
+        Returns:
+            statistics of the query job
+        """
+        job_config = bq.QueryJobConfig(use_query_cache=False)
+        query_job = self._start_query(
+            sql,
+            source_table_definitions,
+            substitutions,
+            string_replacements,
+            result_table_definition,
+            job_config,
+            query_parameters,
+        )
+        query_job.result()
+        return QueryStatistics.from_query_job(query_job)
+
+    def _run_query(
+        self,
+        sql: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutions: Optional[Dict[str, str]],
+        string_replacements: Optional[Dict[str, str]],
+        result_table_definition: Optional[BQTableDefinition],
+        query_parameters: Optional[Dict[str, Any]] = None,
+    ) -> bq.table.RowIterator:
+        query_job = self._start_query(
+            sql,
+            source_table_definitions,
+            substitutions,
+            string_replacements,
+            result_table_definition,
+            bq.QueryJobConfig(),
+            query_parameters,
+        )
+        return query_job.result()
+
+    def _start_query(
+        self,
+        sql: str,
+        source_table_definitions: List[BQTableDefinition],
+        substitutions: Optional[Dict[str, str]],
+        string_replacements: Optional[Dict[str, str]],
+        result_table_definition: Optional[BQTableDefinition],
+        job_config: bq.QueryJobConfig,
+        query_parameters: Optional[Dict[str, Any]] = None,
+        rewrite_sql: Optional[Callable[[str], str]] = None,
+    ) -> bq.QueryJob:
         if substitutions is None:
             substitutions = {}
 
         if string_replacements is None:
             string_replacements = {}
 
+        self._record_inputs(
+            source_table_definitions,
+            query={
+                "sql": sql,
+                "substitutions": substitutions,
+                "string_replacements": string_replacements,
+                "query_parameters": query_parameters,
+            },
+        )
+        sql_with_substitutions = sql.format(**substitutions) if substitutions else sql
+        for key, value in string_replacements.items():
+            sql_with_substitutions = sql_with_substitutions.replace(key, value)
+
+        if rewrite_sql is not None:
+            sql_with_substitutions = rewrite_sql(sql_with_substitutions)
+
+        if self._prune_columns:
+            selected_definitions = self._select_referenced_columns([sql_with_substitutions], source_table_definitions)
+            for table_def, selected_def in zip(source_table_definitions, selected_definitions, strict=True):
+                # selections are placed next to their definition, so only the unique table names differ
+                sql_with_substitutions = sql_with_substitutions.replace(table_def.table_name, selected_def.table_name)
+            source_table_definitions = selected_definitions
+
+        if self._session is not None:
+            sql_with_substitutions = self._session.reference_tables(sql_with_substitutions, source_table_definitions)
+            self._session.apply(job_config)
+
         _ = self._create_source_tables(source_table_definitions)
         _ = (
             self._create_result_table_from_def(result_table_definition)
             if result_table_definition
             else self._create_empty_result_table("result")
         )
-        sql_with_substitutions = sql.format(**substitutions) if substitutions else sql
-        for key, value in string_replacements.items():
-            sql_with_substitutions = sql_with_substitutions.replace(key, value)
 
-        job_config = bq.QueryJobConfig()
-        query_job = self._bq_client.query(sql_with_substitutions, job_config=job_config)
-        query_job.result()
+        if query_parameters:
+            job_config.query_parameters = to_query_parameters(query_parameters)
 
-        return query_job.result().to_dataframe()
+        return self._bq_client.query(sql_with_substitutions, job_config=job_config)
 
 
 class SQLFileRunner:
@@ -253,7 +950,9 @@ class SQLFileRunner:
         source_table_definitions: List[BQTableDefinition],
         substitutions: Optional[Dict[str, str]] = None,
         string_replacements: Optional[Dict[str, str]] = None,
-    ) -> pandas.DataFrame:
+        result_format: str = "pandas",
+        query_parameters: Optional[Dict[str, Any]] = None,
+    ) -> Union[pandas.DataFrame, Any]:
         """
 
         Args:
@@ -261,6 +960,8 @@ class SQLFileRunner:
             source_table_definitions: source table definitions
             substitutions: substitutions for SQL query
             string_replacements: entire string replacements for the query, substitutions are placed before
+            result_format: one of pandas, pandas_arrow, pandas_categorical, arrow or polars
+            query_parameters: values by name passed as typed query parameters, referenced as @name in the query
 
         Returns:
 
@@ -277,4 +978,14 @@ class SQLFileRunner:
                 sql = f.read()
         except IOError as e:
             raise ValueError(f"Could not read the SQL file {file}.") from e
-        return self._sql_runner.run(sql, source_table_definitions, substitutions, string_replacements)
+        fingerprint = current_fingerprint()
+        if fingerprint is not None:
+            fingerprint.add_file(file)
+        return self._sql_runner.run(
+            sql,
+            source_table_definitions,
+            substitutions,
+            string_replacements,
+            result_format=result_format,
+            query_parameters=query_parameters,
+        )
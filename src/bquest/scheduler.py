@@ -0,0 +1,156 @@
+"""Module for scheduling table operations within BigQuery rate limits"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional, TypeVar
+
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    from google.api_core import exceptions
+else:
+    exceptions = lazy_import("google.api_core.exceptions")
+
+T = TypeVar("T")
+
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "Exceeded rate limits")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket which refills at a constant rate up to its capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+
+        Args:
+            rate: tokens added per second
+            capacity: maximum number of tokens, i.e. the allowed burst
+        """
+        if rate <= 0 or capacity < 1:
+            raise ValueError("'rate' has to be positive and 'capacity' at least one.")
+
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Takes a token, blocks until one is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self._rate
+            time.sleep(wait_seconds)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Checks if an error is caused by exceeded rate limits or is a transient server error
+
+    Args:
+        error: error raised by a BigQuery API call or job
+
+    Returns:
+        bool if the operation is worth retrying
+    """
+    if isinstance(error, (exceptions.TooManyRequests, exceptions.ServiceUnavailable, exceptions.InternalServerError)):
+        return True
+    if isinstance(error, (exceptions.Forbidden, exceptions.BadRequest)):
+        reasons = [str(e.get("reason", "")) for e in (error.errors or []) if isinstance(e, dict)]
+        return any(reason in str(error) or reason in reasons for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+class TableOperationScheduler:
+    """
+    Runs table create, update and delete operations with one token bucket per dataset and retries
+    operations that failed due to rate limits with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        operations_per_second: float = 5.0,
+        burst: int = 10,
+        max_attempts: int = 6,
+        initial_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 32.0,
+    ) -> None:
+        """
+
+        Args:
+            operations_per_second: sustained rate of operations per dataset
+            burst: number of operations per dataset which may run at once before throttling
+            max_attempts: number of attempts per operation before the error is raised
+            initial_backoff_seconds: upper bound of the first backoff
+            max_backoff_seconds: upper bound of all backoffs
+        """
+        self._operations_per_second = operations_per_second
+        self._burst = burst
+        self._max_attempts = max_attempts
+        self._initial_backoff_seconds = initial_backoff_seconds
+        self._max_backoff_seconds = max_backoff_seconds
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, dataset: str) -> TokenBucket:
+        with self._lock:
+            if dataset not in self._buckets:
+                self._buckets[dataset] = TokenBucket(self._operations_per_second, self._burst)
+            return self._buckets[dataset]
+
+    def _backoff_seconds(self, attempt: int) -> float:
+        # full jitter: spreads the retries of concurrent workers hitting the same limit
+        upper_bound = min(self._max_backoff_seconds, self._initial_backoff_seconds * 2**attempt)
+        return random.uniform(0, upper_bound)  # noqa: S311, no cryptographic use
+
+    def run(self, dataset: str, operation: Callable[[int], T]) -> T:
+        """Runs an operation on a table of the given dataset
+
+        Args:
+            dataset: fully qualified dataset, e.g. my-project.bquest
+            operation: operation which gets the zero-based attempt, e.g. to derive idempotent job ids
+
+        Returns:
+            the result of the operation
+        """
+        bucket = self._bucket(dataset)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            try:
+                return operation(attempt)
+            except exceptions.GoogleAPICallError as e:
+                if attempt + 1 >= self._max_attempts or not is_rate_limit_error(e):
+                    raise
+            time.sleep(self._backoff_seconds(attempt))
+            attempt += 1
+
+
+_default_scheduler: Optional[TableOperationScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler() -> TableOperationScheduler:
+    """Returns the scheduler shared by all tables and table definitions without an explicit scheduler"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = TableOperationScheduler()
+        return _default_scheduler
+
+
+def set_default_scheduler(scheduler: TableOperationScheduler) -> None:
+    """Replaces the shared scheduler, e.g. to adapt it to the quotas of a project"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        _default_scheduler = scheduler
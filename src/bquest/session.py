@@ -0,0 +1,134 @@
+"""Module for running tests inside BigQuery sessions with temporary tables"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery as bq
+
+    from bquest.tables import BQTable, BQTableDefinition
+else:
+    bq = lazy_import("google.cloud.bigquery")
+
+
+class BQSession:
+    """
+    A BigQuery session whose temporary tables hold the test tables of a test or a worker.
+
+    Temporary tables are dropped by BigQuery when the session is closed or expires, so they need
+    neither labels, an expiration nor a cleanup and don't show up in the datasets.
+    """
+
+    def __init__(self, bq_client: bq.Client, location: str = "EU") -> None:
+        """
+
+        Args:
+            bq_client: BigQuery client for interacting with BigQuery
+            location: location of the session, the location of all tables read in the session
+        """
+        self._bq_client = bq_client
+        self._location = location
+        self._session_id: Optional[str] = None
+        self._tables: Dict[BQTableDefinition, BQTable] = {}
+        # reentrant, because loading a clone loads its base table in the session first
+        self._lock = threading.RLock()
+
+    @property
+    def location(self) -> str:
+        return self._location
+
+    @property
+    def session_id(self) -> str:
+        """Returns the id of the session, the session is created on first access"""
+        with self._lock:
+            if self._session_id is None:
+                query_job = self._bq_client.query(
+                    "SELECT 1", job_config=bq.QueryJobConfig(create_session=True), location=self._location
+                )
+                query_job.result()
+                self._session_id = query_job.session_info.session_id
+            return self._session_id
+
+    @property
+    def connection_properties(self) -> List[Any]:
+        return [bq.ConnectionProperty("session_id", self.session_id)]
+
+    def apply(self, job_config: Any) -> Any:
+        """Runs a query or load job with the given configuration inside the session
+
+        Args:
+            job_config: QueryJobConfig or LoadJobConfig, changed in place
+
+        Returns:
+            the job configuration
+        """
+        job_config.connection_properties = self.connection_properties
+        return job_config
+
+    def job_kind(self, kind: str) -> str:
+        """Returns a job kind for the job ids of table definitions, unique per session
+
+        Args:
+            kind: kind of the job, e.g. load
+
+        Returns:
+            the kind suffixed with a hash of the session id
+        """
+        return f"{kind}_{hashlib.sha256(self.session_id.encode()).hexdigest()[:12]}"
+
+    @staticmethod
+    def table_id(table_name: str) -> str:
+        """Returns the id of a temporary table of the session"""
+        return f"_SESSION.{table_name}"
+
+    def reference_tables(self, sql: str, table_definitions: List[BQTableDefinition]) -> str:
+        """Rewrites a query to read the temporary tables of the table definitions
+
+        Args:
+            sql: query referencing the tables with their ids, e.g. my-project.bquest.orders_1234
+            table_definitions: definitions loaded in the session
+
+        Returns:
+            the query referencing the temporary tables
+        """
+        for table_def in table_definitions:
+            pattern = rf"(?:[A-Za-z0-9_-]+\.){{1,2}}{re.escape(table_def.table_name)}\b"
+            sql = re.sub(pattern, self.table_id(table_def.table_name), sql)
+        return sql
+
+    def load(self, table_definition: BQTableDefinition) -> BQTable:
+        """Loads a table definition to a temporary table unless it has been loaded in the session before
+
+        Args:
+            table_definition: definition of the table
+
+        Returns:
+            the temporary table
+        """
+        with self._lock:
+            if table_definition not in self._tables:
+                self._tables[table_definition] = table_definition.load_to_session(self._bq_client, self)
+            return self._tables[table_definition]
+
+    def close(self) -> None:
+        """Ends the session, which drops its temporary tables"""
+        with self._lock:
+            if self._session_id is None:
+                return
+            self._bq_client.query(
+                "CALL BQ.ABORT_SESSION()", job_config=self.apply(bq.QueryJobConfig()), location=self._location
+            ).result()
+            self._session_id = None
+            self._tables = {}
+
+    def __enter__(self) -> "BQSession":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
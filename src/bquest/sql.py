@@ -0,0 +1,304 @@
+"""Helpers for analyzing and rewriting BigQuery SQL"""
+
+import re
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+    | (?P<string>'''.*?'''|\"\"\".*?\"\"\"|'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+    | (?P<quoted_id>`(?:\\.|[^`\\])*`)
+    | (?P<word>[A-Za-z_][A-Za-z_0-9]*)
+    | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class Token:
+    """
+    A token of a SQL query with its position.
+    """
+
+    def __init__(self, kind: str, text: str, start: int, end: int) -> None:
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+
+    @property
+    def identifier(self) -> Optional[str]:
+        """Returns the lower-cased identifier of word and quoted identifier tokens"""
+        if self.kind == "word":
+            return self.text.lower()
+        if self.kind == "quoted_id":
+            return self.text[1:-1].lower()
+        return None
+
+    def is_keyword(self, keyword: str) -> bool:
+        return self.kind == "word" and self.text.upper() == keyword
+
+
+def tokenize(sql: str) -> Iterator[Token]:
+    """Splits a SQL query into tokens, skipping whitespace and comments
+
+    Args:
+        sql: SQL query
+
+    Returns:
+        Iterator over the tokens of the query
+    """
+    for match in _TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup or "other"
+        if kind not in ("space", "comment"):
+            yield Token(kind, match.group(), match.start(), match.end())
+
+
+class CTE:
+    """
+    A common table expression of a query.
+    """
+
+    def __init__(self, name: str, body: str, dependencies: Set[str]) -> None:
+        """
+
+        Args:
+            name: name of the CTE as written in the query
+            body: query inside the parentheses of the CTE
+            dependencies: lower-cased names of the preceding CTEs referenced in the body
+        """
+        self.name = name
+        self.body = body
+        self.dependencies = dependencies
+
+
+def _find_closing_parenthesis(tokens: List[Token], index: int) -> int:
+    depth = 0
+    for i in range(index, len(tokens)):
+        if tokens[i].text == "(":
+            depth += 1
+        elif tokens[i].text == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("Unbalanced parentheses in query.")
+
+
+def parse_ctes(sql: str) -> Tuple[List[CTE], str, bool]:
+    """Splits a query into its top-level CTEs and its final statement
+
+    Args:
+        sql: SQL query starting with a WITH clause
+
+    Returns:
+        the CTEs in order of definition, the final statement and whether the WITH clause is recursive
+    """
+    tokens = list(tokenize(sql))
+    if not tokens or not tokens[0].is_keyword("WITH"):
+        raise ValueError("Query does not start with a WITH clause.")
+
+    recursive = len(tokens) > 1 and tokens[1].is_keyword("RECURSIVE")
+    index = 2 if recursive else 1
+    ctes: List[CTE] = []
+    while True:
+        if (
+            index + 2 >= len(tokens)
+            or tokens[index].identifier is None
+            or not tokens[index + 1].is_keyword("AS")
+            or tokens[index + 2].text != "("
+        ):
+            raise ValueError("Could not parse the WITH clause of the query.")
+        name = tokens[index].text.strip("`")
+        closing = _find_closing_parenthesis(tokens, index + 2)
+        known_names = {cte.name.lower() for cte in ctes}
+        if recursive:
+            known_names.add(name.lower())
+        dependencies = {str(t.identifier) for t in tokens[index + 3 : closing] if t.identifier} & known_names
+        ctes.append(CTE(name, sql[tokens[index + 2].end : tokens[closing].start], dependencies))
+
+        index = closing + 1
+        if index < len(tokens) and tokens[index].text == ",":
+            index += 1
+            continue
+        break
+
+    final_statement = sql[tokens[index].start :] if index < len(tokens) else ""
+    return ctes, final_statement, recursive
+
+
+def extract_cte(sql: str, cte_name: str, replaced_ctes: Optional[Dict[str, str]] = None) -> str:
+    """Rewrites a query so that it returns the result of one of its CTEs
+
+    Only the CTE and the CTEs it depends on are kept, all others and the final statement are dropped.
+
+    Args:
+        sql: SQL query starting with a WITH clause
+        cte_name: name of the CTE whose result is returned
+        replaced_ctes: CTE names mapped to fully qualified table ids which replace the CTEs, the upstream
+            CTEs of replaced CTEs are dropped as well
+
+    Returns:
+        the rewritten query
+    """
+    replaced = {name.lower(): table_id for name, table_id in (replaced_ctes or {}).items()}
+    ctes, _, recursive = parse_ctes(sql)
+    ctes_by_name = {cte.name.lower(): cte for cte in ctes}
+    unknown_names = [name for name in [cte_name.lower(), *replaced] if name not in ctes_by_name]
+    if unknown_names:
+        raise ValueError(f"Query has no CTEs named {unknown_names}.")
+
+    required: Set[str] = set()
+    pending = [cte_name.lower()]
+    while pending:
+        name = pending.pop()
+        if name in required:
+            continue
+        required.add(name)
+        if name not in replaced:
+            pending.extend(ctes_by_name[name].dependencies)
+
+    definitions = []
+    for cte in ctes:
+        name = cte.name.lower()
+        if name in required:
+            # replacing table ids are generated by bquest table definitions
+            body = f"SELECT * FROM `{replaced[name]}`" if name in replaced else cte.body  # noqa: S608
+            definitions.append(f"`{cte.name}` AS ({body})")
+
+    with_clause = "WITH RECURSIVE" if recursive else "WITH"
+    return f"{with_clause} " + ",\n".join(definitions) + f"\nSELECT * FROM `{ctes_by_name[cte_name.lower()].name}`"
+
+
+# tokens after which a * selects all columns instead of multiplying
+_STAR_PREDECESSORS = {"SELECT", "DISTINCT", "ALL", "STRUCT", "VALUE", ",", "."}
+
+
+def _has_star_select(tokens: List[Token]) -> bool:
+    return any(
+        token.text == "*" and tokens[index - 1].text.upper() in _STAR_PREDECESSORS
+        for index, token in enumerate(tokens)
+        if index > 0
+    )
+
+
+def _referenced_names(tokens: List[Token], names: Set[str]) -> Set[str]:
+    """Returns the names referenced by the tokens, also as last part of paths like dataset.table"""
+    referenced = set()
+    for token in tokens:
+        identifier = token.identifier
+        if identifier is not None:
+            referenced.update({identifier, identifier.rsplit(".", 1)[-1]} & names)
+    return referenced
+
+
+# keywords which may follow a table in a FROM clause instead of an alias
+_NON_ALIAS_KEYWORDS = set(
+    "CROSS EXCEPT FOR FULL GROUP HAVING INNER INTERSECT JOIN LEFT LIMIT ON ORDER PIVOT QUALIFY RIGHT SELECT "
+    "TABLESAMPLE UNION UNPIVOT USING WHERE WINDOW WITH".split()
+)
+# keywords ending a FROM clause, after which commas separate expressions instead of tables
+_CLAUSE_KEYWORDS = {"SELECT", "WHERE", "GROUP", "HAVING", "QUALIFY", "WINDOW", "ORDER", "LIMIT", "ON", "USING"}
+
+
+def _row_value_references(tokens: List[Token], names: Set[str]) -> Set[str]:
+    """Returns the names of tables referenced as row values, e.g. o in SELECT TO_JSON_STRING(o) FROM t o
+
+    A table or its alias which is used outside of a FROM clause and not as the head of a path like
+    alias.column stands for whole rows of the table.
+    """
+    aliases: Dict[str, str] = {}
+    declarations: Set[int] = set()
+    clauses: List[str] = [""]
+    for index, token in enumerate(tokens):
+        if token.text == "(":
+            clauses.append("")
+        elif token.text == ")" and len(clauses) > 1:
+            clauses.pop()
+        elif token.kind == "word" and token.text.upper() in _CLAUSE_KEYWORDS | {"FROM", "JOIN"}:
+            clauses[-1] = "FROM" if token.text.upper() in ("FROM", "JOIN") else token.text.upper()
+
+        identifier = token.identifier
+        if identifier is None or identifier.rsplit(".", 1)[-1] not in names:
+            continue
+        if index + 2 < len(tokens) and tokens[index + 1].is_keyword("AS") and tokens[index + 2].text == "(":
+            # name of a CTE
+            declarations.add(index)
+            continue
+        start = index
+        while start >= 2 and tokens[start - 1].text == "." and tokens[start - 2].identifier is not None:
+            start -= 2
+        previous = tokens[start - 1] if start > 0 else None
+        if previous is None or not (
+            previous.is_keyword("FROM")
+            or previous.is_keyword("JOIN")
+            or (previous.text == "," and clauses[-1] == "FROM")
+        ):
+            continue
+        declarations.update(range(start, index + 1))
+        alias_index = index + 2 if index + 1 < len(tokens) and tokens[index + 1].is_keyword("AS") else index + 1
+        if alias_index < len(tokens):
+            alias = tokens[alias_index]
+            if alias.identifier is not None and alias.text.upper() not in _NON_ALIAS_KEYWORDS:
+                aliases[alias.identifier] = identifier.rsplit(".", 1)[-1]
+                declarations.add(alias_index)
+
+    referenced = set()
+    for index, token in enumerate(tokens):
+        identifier = token.identifier
+        if identifier is None or index in declarations:
+            continue
+        in_path = (index > 0 and tokens[index - 1].text == ".") or (
+            index + 1 < len(tokens) and tokens[index + 1].text == "."
+        )
+        if not in_path and (identifier in names or identifier in aliases):
+            referenced.add(aliases.get(identifier, identifier))
+    return referenced
+
+
+def find_column_references(sql: str, table_names: List[str]) -> Dict[str, Optional[Set[str]]]:
+    """Finds the columns of tables which a query possibly reads
+
+    The analysis is conservative: every identifier of the query may be a column of every table it reads,
+    so the result is a superset of the read columns. A star selecting from a table directly or through a
+    chain of CTEs selecting stars up to the final statement may read all columns of the table, as does a
+    table or its alias used as a row value, e.g. in TO_JSON_STRING(o).
+
+    Args:
+        sql: SQL query
+        table_names: names of the tables, e.g. the names of test tables without project and dataset
+
+    Returns:
+        the lower-cased identifiers by lower-cased table name for all tables the query reads, None for
+        tables whose columns may all be read
+    """
+    names = {name.lower() for name in table_names}
+    try:
+        ctes, final_statement, _ = parse_ctes(sql)
+    except ValueError:
+        ctes, final_statement = [], sql
+
+    cte_names = {cte.name.lower() for cte in ctes}
+    scopes: Dict[str, List[Token]] = {cte.name.lower(): list(tokenize(cte.body)) for cte in ctes}
+    final_tokens = list(tokenize(final_statement))
+    tokens = list(tokenize(sql))
+    identifiers = {part for token in tokens if token.identifier for part in token.identifier.split(".")}
+
+    def star_reaches(scope_tokens: List[Token], visited: Set[str]) -> Set[str]:
+        """Returns the tables whose columns a scope selects all of via stars"""
+        if not _has_star_select(scope_tokens):
+            return set()
+        referenced = _referenced_names(scope_tokens, names | cte_names)
+        reached = referenced & names
+        for cte_name in (referenced & cte_names) - visited:
+            reached |= star_reaches(scopes[cte_name], visited | {cte_name})
+        return reached
+
+    fully_read = star_reaches(final_tokens, set())
+    for name in _row_value_references(tokens, names | cte_names):
+        if name in cte_names:
+            # whole rows of a CTE contain all columns of the tables it selects via stars
+            fully_read |= star_reaches(scopes[name], {name})
+        else:
+            fully_read.add(name)
+    return {name: None if name in fully_read else identifiers for name in _referenced_names(tokens, names)}
@@ -0,0 +1,151 @@
+"""Module for generating large synthetic test tables"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence
+
+from bquest.util import lazy_import
+
+if TYPE_CHECKING:
+    import google.cloud.bigquery as bq
+    import numpy as np
+    import pyarrow as pa
+else:
+    np = lazy_import("numpy")
+    pa = lazy_import("pyarrow")
+
+INTEGER_TYPES = ("INTEGER", "INT64")
+FLOAT_TYPES = ("FLOAT", "FLOAT64")
+BOOLEAN_TYPES = ("BOOLEAN", "BOOL")
+DEFAULT_CARDINALITY = 1000
+EPOCH_DATE = "2020-01-01"
+
+
+class ColumnDistribution:
+    """
+    Describes how the values of a synthetic column are distributed.
+
+    Integer and float columns are drawn uniformly from [low, high) or normally with mean and stddev.
+    String, date and timestamp columns are drawn from `cardinality` distinct values, optionally weighted.
+    """
+
+    def __init__(
+        self,
+        kind: str = "uniform",
+        low: float = 0,
+        high: Optional[float] = None,
+        mean: float = 0.0,
+        stddev: float = 1.0,
+        cardinality: Optional[int] = None,
+        values: Optional[Sequence[str]] = None,
+        weights: Optional[Sequence[float]] = None,
+        null_fraction: float = 0.0,
+    ) -> None:
+        """
+
+        Args:
+            kind: either uniform or normal
+            low: lower bound of uniformly distributed values
+            high: upper bound of uniformly distributed values, defaults to low + cardinality
+            mean: mean of normally distributed values
+            stddev: standard deviation of normally distributed values
+            cardinality: number of distinct values
+            values: explicit distinct values of a string column
+            weights: probabilities of the distinct values, uniform if not given
+            null_fraction: fraction of rows which are NULL
+        """
+        if kind not in ("uniform", "normal"):
+            raise ValueError(f"Unknown distribution {kind}, expected uniform or normal.")
+        if not 0.0 <= null_fraction <= 1.0:
+            raise ValueError("'null_fraction' has to be between 0 and 1.")
+
+        self._kind = kind
+        self._low = low
+        self._mean = mean
+        self._stddev = stddev
+        self._values = list(values) if values is not None else None
+        self._cardinality = len(self._values) if self._values is not None else (cardinality or DEFAULT_CARDINALITY)
+        self._high = high if high is not None else low + self._cardinality
+        self._weights = np.asarray(weights, dtype=float) / np.sum(weights) if weights is not None else None
+        self._null_fraction = null_fraction
+
+        if self._weights is not None and len(self._weights) != self._cardinality:
+            raise ValueError("'weights' has to contain one probability per distinct value.")
+
+    def _codes(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        if self._weights is not None:
+            return rng.choice(self._cardinality, size=size, p=self._weights)
+        return rng.integers(0, self._cardinality, size=size)
+
+    def _numbers(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        if self._kind == "normal":
+            return rng.normal(self._mean, self._stddev, size=size)
+        return rng.uniform(self._low, self._high, size=size)
+
+    def generate(self, field: bq.SchemaField, rng: np.random.Generator, size: int) -> pa.Array:
+        """Generates the values of a column in a vectorized way
+
+        Args:
+            field: BigQuery schema field of the column
+            rng: random number generator
+            size: number of values
+
+        Returns:
+            Arrow array with the generated values
+        """
+        field_type = field.field_type.upper()
+        mask = rng.random(size) < self._null_fraction if self._null_fraction else None
+
+        if field_type in INTEGER_TYPES:
+            return pa.array(np.floor(self._numbers(rng, size)).astype(np.int64), mask=mask)
+        if field_type in FLOAT_TYPES:
+            return pa.array(self._numbers(rng, size), mask=mask)
+        if field_type in BOOLEAN_TYPES:
+            return pa.array(rng.random(size) < 0.5, mask=mask)
+        if field_type == "STRING":
+            vocabulary = pa.array(self._values or [f"{field.name}_{i}" for i in range(self._cardinality)])
+            indices = pa.array(self._codes(rng, size), mask=mask)
+            return pa.DictionaryArray.from_arrays(indices, vocabulary).cast(pa.string())
+        if field_type == "DATE":
+            return pa.array(np.datetime64(EPOCH_DATE, "D") + self._codes(rng, size), mask=mask)
+        if field_type == "TIMESTAMP":
+            seconds = self._codes(rng, size) * np.int64(86400) + rng.integers(0, 86400, size=size)
+            return pa.array(np.datetime64(EPOCH_DATE, "s") + seconds, mask=mask).cast(pa.timestamp("us", "UTC"))
+        raise ValueError(f"Synthetic data is not supported for column {field.name} of type {field.field_type}.")
+
+
+def generate_batches(
+    schema: List[bq.SchemaField],
+    num_rows: int,
+    distributions: Optional[Dict[str, ColumnDistribution]] = None,
+    chunk_size: int = 100_000,
+    seed: Optional[int] = None,
+) -> Iterator[pa.RecordBatch]:
+    """Generates synthetic rows for a BigQuery schema in chunks
+
+    Args:
+        schema: schema of the generated table, nested and repeated fields are not supported
+        num_rows: total number of rows
+        distributions: distributions per column name, columns without a distribution use the default one
+        chunk_size: maximum number of rows per record batch
+        seed: seed of the random number generator for reproducible data
+
+    Returns:
+        Iterator over Arrow record batches
+    """
+    distributions = distributions or {}
+    unknown_columns = set(distributions) - {field.name for field in schema}
+    if unknown_columns:
+        raise ValueError(f"Found distributions for columns which are not part of the schema: {sorted(unknown_columns)}")
+    for field in schema:
+        if field.mode == "REPEATED":
+            raise ValueError(f"Synthetic data is not supported for repeated column {field.name}.")
+
+    rng = np.random.default_rng(seed)
+    default_distribution = ColumnDistribution()
+    for offset in range(0, num_rows, chunk_size):
+        size = min(chunk_size, num_rows - offset)
+        yield pa.RecordBatch.from_arrays(
+            [distributions.get(field.name, default_distribution).generate(field, rng, size) for field in schema],
+            names=[field.name for field in schema],
+        )
@@ -1,16 +1,228 @@
 """Module for dealing with BigQueryTables"""
 
+from __future__ import annotations
+
+import base64
+import binascii
+import collections
+import datetime
+import hashlib
 import json
+import os
+import re
+import tempfile
+import threading
 import uuid
 from io import BytesIO
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from bquest.dataframe import _pandas_to_arrow
+from bquest.impact import find_source_files, hash_value
+from bquest.ingestion import INGESTION_MODES, arrow_to_bq_schema, get_write_client, write_arrow_table
+from bquest.scheduler import get_default_scheduler
+from bquest.synthetic import ColumnDistribution, generate_batches
+from bquest.util import is_sql, lazy_import
+
+if TYPE_CHECKING:
+    import google.cloud.bigquery as bq
+    import pandas as pd
+    import pandas_gbq as pd_gbq
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from google.api_core import exceptions
+    from google.cloud import bigquery_storage as bq_storage
+
+    from bquest.session import BQSession
+else:
+    bq = lazy_import("google.cloud.bigquery")
+    pd = lazy_import("pandas")
+    pd_gbq = lazy_import("pandas_gbq")
+    pa = lazy_import("pyarrow")
+    pc = lazy_import("pyarrow.compute")
+    pq = lazy_import("pyarrow.parquet")
+    exceptions = lazy_import("google.api_core.exceptions")
+
+RESULT_FORMATS = ("pandas", "pandas_arrow", "pandas_categorical", "arrow", "polars")
+RUN_LABEL = "bquest_run"
+SESSION_LABEL = "bquest_session"
+RUN_ID_ENV_VAR = "BQUEST_RUN_ID"
+DEFAULT_EXPIRATION = datetime.timedelta(days=1)
+
+
+def to_label_value(value: str) -> str:
+    """Converts a string into a valid BigQuery label value
+
+    Args:
+        value: any string, e.g. a CI job id
+
+    Returns:
+        at most 63 lower-case letters, digits, underscores and dashes
+    """
+    return re.sub(r"[^a-z0-9_-]", "_", value.lower())[:63]
+
+
+# identifies all tables created by this process, set BQUEST_RUN_ID to share it e.g. across a CI pipeline
+RUN_ID = to_label_value(os.environ.get(RUN_ID_ENV_VAR) or uuid.uuid4().hex[:16])
+
+
+def convert_result(result: Any, result_format: str = "pandas") -> Any:
+    """Converts a query job or its rows into the requested result format
+
+    Args:
+        result: query job or rows, which provide to_dataframe and to_arrow
+        result_format: one of pandas (default dtypes), pandas_arrow (Arrow-backed dtypes),
+            pandas_categorical (categorical strings), arrow (pyarrow.Table) or polars (polars.DataFrame)
+
+    Returns:
+        the result in the requested format
+    """
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format {result_format}, expected one of {RESULT_FORMATS}.")
+    if result_format == "pandas":
+        return result.to_dataframe()
+
+    table = result.to_arrow()
+    if result_format == "arrow":
+        return table
+    if result_format == "pandas_arrow":
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    if result_format == "pandas_categorical":
+        for i, field in enumerate(table.schema):
+            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                table = table.set_column(i, field.name, table.column(i).dictionary_encode())
+        return table.to_pandas()
+
+    try:
+        import polars
+    except ImportError as e:
+        raise ImportError("polars is required for the result format polars, install it with pip.") from e
+    return polars.from_arrow(table)
+
+
+def iter_row_batches(
+    rows: bq.table.RowIterator,
+    as_arrow: bool = False,
+    max_stream_count: Optional[int] = None,
+    bqstorage_client: Optional[bq_storage.BigQueryReadClient] = None,
+) -> Iterator[Union[pd.DataFrame, Any]]:
+    """Streams rows in batches through the BigQuery Storage Read API
+
+    Args:
+        rows: rows of a table or query result
+        as_arrow: yields pyarrow.RecordBatch instead of pandas DataFrame chunks if True
+        max_stream_count: maximum number of parallel read streams, determined by BigQuery if None
+        bqstorage_client: BigQuery Storage client, created with the credentials of the BigQuery client if None
+
+    Returns:
+        Iterator over pandas DataFrames or pyarrow RecordBatches
+    """
+    if bqstorage_client is None:
+        # like RowIterator.to_dataframe, so the rows are read with the identity they were queried with
+        bqstorage_client = rows.client._ensure_bqstorage_client()
+    if as_arrow:
+        return rows.to_arrow_iterable(bqstorage_client=bqstorage_client, max_stream_count=max_stream_count)
+    return rows.to_dataframe_iterable(bqstorage_client=bqstorage_client, max_stream_count=max_stream_count)
+
+
+class BQLazyResult:
+    """
+    Lazy handle on a result table which only fetches data when it is accessed.
+
+    Columns are read selectively through the BigQuery Storage Read API, while row counts, filters
+    and aggregates are computed by BigQuery.
+    """
+
+    def __init__(self, fq_table_id: str, bq_client: bq.Client, conditions: Optional[List[str]] = None) -> None:
+        """
+
+        Args:
+            fq_table_id: full qualified table id of the result table
+            bq_client: BigQuery client used for interacting with BigQuery
+            conditions: SQL conditions rows have to fulfill, e.g. "price > 0"
+        """
+        if is_sql(fq_table_id):
+            raise ValueError("'fq_table_id' contains sql syntax.")
+
+        self._fq_table_id = fq_table_id
+        self._bq_client = bq_client
+        self._conditions = conditions or []
+        self._table: Optional[bq.Table] = None
+
+    @property
+    def fq_table_id(self) -> str:
+        return self._fq_table_id
+
+    def _get_table(self) -> bq.Table:
+        if self._table is None:
+            self._table = self._bq_client.get_table(self._fq_table_id)
+        return self._table
+
+    def _query(self, select: str) -> bq.table.RowIterator:
+        where = f" WHERE {' AND '.join(f'({c})' for c in self._conditions)}" if self._conditions else ""
+        sql = f"SELECT {select} FROM `{self._fq_table_id}`{where}"  # noqa: S608, table id checked in init
+        return self._bq_client.query(sql).result()
+
+    @property
+    def columns(self) -> List[str]:
+        """Returns the column names from the table metadata without reading any rows"""
+        return [field.name for field in self._get_table().schema]
+
+    def filter(self, condition: str) -> "BQLazyResult":
+        """Returns a handle on the rows which fulfill the condition as well, nothing is fetched
+
+        Args:
+            condition: SQL condition, e.g. "price > 0"
+
+        Returns:
+            BQLazyResult: A handle on the filtered rows
+        """
+        return BQLazyResult(self._fq_table_id, self._bq_client, self._conditions + [condition])
+
+    def num_rows(self) -> int:
+        """Returns the number of rows, read from the table metadata unless rows are filtered"""
+        if not self._conditions:
+            return int(self._get_table().num_rows or 0)
+        return int(self.aggregate("COUNT(*)"))
+
+    def __len__(self) -> int:
+        return self.num_rows()
+
+    def aggregate(self, expression: str) -> Any:
+        """Computes an aggregate in BigQuery
+
+        Args:
+            expression: SQL aggregate expression, e.g. "SUM(price)"
 
-import google.cloud.bigquery
-import pandas as pd
-import pandas_gbq as pd_gbq
-from google.api_core.exceptions import BadRequest
+        Returns:
+            the value of the aggregate
+        """
+        return next(iter(self._query(expression)))[0]
+
+    def to_df(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Fetches the given columns of all rows into a dataframe
+
+        Args:
+            columns: names of the fetched columns, all columns if None
+
+        Returns:
+            Fetched columns as pandas dataframe
+        """
+        if self._conditions:
+            select = ", ".join(f"`{column}`" for column in columns) if columns else "*"
+            return self._query(select).to_dataframe()
+
+        fields = self._get_table().schema
+        if columns:
+            fields_by_name = {field.name: field for field in fields}
+            unknown_columns = [column for column in columns if column not in fields_by_name]
+            if unknown_columns:
+                raise KeyError(f"Unknown columns {unknown_columns}")
+            fields = [fields_by_name[column] for column in columns]
+        return self._bq_client.list_rows(self._fq_table_id, selected_fields=fields).to_dataframe()
 
-from bquest.util import is_sql
+    def __getitem__(self, column: str) -> pd.Series:
+        return self.to_df([column])[column]
 
 
 class BQTable:
@@ -18,7 +230,7 @@ class BQTable:
     Represents a BigQuery table.
     """
 
-    def __init__(self, original_table_id: str, fq_test_table_id: str, bq_client: google.cloud.bigquery.Client) -> None:
+    def __init__(self, original_table_id: str, fq_test_table_id: str, bq_client: bq.Client) -> None:
         """
 
         Args:
@@ -48,6 +260,10 @@ class BQTable:
         """
         return self._fq_test_table_id
 
+    @property
+    def _fq_dataset_id(self) -> str:
+        return self._fq_test_table_id.rsplit(".", 1)[0]
+
     def remove_require_partition_filter(self, table_id: str) -> None:
         """
         Method to drop table partition filter requirement
@@ -57,26 +273,64 @@ class BQTable:
         Returns:
             None - table settings updated in place
         """
-        table = self._bq_client.get_table(table_id)
-        if "requirePartitionFilter" in table.to_api_repr():
-            table.require_partition_filter = False
-            self._bq_client.update_table(table, ["require_partition_filter"])
 
-    def to_df(self) -> pd.DataFrame:
+        def update(_: int) -> None:
+            table = self._bq_client.get_table(table_id)
+            if "requirePartitionFilter" in table.to_api_repr():
+                table.require_partition_filter = False
+                self._bq_client.update_table(table, ["require_partition_filter"])
+
+        get_default_scheduler().run(self._fq_dataset_id, update)
+
+    def to_df(self, result_format: str = "pandas") -> Union[pd.DataFrame, Any]:
         """Loads the table into a dataframe
 
+        The partition filter requirement of the table is only dropped if BigQuery refuses to
+        query the table without a partition filter.
+
+        Args:
+            result_format: one of pandas, pandas_arrow, pandas_categorical, arrow or polars
+
         Returns:
-            Loaded table as pandas dataframe
+            Loaded table as pandas dataframe or in the requested result format
         """
+        sql = f"SELECT * FROM `{self._fq_test_table_id}`"  # noqa: S608, SQL injection prevented in init
+
+        try:
+            return convert_result(self._bq_client.query(sql), result_format)
+        except exceptions.BadRequest as e:
+            if "partition elimination" not in str(e):
+                raise
         self.remove_require_partition_filter(self._fq_test_table_id)
+        return convert_result(self._bq_client.query(sql), result_format)
 
-        sql = f"SELECT * FROM `{self._fq_test_table_id}`"  # noqa: S608, SQL injection prevented in init
+    def lazy(self) -> BQLazyResult:
+        """Returns a lazy handle on the table which only fetches data when it is accessed"""
+        return BQLazyResult(self._fq_test_table_id, self._bq_client)
+
+    def iter_batches(
+        self,
+        as_arrow: bool = False,
+        max_stream_count: Optional[int] = None,
+        bqstorage_client: Optional[bq_storage.BigQueryReadClient] = None,
+    ) -> Iterator[Union[pd.DataFrame, Any]]:
+        """Streams the table in batches instead of loading it into a single dataframe
 
-        return self._bq_client.query(sql).to_dataframe()
+        Args:
+            as_arrow: yields pyarrow.RecordBatch instead of pandas DataFrame chunks if True
+            max_stream_count: maximum number of parallel read streams, determined by BigQuery if None
+            bqstorage_client: BigQuery Storage client, created with the credentials of the BigQuery client if None
+
+        Returns:
+            Iterator over pandas DataFrames or pyarrow RecordBatches
+        """
+        rows = self._bq_client.list_rows(self._fq_test_table_id)
+        return iter_row_batches(rows, as_arrow, max_stream_count, bqstorage_client)
 
     def delete(self) -> None:
         """Deletes the table"""
-        self._bq_client.delete_table(google.cloud.bigquery.table.TableReference.from_string(self._fq_test_table_id))
+        table_reference = bq.table.TableReference.from_string(self._fq_test_table_id)
+        get_default_scheduler().run(self._fq_dataset_id, lambda _: self._bq_client.delete_table(table_reference))
 
 
 class BQTableDefinition:
@@ -84,7 +338,17 @@ class BQTableDefinition:
     Base class for BigQuery table definitions.
     """
 
-    def __init__(self, original_table_id: str, project: str, dataset: str, location: str) -> None:
+    def __init__(
+        self,
+        original_table_id: str,
+        project: str,
+        dataset: str,
+        location: str,
+        time_partitioning: Optional[bq.TimePartitioning] = None,
+        clustering_fields: Optional[List[str]] = None,
+        labels: Optional[Dict[str, str]] = None,
+        expiration: Optional[datetime.timedelta] = None,
+    ) -> None:
         """
 
         Args:
@@ -92,11 +356,25 @@ class BQTableDefinition:
             project: Google Cloud project id
             dataset: dataset name e.g. bquest
             location: location of dataset e.g. EU
+            time_partitioning: time partitioning of the table, ingestion-time partitioning if no field is given
+            clustering_fields: fields the table is clustered by
+            labels: labels of the table, e.g. to find leftover tables with `bquest gc`
+            expiration: time after the creation of the table at which BigQuery deletes it
         """
         self._original_table_id = original_table_id
         self._project = project
         self._dataset = dataset
         self._location = location
+        self._time_partitioning = time_partitioning
+        self._clustering_fields = clustering_fields
+        self._labels = labels or {}
+        self._expiration = expiration
+        self._loaded_table: Optional[BQTable] = None
+        self._load_lock = threading.Lock()
+        self._prefetched = False
+        self._column_selections: Dict[Tuple[str, ...], BQTableDefinition] = {}
+        self._selection_lock = threading.Lock()
+        self._source_files = find_source_files()
         self._test_table_id = (
             f"{original_table_id}_{str(uuid.uuid4())}".replace("-", "_")
             .replace(".", "_")
@@ -105,6 +383,10 @@ class BQTableDefinition:
             .replace("$", "_")
         )
 
+    @property
+    def original_table_id(self) -> str:
+        return self._original_table_id
+
     @property
     def table_name(self) -> str:
         return self._test_table_id
@@ -125,16 +407,305 @@ class BQTableDefinition:
         """
         return f"{self._project}.{self._dataset}.{self.table_name}"
 
-    def load_to_bq(self, bq_client: google.cloud.bigquery.Client) -> BQTable:
+    @property
+    def labels(self) -> Dict[str, str]:
+        return self._labels
+
+    @property
+    def expiration(self) -> Optional[datetime.timedelta]:
+        return self._expiration
+
+    @property
+    def fingerprint(self) -> str:
+        """Returns a hash of the content of the table, which is the same in every test run"""
+        return hash_value(self._fingerprint_parts())
+
+    def _fingerprint_parts(self) -> Dict[str, Any]:
+        return {
+            "type": type(self).__name__,
+            "original_table_id": self._original_table_id,
+            "time_partitioning": self._time_partitioning.to_api_repr() if self._time_partitioning else None,
+            "clustering_fields": self._clustering_fields,
+        }
+
+    @property
+    def source_files(self) -> Optional[List[str]]:
+        """Returns the files this definition may be built from, None if file reads are not tracked"""
+        return self._source_files
+
+    @property
+    def columns(self) -> Optional[List[str]]:
+        """Returns the top-level columns of the table, None if they are unknown before loading"""
+        return None
+
+    def select_columns(self, columns: Iterable[str]) -> BQTableDefinition:
+        """Returns a definition of the same table with only some of its columns.
+
+        Partitioning and clustering columns are always kept. Definitions with unknown columns and
+        selections of all columns return the definition itself. Selections are created once per set
+        of columns, so they are loaded only once as well.
+
+        Args:
+            columns: column names, names of other columns are ignored (case-insensitive)
+
+        Returns:
+            the definition of the selected columns
+        """
+        if self.columns is None:
+            return self
+        wanted = {column.lower() for column in columns}
+        wanted.update(field.lower() for field in self._clustering_fields or [])
+        if self._time_partitioning is not None and self._time_partitioning.field:
+            wanted.add(self._time_partitioning.field.lower())
+        # tables need at least one column, e.g. for queries only counting rows
+        selected = tuple(column for column in self.columns if column.lower() in wanted) or tuple(self.columns[:1])
+        if len(selected) == len(self.columns):
+            return self
+        with self._selection_lock:
+            if selected not in self._column_selections:
+                self._column_selections[selected] = self._create_column_selection(list(selected))
+            return self._column_selections[selected]
+
+    def _create_column_selection(self, columns: List[str]) -> BQTableDefinition:
+        """Returns a definition with only the given columns, definitions which can't select columns keep all."""
+        return self
+
+    @property
+    def is_partitioned_or_clustered(self) -> bool:
+        return self._time_partitioning is not None or bool(self._clustering_fields)
+
+    def _apply_table_options(self, load_config: bq.job.LoadJobConfig) -> None:
+        """Sets partitioning and clustering of the table on the load job that creates it."""
+        if self._time_partitioning is not None:
+            load_config.time_partitioning = self._time_partitioning
+        if self._clustering_fields:
+            load_config.clustering_fields = self._clustering_fields
+
+    def _update_table_metadata(self, bq_client: bq.Client) -> None:
+        """Sets the expiration and the labels of a created table in a single update.
+
+        Load jobs can neither set an expiration nor labels of their destination table, so tables created
+        by them need this additional update.
+
+        Args:
+            bq_client: BigQuery client for interacting with BigQuery
+        """
+        fields = []
+        table = bq.Table(self.fq_table_id)
+        if self._expiration is not None:
+            table.expires = datetime.datetime.now(datetime.timezone.utc) + self._expiration
+            fields.append("expires")
+        if self._labels:
+            table.labels = self._labels
+            fields.append("labels")
+        if fields:
+            get_default_scheduler().run(
+                f"{self._project}.{self._dataset}", lambda _: bq_client.update_table(table, fields)
+            )
+
+    def label_created_table(self, bq_client: bq.Client) -> None:
+        """Sets the expiration and the labels of the table after it was created by a tested query or configuration.
+
+        Args:
+            bq_client: BigQuery client for interacting with BigQuery
+        """
+        try:
+            self._update_table_metadata(bq_client)
+        except exceptions.NotFound:
+            # the tested query or configuration didn't create the table
+            pass
+
+    def _create_table(self, bq_client: bq.Client, schema: List[bq.SchemaField]) -> None:
+        """Creates the empty table with its schema, partitioning, clustering, labels and expiration.
+
+        Args:
+            bq_client: BigQuery client for interacting with BigQuery
+            schema: schema of the table
+        """
+        table = bq.Table(self.fq_table_id, schema=schema)
+        if self._time_partitioning is not None:
+            table.time_partitioning = self._time_partitioning
+        if self._clustering_fields:
+            table.clustering_fields = self._clustering_fields
+        if self._expiration is not None:
+            table.expires = datetime.datetime.now(datetime.timezone.utc) + self._expiration
+        if self._labels:
+            table.labels = self._labels
+        get_default_scheduler().run(
+            f"{self._project}.{self._dataset}", lambda _: bq_client.create_table(table, exists_ok=True)
+        )
+
+    def _write_rows(
+        self,
+        bq_client: bq.Client,
+        schema: List[bq.SchemaField],
+        rows: pa.Table,
+        write_client: Optional[bq_storage.BigQueryWriteClient] = None,
+    ) -> None:
+        """Creates the table and writes the rows through the Storage Write API instead of a load job.
+
+        Args:
+            bq_client: BigQuery client for interacting with BigQuery
+            schema: schema of the table
+            rows: rows of the table with Arrow types matching the schema
+            write_client: Storage Write API client, one with the default credentials if None
+        """
+        self._create_table(bq_client, schema)
+        write_arrow_table(write_client or get_write_client(), self.fq_table_id, rows)
+
+    def _create_table_options(self) -> str:
+        """Returns the OPTIONS clause setting expiration and labels in CREATE TABLE statements."""
+        options = []
+        if self._expiration is not None:
+            seconds = int(self._expiration.total_seconds())
+            options.append(f"expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL {seconds} SECOND)")
+        if self._labels:
+            labels = ", ".join(f"({json.dumps(key)}, {json.dumps(value)})" for key, value in self._labels.items())
+            options.append(f"labels = [{labels}]")
+        return f" OPTIONS({', '.join(options)})" if options else ""
+
+    def _run_job(
+        self,
+        bq_client: bq.Client,
+        start_job: Callable[[str], Union[bq.LoadJob, bq.QueryJob]],
+        job_kind: str = "load",
+    ) -> None:
+        """Runs a job creating the table through the table operation scheduler.
+
+        Retries use the job id derived from the table name, so a job which was created by a request
+        whose response got lost is picked up instead of being created twice. Only a job which failed
+        is started again with a new job id.
+
+        Args:
+            bq_client: BigQuery client for interacting with BigQuery
+            start_job: starts the job with the given job id
+            job_kind: kind of job used in the job id, e.g. load
+        """
+        failed_jobs = 0
+
+        def run(_: int) -> None:
+            nonlocal failed_jobs
+            job_id = f"bquest_{job_kind}_{self.table_name}_{failed_jobs}"
+            try:
+                job = start_job(job_id)
+            except exceptions.Conflict:
+                job = bq_client.get_job(job_id, location=self._location)
+            try:
+                job.result()
+            except exceptions.GoogleAPICallError as e:
+                if job.error_result:
+                    failed_jobs += 1
+                if isinstance(e, exceptions.BadRequest):
+                    # same error but with full error msg
+                    raise exceptions.BadRequest(str(job.errors), errors=e.errors) from e
+                raise
+
+        get_default_scheduler().run(f"{self._project}.{self._dataset}", run)
+
+    def load_once(self, bq_client: bq.Client) -> BQTable:
+        """Loads this definition to a BigQuery table unless it has been loaded before.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+
+        Returns:
+            BQTable: A representative of the BigQuery table which was created first.
+        """
+        with self._load_lock:
+            if self._loaded_table is None:
+                self._loaded_table = self.load_to_bq(bq_client)
+            return self._loaded_table
+
+    def mark_prefetched(self) -> None:
+        """Marks this definition as loaded by a FixturePrefetcher, so runners reuse its table."""
+        self._prefetched = True
+
+    @property
+    def prefetched(self) -> bool:
+        """Returns whether this definition was marked as loaded by a FixturePrefetcher."""
+        return self._prefetched
+
+    def load_prefetched(self, bq_client: bq.Client) -> BQTable:
+        """Returns the table loaded by a FixturePrefetcher, loads the definition if it wasn't prefetched.
+
+        Only prefetched tables are shared by tests, so DML statements and writes of a test don't leak into
+        other tests using the same definition.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+
+        Returns:
+            BQTable: A representative of the BigQuery table.
+        """
+        if self._prefetched:
+            return self.load_once(bq_client)
+        return self.load_to_bq(bq_client)
+
+    def load_to_bq(self, bq_client: bq.Client) -> BQTable:
         return BQTable(self._original_table_id, self.fq_table_id, bq_client)
 
+    def load_to_session(self, bq_client: bq.Client, session: BQSession) -> BQTable:
+        """Loads this definition to a temporary table of a BigQuery session.
+
+        Temporary tables are dropped with the session, so they have neither labels nor an expiration.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+            session: session of the temporary table
+
+        Returns:
+            BQTable: A representative of the temporary table.
+        """
+        return BQTable(self._original_table_id, session.table_id(self.table_name), bq_client)
+
+    def _load_file(
+        self, bq_client: bq.Client, file: Any, load_config: bq.job.LoadJobConfig, session: Optional[BQSession] = None
+    ) -> None:
+        """Loads a file into the table or, given a session, into a temporary table of the session.
+
+        Args:
+            bq_client: BigQuery client for interacting with BigQuery
+            file: file that is loaded
+            load_config: configuration of the load job
+            session: session of the temporary table
+        """
+        destination, job_kind = self.fq_table_id, "load"
+        if session is not None:
+            session.apply(load_config)
+            destination, job_kind = session.table_id(self.table_name), session.job_kind("load")
+        self._run_job(
+            bq_client,
+            lambda job_id: bq_client.load_table_from_file(
+                file,
+                bq.table.TableReference.from_string(destination, default_project=bq_client.project),
+                rewind=True,
+                job_id=job_id,
+                location=self._location,
+                job_config=load_config,
+            ),
+            job_kind=job_kind,
+        )
+
 
 class BQTableDataframeDefinition(BQTableDefinition):
     """
     Defines BigQuery tables based on a pandas dataframe.
     """
 
-    def __init__(self, original_table_id: str, df: pd.DataFrame, project: str, dataset: str, location: str) -> None:
+    def __init__(
+        self,
+        original_table_id: str,
+        df: pd.DataFrame,
+        project: str,
+        dataset: str,
+        location: str,
+        time_partitioning: Optional[bq.TimePartitioning] = None,
+        clustering_fields: Optional[List[str]] = None,
+        labels: Optional[Dict[str, str]] = None,
+        expiration: Optional[datetime.timedelta] = None,
+        ingestion: str = "load_job",
+        write_client: Optional[bq_storage.BigQueryWriteClient] = None,
+    ) -> None:
         """
 
         Args:
@@ -143,11 +714,64 @@ class BQTableDataframeDefinition(BQTableDefinition):
             project: Google Cloud project id
             dataset: dataset name e.g. bquest
             location: location of dataset e.g. EU
+            time_partitioning: time partitioning of the table, ingestion-time partitioning if no field is given
+            clustering_fields: fields the table is clustered by
+            labels: labels of the table
+            expiration: time after the creation of the table at which BigQuery deletes it
+            ingestion: load_job or write_api (Storage Write API, falls back to a load job for column types
+                without a BigQuery type, e.g. columns with only None values)
+            write_client: Storage Write API client of the write_api ingestion, one with the default
+                credentials if None
         """
-        super().__init__(original_table_id, project, dataset, location)
+        if ingestion not in INGESTION_MODES:
+            raise ValueError(f"Unknown ingestion mode {ingestion}, expected one of {INGESTION_MODES}.")
+
+        super().__init__(
+            original_table_id, project, dataset, location, time_partitioning, clustering_fields, labels, expiration
+        )
         self._df = df
+        self._ingestion = ingestion
+        self._write_client = write_client
+
+    @property
+    def columns(self) -> Optional[List[str]]:
+        return [str(column) for column in self._df.columns]
+
+    def _fingerprint_parts(self) -> Dict[str, Any]:
+        rows_hash = pd.util.hash_pandas_object(self._df, index=False).to_numpy().tobytes()
+        return {
+            **super()._fingerprint_parts(),
+            "columns": self.columns,
+            "dtypes": [str(dtype) for dtype in self._df.dtypes],
+            "rows": hashlib.sha256(rows_hash).hexdigest(),
+        }
+
+    def _create_column_selection(self, columns: List[str]) -> BQTableDefinition:
+        return BQTableDataframeDefinition(
+            self._original_table_id,
+            self._df[columns],
+            self._project,
+            self._dataset,
+            self._location,
+            self._time_partitioning,
+            self._clustering_fields,
+            self._labels,
+            self._expiration,
+            self._ingestion,
+            self._write_client,
+        )
 
-    def load_to_bq(self, bq_client: google.cloud.bigquery.Client) -> BQTable:
+    def _write_df(self, bq_client: bq.Client) -> bool:
+        """Writes the dataframe through the Storage Write API, returns False if its types can't be written."""
+        try:
+            rows = _pandas_to_arrow(self._df)
+            schema = arrow_to_bq_schema(rows.schema)
+        except (pa.ArrowException, ValueError):
+            return False
+        self._write_rows(bq_client, schema, rows, self._write_client)
+        return True
+
+    def load_to_bq(self, bq_client: bq.Client) -> BQTable:
         """Loads this definition to a BigQuery table.
 
         Args:
@@ -156,33 +780,198 @@ class BQTableDataframeDefinition(BQTableDefinition):
         Returns:
             BQTable: A representative of the BigQuery table which was created.
         """
-        pd_gbq.to_gbq(
-            self._df,
-            destination_table=f"{self._dataset}.{self.table_name}",
-            project_id=self._project,
-            location=self._location,
-            if_exists="replace",
-        )
+        if self._ingestion == "write_api" and self._write_df(bq_client):
+            return BQTable(self._original_table_id, self.fq_table_id, bq_client)
+
+        if self.is_partitioned_or_clustered:
+            load_config = bq.job.LoadJobConfig()
+            self._apply_table_options(load_config)
+            self._run_job(
+                bq_client,
+                lambda job_id: bq_client.load_table_from_dataframe(
+                    self._df,
+                    bq.table.TableReference.from_string(self.fq_table_id),
+                    job_id=job_id,
+                    location=self._location,
+                    job_config=load_config,
+                ),
+            )
+        else:
+            get_default_scheduler().run(f"{self._project}.{self._dataset}", self._upload_df)
+        self._update_table_metadata(bq_client)
         return BQTable(
             self._original_table_id,
             self.fq_table_id,
             bq_client,
         )
 
+    def _upload_df(self, _: int) -> None:
+        """Uploads the dataframe with pandas_gbq, whose errors are translated back for the scheduler's retries."""
+        try:
+            pd_gbq.to_gbq(
+                self._df,
+                destination_table=f"{self._dataset}.{self.table_name}",
+                project_id=self._project,
+                location=self._location,
+                if_exists="replace",
+            )
+        except pd_gbq.gbq.GenericGBQException as e:
+            # pandas_gbq wraps the errors of the BigQuery client, which the scheduler retries on rate limits
+            if isinstance(e.__cause__, exceptions.GoogleAPICallError):
+                raise e.__cause__ from e
+            raise
+
+    def load_to_session(self, bq_client: bq.Client, session: BQSession) -> BQTable:
+        """Loads this definition to a temporary table of a BigQuery session.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+            session: session of the temporary table
+
+        Returns:
+            BQTable: A representative of the temporary table.
+        """
+        load_config = session.apply(bq.job.LoadJobConfig())
+        self._apply_table_options(load_config)
+        table_id = session.table_id(self.table_name)
+        self._run_job(
+            bq_client,
+            lambda job_id: bq_client.load_table_from_dataframe(
+                self._df,
+                bq.table.TableReference.from_string(table_id, default_project=bq_client.project),
+                job_id=job_id,
+                location=self._location,
+                job_config=load_config,
+            ),
+            job_kind=session.job_kind("load"),
+        )
+        return BQTable(self._original_table_id, table_id, bq_client)
+
+
+LOAD_FORMATS = ("auto", "json", "parquet")
+
+
+def _parquet_types(field_type: str) -> Optional[Tuple[pa.DataType, pa.DataType]]:
+    """Returns the Arrow types of the JSON values and of the Parquet column of a BigQuery type.
+
+    Temporal values and base64 encoded bytes are given as strings in JSON rows and parsed after the
+    conversion to Arrow. Types without a lossless Parquet representation, e.g. NUMERIC or JSON, return None.
+    """
+    types = {
+        "STRING": (pa.string(), pa.string()),
+        "BYTES": (pa.string(), pa.binary()),
+        "INTEGER": (pa.int64(), pa.int64()),
+        "INT64": (pa.int64(), pa.int64()),
+        "FLOAT": (pa.float64(), pa.float64()),
+        "FLOAT64": (pa.float64(), pa.float64()),
+        "BOOLEAN": (pa.bool_(), pa.bool_()),
+        "BOOL": (pa.bool_(), pa.bool_()),
+        "DATE": (pa.string(), pa.date32()),
+        "TIME": (pa.string(), pa.time64("us")),
+        "DATETIME": (pa.string(), pa.timestamp("us")),
+        "TIMESTAMP": (pa.string(), pa.timestamp("us", "UTC")),
+    }
+    return types.get(field_type.upper())
+
+
+def _parquet_fields(schema: List[bq.SchemaField]) -> Optional[Tuple[List[pa.Field], List[pa.Field]]]:
+    """Converts a BigQuery schema into Arrow fields of the JSON values and of the Parquet columns."""
+    json_fields, parquet_fields = [], []
+    for field in schema:
+        if field.field_type.upper() in ("RECORD", "STRUCT"):
+            nested = _parquet_fields(list(field.fields))
+            if nested is None:
+                return None
+            json_type, parquet_type = pa.struct(nested[0]), pa.struct(nested[1])
+        else:
+            types = _parquet_types(field.field_type)
+            if types is None:
+                return None
+            json_type, parquet_type = types
+        if field.mode == "REPEATED":
+            json_type, parquet_type = pa.list_(json_type), pa.list_(parquet_type)
+        nullable = field.mode != "REQUIRED"
+        json_fields.append(pa.field(field.name, json_type, nullable))
+        parquet_fields.append(pa.field(field.name, parquet_type, nullable))
+    return json_fields, parquet_fields
+
+
+def _find_unknown_key(row: Dict[str, Any], schema: List[bq.SchemaField]) -> Optional[str]:
+    """Returns a key of a JSON row, including keys of nested records, which is not in the schema."""
+    fields = {field.name: field for field in schema}
+    for key, value in row.items():
+        field = fields.get(key)
+        if field is None:
+            return key
+        if field.field_type.upper() in ("RECORD", "STRUCT") and value is not None:
+            for record in value if field.mode == "REPEATED" else [value]:
+                unknown_key = _find_unknown_key(record, list(field.fields)) if isinstance(record, dict) else None
+                if unknown_key is not None:
+                    return f"{key}.{unknown_key}"
+    return None
+
+
+def _decode_base64(array: pa.Array) -> pa.Array:
+    """Decodes the base64 encoded values of a string column like BigQuery does for BYTES in JSON rows."""
+    try:
+        values = [None if value is None else base64.b64decode(value, validate=True) for value in array.to_pylist()]
+    except binascii.Error as e:
+        raise pa.ArrowInvalid(f"Could not decode BYTES value: {e}") from e
+    return pa.array(values, pa.binary())
+
+
+def _parse_json_values(array: pa.Array, parquet_type: pa.DataType) -> pa.Array:
+    """Casts the JSON values of a column, including nested ones, to the type of its Parquet column."""
+    if pa.types.is_struct(parquet_type):
+        children = [
+            _parse_json_values(array.field(i), parquet_type.field(i).type) for i in range(array.type.num_fields)
+        ]
+        return pa.StructArray.from_arrays(children, fields=list(parquet_type), mask=array.is_null())
+    if pa.types.is_list(parquet_type):
+        values = _parse_json_values(array.values, parquet_type.value_type)
+        return pa.ListArray.from_arrays(array.offsets, values, mask=array.is_null())
+    if pa.types.is_timestamp(parquet_type) and parquet_type.tz is not None:
+        # timestamps without zone offset are in UTC like in BigQuery
+        has_offset = pc.match_substring_regex(array, r"(Z|[+-]\d{2}:?\d{2})$")
+        array = pc.if_else(has_offset, array, pc.binary_join_element_wise(array, "Z", ""))
+    if pa.types.is_time(parquet_type):
+        # strings can't be cast to times, so they are parsed as timestamps of the first day of the epoch
+        array = pc.cast(pc.binary_join_element_wise("1970-01-01T", array, ""), pa.timestamp("us"))
+    if pa.types.is_binary(parquet_type):
+        return _decode_base64(array)
+    return pc.cast(array, parquet_type)
+
 
 class BQTableJsonDefinition(BQTableDefinition):
     """
     Defines BigQuery tables based on a JSON format.
+
+    Rows with a schema are uploaded as zstd compressed Parquet, which is smaller to transfer and faster
+    to load than newline-delimited JSON, in particular for nested fields. Rows without a schema, schemas
+    with types that Parquet can't represent losslessly (e.g. NUMERIC or JSON), values that can't be
+    converted and keys that are not in the schema are uploaded as newline-delimited JSON.
+
+    With the write_api ingestion, the table is created with its schema and the converted rows are written
+    through the Storage Write API, which avoids the scheduling latency of load jobs.
     """
 
+    PARQUET_CHUNK_SIZE = 10_000
+
     def __init__(
         self,
         original_table_id: str,
         rows: List[Dict[str, Any]],
-        schema: Optional[List[google.cloud.bigquery.SchemaField]],
+        schema: Optional[List[bq.SchemaField]],
         project: str,
         dataset: str,
         location: str,
+        time_partitioning: Optional[bq.TimePartitioning] = None,
+        clustering_fields: Optional[List[str]] = None,
+        labels: Optional[Dict[str, str]] = None,
+        expiration: Optional[datetime.timedelta] = None,
+        load_format: str = "auto",
+        ingestion: str = "load_job",
+        write_client: Optional[bq_storage.BigQueryWriteClient] = None,
     ) -> None:
         """
 
@@ -193,27 +982,134 @@ class BQTableJsonDefinition(BQTableDefinition):
             project: Google Cloud project
             dataset: dataset name e.g. bquest
             location: location of dataset e.g. EU
+            time_partitioning: time partitioning of the table, ingestion-time partitioning if no field is given
+            clustering_fields: fields the table is clustered by
+            labels: labels of the table
+            expiration: time after the creation of the table at which BigQuery deletes it
+            load_format: auto (Parquet if possible, else JSON), json or parquet (raises if not possible)
+            ingestion: load_job or write_api (Storage Write API, falls back to a load job in load_format
+                if the rows can't be converted to Arrow like for Parquet)
+            write_client: Storage Write API client of the write_api ingestion, one with the default
+                credentials if None
         """
-        super().__init__(original_table_id, project, dataset, location)
-        self._rows_json_sources = self._convert_rows_to_bq_json_format(rows)
+        if load_format not in LOAD_FORMATS:
+            raise ValueError(f"Unknown load format {load_format}, expected one of {LOAD_FORMATS}.")
+        if ingestion not in INGESTION_MODES:
+            raise ValueError(f"Unknown ingestion mode {ingestion}, expected one of {INGESTION_MODES}.")
+
+        super().__init__(
+            original_table_id, project, dataset, location, time_partitioning, clustering_fields, labels, expiration
+        )
+        self._rows = rows
         self._schema = schema
+        self._load_format = load_format
+        self._ingestion = ingestion
+        self._write_client = write_client
+        self._parquet_fields = (
+            _parquet_fields(schema) if schema and (load_format != "json" or ingestion == "write_api") else None
+        )
+        if load_format == "parquet" and self._parquet_fields is None:
+            raise ValueError("Loading as Parquet requires a schema whose types can be represented in Parquet.")
+        self._rows_json_sources = None if self._parquet_fields else self._convert_rows_to_bq_json_format(rows)
+
+    @property
+    def columns(self) -> Optional[List[str]]:
+        if self._schema:
+            return [field.name for field in self._schema]
+        return list(dict.fromkeys(key for row in self._rows for key in row))
+
+    def _fingerprint_parts(self) -> Dict[str, Any]:
+        return {
+            **super()._fingerprint_parts(),
+            "rows": self._rows,
+            "schema": [field.to_api_repr() for field in self._schema] if self._schema else None,
+        }
+
+    def _create_column_selection(self, columns: List[str]) -> BQTableDefinition:
+        selected = set(columns)
+        return BQTableJsonDefinition(
+            self._original_table_id,
+            [{key: value for key, value in row.items() if key in selected} for row in self._rows],
+            [field for field in self._schema if field.name in selected] if self._schema else None,
+            self._project,
+            self._dataset,
+            self._location,
+            self._time_partitioning,
+            self._clustering_fields,
+            self._labels,
+            self._expiration,
+            self._load_format,
+            self._ingestion,
+            self._write_client,
+        )
 
     @staticmethod
     def _convert_rows_to_bq_json_format(rows: List[Dict[str, Any]]) -> BytesIO:
         rows_as_json = [json.dumps(row) for row in rows]
         return BytesIO(bytes("\n".join(rows_as_json), "ascii"))
 
-    def _create_bq_load_config(self) -> google.cloud.bigquery.job.LoadJobConfig:
-        load_config = google.cloud.bigquery.job.LoadJobConfig()
-        load_config.source_format = google.cloud.bigquery.job.SourceFormat.NEWLINE_DELIMITED_JSON
+    def _convert_rows_to_arrow(self) -> Iterator[pa.Table]:
+        """Converts the rows chunk by chunk into Arrow tables with the column types of the schema.
+
+        Raises pyarrow.ArrowInvalid for rows with keys that are not in the schema, which Arrow would drop.
+        """
+        json_schema, arrow_schema = pa.schema(self._parquet_fields[0]), pa.schema(self._parquet_fields[1])
+        for start in range(0, len(self._rows), self.PARQUET_CHUNK_SIZE):
+            rows = self._rows[start : start + self.PARQUET_CHUNK_SIZE]
+            for row in rows:
+                unknown_key = _find_unknown_key(row, self._schema)
+                if unknown_key is not None:
+                    raise pa.ArrowInvalid(f"Row contains the key {unknown_key}, which is not in the schema.")
+            chunk = pa.Table.from_pylist(rows, json_schema)
+            columns = [
+                _parse_json_values(chunk.column(i).combine_chunks(), field.type) for i, field in enumerate(arrow_schema)
+            ]
+            yield pa.Table.from_arrays(columns, schema=arrow_schema)
+
+    def _convert_rows_to_parquet(self) -> Optional[BytesIO]:
+        """Converts the rows chunk by chunk into Parquet, returns None if their values can't be converted."""
+        if self._parquet_fields is None or self._load_format == "json":
+            return None
+
+        source = BytesIO()
+        try:
+            with pq.ParquetWriter(source, pa.schema(self._parquet_fields[1]), compression="zstd") as writer:
+                for chunk in self._convert_rows_to_arrow():
+                    writer.write_table(chunk)
+        except pa.ArrowException:
+            if self._load_format == "parquet":
+                raise
+            return None
+        return source
+
+    def _write_json_rows(self, bq_client: bq.Client) -> bool:
+        """Writes the rows through the Storage Write API, returns False if their values can't be converted."""
+        if self._parquet_fields is None:
+            return False
+        try:
+            rows = pa.concat_tables([pa.schema(self._parquet_fields[1]).empty_table(), *self._convert_rows_to_arrow()])
+        except pa.ArrowException:
+            return False
+        self._write_rows(bq_client, self._schema, rows, self._write_client)
+        return True
+
+    def _create_bq_load_config(self, source_format: str = "NEWLINE_DELIMITED_JSON") -> bq.job.LoadJobConfig:
+        load_config = bq.job.LoadJobConfig()
+        load_config.source_format = source_format
+        if source_format == bq.job.SourceFormat.PARQUET:
+            # loads Parquet lists as REPEATED fields instead of records with a list field
+            parquet_options = bq.ParquetOptions()
+            parquet_options.enable_list_inference = True
+            load_config.parquet_options = parquet_options
         if self._schema:
             load_config.schema = self._schema
             load_config.autodetect = False
         else:
             load_config.autodetect = True
+        self._apply_table_options(load_config)
         return load_config
 
-    def load_to_bq(self, bq_client: google.cloud.bigquery.Client) -> BQTable:
+    def load_to_bq(self, bq_client: bq.Client) -> BQTable:
         """Loads this definition to a BigQuery table.
 
         Arguments:
@@ -222,46 +1118,640 @@ class BQTableJsonDefinition(BQTableDefinition):
         Returns:
             BQTable: A representative of the BigQuery table which was created.
         """
-        job = bq_client.load_table_from_file(
-            self._rows_json_sources,
-            google.cloud.bigquery.table.TableReference.from_string(self.fq_table_id),
-            location=self._location,
-            job_config=self._create_bq_load_config(),
+        if self._ingestion == "write_api" and self._write_json_rows(bq_client):
+            return BQTable(self._original_table_id, self.fq_table_id, bq_client)
+
+        self._load_file(bq_client, *self._create_load_source())
+        self._update_table_metadata(bq_client)
+
+        return BQTable(self._original_table_id, self.fq_table_id, bq_client)
+
+    def load_to_session(self, bq_client: bq.Client, session: BQSession) -> BQTable:
+        """Loads this definition to a temporary table of a BigQuery session.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+            session: session of the temporary table
+
+        Returns:
+            BQTable: A representative of the temporary table.
+        """
+        self._load_file(bq_client, *self._create_load_source(), session=session)
+        return BQTable(self._original_table_id, session.table_id(self.table_name), bq_client)
+
+    def _create_load_source(self) -> Tuple[BytesIO, bq.job.LoadJobConfig]:
+        """Returns the rows as Parquet if possible, else as newline-delimited JSON, and the load configuration."""
+        source = self._convert_rows_to_parquet()
+        if source is not None:
+            return source, self._create_bq_load_config(bq.job.SourceFormat.PARQUET)
+        return self._rows_json_sources or self._convert_rows_to_bq_json_format(
+            self._rows
+        ), self._create_bq_load_config()
+
+
+class BQTableSyntheticDefinition(BQTableDefinition):
+    """
+    Defines BigQuery tables filled with generated data.
+    """
+
+    def __init__(
+        self,
+        original_table_id: str,
+        schema: List[bq.SchemaField],
+        num_rows: int,
+        distributions: Optional[Dict[str, ColumnDistribution]],
+        chunk_size: int,
+        seed: Optional[int],
+        project: str,
+        dataset: str,
+        location: str,
+        time_partitioning: Optional[bq.TimePartitioning] = None,
+        clustering_fields: Optional[List[str]] = None,
+        labels: Optional[Dict[str, str]] = None,
+        expiration: Optional[datetime.timedelta] = None,
+    ) -> None:
+        """
+
+        Args:
+            original_table_id: table name
+            schema: schema of the data
+            num_rows: number of generated rows
+            distributions: distributions per column name
+            chunk_size: number of rows generated at once
+            seed: seed for reproducible data
+            project: Google Cloud project
+            dataset: dataset name e.g. bquest
+            location: location of dataset e.g. EU
+            time_partitioning: time partitioning of the table, ingestion-time partitioning if no field is given
+            clustering_fields: fields the table is clustered by
+            labels: labels of the table
+            expiration: time after the creation of the table at which BigQuery deletes it
+        """
+        super().__init__(
+            original_table_id, project, dataset, location, time_partitioning, clustering_fields, labels, expiration
         )
-        try:
-            job.result()
-        except BadRequest as e:
-            # same error but with full error msg
-            raise BadRequest(str(job.errors)) from e
+        self._schema = schema
+        self._num_rows = num_rows
+        self._distributions = distributions
+        self._chunk_size = chunk_size
+        self._seed = seed
+
+    def _fingerprint_parts(self) -> Dict[str, Any]:
+        return {
+            **super()._fingerprint_parts(),
+            "schema": [field.to_api_repr() for field in self._schema],
+            "num_rows": self._num_rows,
+            "distributions": {name: vars(d) for name, d in (self._distributions or {}).items()},
+            "chunk_size": self._chunk_size,
+            "seed": self._seed,
+        }
+
+    def _write_parquet(self, file: Any) -> None:
+        batches = generate_batches(self._schema, self._num_rows, self._distributions, self._chunk_size, self._seed)
+        writer = None
+        for batch in batches:
+            if writer is None:
+                writer = pq.ParquetWriter(file, batch.schema, compression="snappy")
+            writer.write_batch(batch)
+        if writer is not None:
+            writer.close()
+
+    def _create_bq_load_config(self, source_format: Optional[str] = None) -> bq.job.LoadJobConfig:
+        load_config = bq.job.LoadJobConfig()
+        load_config.source_format = source_format or bq.job.SourceFormat.PARQUET
+        load_config.schema = self._schema
+        self._apply_table_options(load_config)
+        return load_config
+
+    def load_to_bq(self, bq_client: bq.Client) -> BQTable:
+        """Generates the data chunk by chunk into a local Parquet file and loads it to a BigQuery table.
+
+        Without rows, the empty table is created with its schema, because a Parquet file without row groups
+        can't be loaded.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+
+        Returns:
+            BQTable: A representative of the BigQuery table which was created.
+        """
+        if self._num_rows == 0:
+            self._create_table(bq_client, self._schema)
+            return BQTable(self._original_table_id, self.fq_table_id, bq_client)
+
+        with tempfile.TemporaryFile() as file:
+            self._write_parquet(file)
+            self._load_file(bq_client, file, self._create_bq_load_config())
+        self._update_table_metadata(bq_client)
+
+        return BQTable(self._original_table_id, self.fq_table_id, bq_client)
+
+    def load_to_session(self, bq_client: bq.Client, session: BQSession) -> BQTable:
+        """Generates the data into a local Parquet file and loads it to a temporary table of a BigQuery session.
+
+        Without rows, an empty newline-delimited JSON file is loaded, which creates the table with its schema.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+            session: session of the temporary table
+
+        Returns:
+            BQTable: A representative of the temporary table.
+        """
+        if self._num_rows == 0:
+            load_config = self._create_bq_load_config(bq.job.SourceFormat.NEWLINE_DELIMITED_JSON)
+            self._load_file(bq_client, BytesIO(), load_config, session=session)
+            return BQTable(self._original_table_id, session.table_id(self.table_name), bq_client)
+
+        with tempfile.TemporaryFile() as file:
+            self._write_parquet(file)
+            self._load_file(bq_client, file, self._create_bq_load_config(), session=session)
+        return BQTable(self._original_table_id, session.table_id(self.table_name), bq_client)
+
+
+class BQTableCloneDefinition(BQTableDefinition):
+    """
+    Defines BigQuery tables as clones of a shared base table with small per-test changes.
+
+    The base table is loaded once and each clone is a zero-copy table clone, which only stores the data
+    changed by its DML statements.
+    """
+
+    def __init__(
+        self,
+        base_definition: BQTableDefinition,
+        dml: Optional[List[str]],
+        project: str,
+        dataset: str,
+        location: str,
+        labels: Optional[Dict[str, str]] = None,
+        expiration: Optional[datetime.timedelta] = None,
+    ) -> None:
+        """
+
+        Args:
+            base_definition: definition of the base table, which is loaded on first use
+            dml: DML statements applied to the clone, {table} is replaced by the clone's table id
+                e.g. "UPDATE {table} SET price = 0 WHERE id = 3"
+            project: Google Cloud project
+            dataset: dataset name e.g. bquest
+            location: location of dataset e.g. EU
+            labels: labels of the table
+            expiration: time after the creation of the table at which BigQuery deletes it
+        """
+        super().__init__(
+            base_definition.original_table_id, project, dataset, location, labels=labels, expiration=expiration
+        )
+        self._base_definition = base_definition
+        self._dml = dml or []
+        if self._source_files is not None and base_definition.source_files is not None:
+            self._source_files = sorted(set(self._source_files) | set(base_definition.source_files))
+        else:
+            self._source_files = None
+
+    def _fingerprint_parts(self) -> Dict[str, Any]:
+        return {**super()._fingerprint_parts(), "base": self._base_definition.fingerprint, "dml": self._dml}
+
+    def _create_clone_script(self, base_table: BQTable) -> str:
+        # CREATE OR REPLACE keeps the script idempotent if it is retried after a partial run
+        table = f"`{self.fq_table_id}`"
+        statements = [
+            f"CREATE OR REPLACE TABLE {table} CLONE `{base_table.fq_test_table_id}`{self._create_table_options()}"
+        ]
+        statements.extend(statement.replace("{table}", table) for statement in self._dml)
+        return ";\n".join(statements)
+
+    def load_to_bq(self, bq_client: bq.Client) -> BQTable:
+        """Clones the base table and applies the DML statements in a single script.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
 
+        Returns:
+            BQTable: A representative of the BigQuery table which was created.
+        """
+        script = self._create_clone_script(self._base_definition.load_once(bq_client))
+        self._run_job(
+            bq_client,
+            lambda job_id: bq_client.query(script, job_id=job_id, location=self._location),
+            job_kind="clone",
+        )
         return BQTable(self._original_table_id, self.fq_table_id, bq_client)
 
+    def load_to_session(self, bq_client: bq.Client, session: BQSession) -> BQTable:
+        """Copies the base table loaded in the session to a temporary table and applies the DML statements.
+
+        Temporary tables can't be cloned, so the base table is copied.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+            session: session of the temporary table
+
+        Returns:
+            BQTable: A representative of the temporary table.
+        """
+        base_table = session.load(self._base_definition)
+        table = f"`{self.table_name}`"
+        # table ids are generated by bquest
+        statements = [f"CREATE OR REPLACE TEMP TABLE {table} AS SELECT * FROM `{base_table.fq_test_table_id}`"]  # noqa: S608
+        statements.extend(statement.replace("{table}", table) for statement in self._dml)
+        script = ";\n".join(statements)
+        self._run_job(
+            bq_client,
+            lambda job_id: bq_client.query(
+                script, job_id=job_id, location=self._location, job_config=session.apply(bq.QueryJobConfig())
+            ),
+            job_kind=session.job_kind("clone"),
+        )
+        return BQTable(self._original_table_id, session.table_id(self.table_name), bq_client)
+
+
+class BQTableSampleDefinition(BQTableDefinition):
+    """
+    Defines BigQuery tables as samples of existing tables, e.g. of production tables.
+
+    The sample is created by a CREATE TABLE AS SELECT query, so no data passes through the client. Rows
+    can be sampled by storage blocks with TABLESAMPLE, by a predicate and by a hash of a key. Hash samples
+    with the same key expression and fraction contain the same keys in every table, so samples of tables
+    joined on the key stay join-consistent. The sampled table has to be in the location of the dataset.
+    """
+
+    HASH_BUCKETS = 1_000_000
+
+    def __init__(
+        self,
+        original_table_id: str,
+        source_table_id: str,
+        project: str,
+        dataset: str,
+        location: str,
+        percent: Optional[float] = None,
+        where: Optional[str] = None,
+        key: Optional[str] = None,
+        fraction: Optional[float] = None,
+        columns: Optional[List[str]] = None,
+        masks: Optional[Dict[str, str]] = None,
+        limit: Optional[int] = None,
+        labels: Optional[Dict[str, str]] = None,
+        expiration: Optional[datetime.timedelta] = None,
+    ) -> None:
+        """
+
+        Args:
+            original_table_id: table name
+            source_table_id: fully qualified id of the sampled table e.g. my-project.sales.orders
+            project: Google Cloud project
+            dataset: dataset name e.g. bquest
+            location: location of dataset e.g. EU
+            percent: percentage of storage blocks read with TABLESAMPLE SYSTEM, all blocks if None
+            where: predicate the sampled rows fulfill, e.g. a filter on the partitioning column
+            key: SQL expression of the key of a hash sample, e.g. customer_id
+            fraction: fraction of the key values in the hash sample, e.g. 0.01
+            columns: columns of the sample, all columns if None
+            masks: SQL expressions replacing the values of columns, e.g. {"email": "TO_HEX(SHA256(email))"}
+            limit: maximum number of rows of the sample
+            labels: labels of the table
+            expiration: time after the creation of the table at which BigQuery deletes it
+        """
+        if percent is not None and not 0 < percent <= 100:
+            raise ValueError(f"percent has to be in (0, 100], got {percent}.")
+        if (key is None) != (fraction is None):
+            raise ValueError("Hash samples require both a key and a fraction.")
+        if fraction is not None and not 0 < fraction <= 1:
+            raise ValueError(f"fraction has to be in (0, 1], got {fraction}.")
+        if columns is not None and set(masks or {}) - set(columns):
+            raise ValueError(f"Masked columns {sorted(set(masks or {}) - set(columns))} are not sampled.")
+
+        super().__init__(original_table_id, project, dataset, location, labels=labels, expiration=expiration)
+        self._source_table_id = source_table_id
+        self._percent = percent
+        self._where = where
+        self._key = key
+        self._fraction = fraction
+        self._columns = columns
+        self._masks = masks or {}
+        self._limit = limit
+
+    @property
+    def columns(self) -> Optional[List[str]]:
+        return self._columns
+
+    def _fingerprint_parts(self) -> Dict[str, Any]:
+        # the content of the sampled table is not part of the fingerprint
+        return {**super()._fingerprint_parts(), "query": self._create_select_query()}
+
+    def _create_column_selection(self, columns: List[str]) -> BQTableDefinition:
+        return BQTableSampleDefinition(
+            self._original_table_id,
+            self._source_table_id,
+            self._project,
+            self._dataset,
+            self._location,
+            self._percent,
+            self._where,
+            self._key,
+            self._fraction,
+            columns,
+            {column: mask for column, mask in self._masks.items() if column in columns},
+            self._limit,
+            self._labels,
+            self._expiration,
+        )
+
+    def _create_select_list(self) -> str:
+        if self._columns is None:
+            if not self._masks:
+                return "*"
+            replacements = ", ".join(f"{mask} AS `{column}`" for column, mask in self._masks.items())
+            return f"* REPLACE ({replacements})"
+        return ", ".join(
+            f"{self._masks[column]} AS `{column}`" if column in self._masks else f"`{column}`"
+            for column in self._columns
+        )
+
+    def _create_select_query(self) -> str:
+        sql = f"SELECT {self._create_select_list()} FROM `{self._source_table_id}`"  # noqa: S608
+        if self._percent is not None:
+            sql += f" TABLESAMPLE SYSTEM ({self._percent} PERCENT)"
+        conditions = [f"({self._where})"] if self._where else []
+        if self._key is not None and self._fraction is not None:
+            threshold = round(self._fraction * self.HASH_BUCKETS)
+            conditions.append(
+                f"MOD(ABS(FARM_FINGERPRINT(CAST({self._key} AS STRING))), {self.HASH_BUCKETS}) < {threshold}"
+            )
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        if self._limit is not None:
+            sql += f" LIMIT {int(self._limit)}"
+        return sql
+
+    def load_to_bq(self, bq_client: bq.Client) -> BQTable:
+        """Creates the sample inside BigQuery.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+
+        Returns:
+            BQTable: A representative of the BigQuery table which was created.
+        """
+        # CREATE OR REPLACE keeps the query idempotent if it is retried
+        sql = (
+            f"CREATE OR REPLACE TABLE `{self.fq_table_id}`{self._create_table_options()} AS\n"
+            f"{self._create_select_query()}"
+        )
+        self._run_job(
+            bq_client,
+            lambda job_id: bq_client.query(sql, job_id=job_id, location=self._location),
+            job_kind="sample",
+        )
+        return BQTable(self._original_table_id, self.fq_table_id, bq_client)
+
+    def load_to_session(self, bq_client: bq.Client, session: BQSession) -> BQTable:
+        """Creates the sample as a temporary table of a BigQuery session.
+
+        Arguments:
+            bq_client: BigQuery client for interacting with BigQuery
+            session: session of the temporary table
+
+        Returns:
+            BQTable: A representative of the temporary table.
+        """
+        sql = f"CREATE OR REPLACE TEMP TABLE `{self.table_name}` AS\n{self._create_select_query()}"
+        self._run_job(
+            bq_client,
+            lambda job_id: bq_client.query(
+                sql, job_id=job_id, location=self._location, job_config=session.apply(bq.QueryJobConfig())
+            ),
+            job_kind=session.job_kind("sample"),
+        )
+        return BQTable(self._original_table_id, session.table_id(self.table_name), bq_client)
+
 
 class BQTableDefinitionBuilder:
     """Helper class for building BQTableDefinitions"""
 
-    def __init__(self, project: str, dataset: str = "bquest", location: str = "EU"):
+    PLACEMENTS = ("hash", "least_loaded")
+
+    def __init__(
+        self,
+        project: str,
+        dataset: str = "bquest",
+        location: str = "EU",
+        datasets: Optional[List[str]] = None,
+        placement: str = "hash",
+        labels: Optional[Dict[str, str]] = None,
+        expiration: Optional[datetime.timedelta] = DEFAULT_EXPIRATION,
+        session: Optional[str] = None,
+        ingestion: str = "load_job",
+        write_client: Optional[bq_storage.BigQueryWriteClient] = None,
+    ):
         """
 
         Args:
             project: Google Cloud project
             dataset: BigQuery dataset e.g. bquest
             location: location of dataset e.g. EU
+            datasets: pool of datasets the tables are spread across instead of a single dataset,
+                e.g. ["bquest_0", "other-project.bquest_1"], all datasets have to be in the same location
+            placement: either hash (rendezvous hashing of the table name and the number of tables of this
+                name created before by this builder) or least_loaded
+                (dataset with the fewest tables created by this builder)
+            labels: additional labels of all created tables
+            expiration: time after which BigQuery deletes the created tables, None keeps them
+            session: label value identifying the tables of this builder, a random id by default
+            ingestion: load_job or write_api, how JSON and dataframe definitions are written. The Storage
+                Write API makes small tables available faster, but their rows stay in the streaming buffer
+                for a while, so prefer load jobs for base tables of clones.
+            write_client: Storage Write API client of the write_api ingestion, e.g. created with the credentials
+                of the BigQuery client, one with the default credentials if None
         """
+        if placement not in self.PLACEMENTS:
+            raise ValueError(f"Unknown placement {placement}, expected one of {self.PLACEMENTS}.")
+        if ingestion not in INGESTION_MODES:
+            raise ValueError(f"Unknown ingestion mode {ingestion}, expected one of {INGESTION_MODES}.")
+
         self._project = project
         self._dataset = dataset
         self._location = location
+        self._placement = placement
+        self._datasets: List[Tuple[str, str]] = [self._split_dataset(d) for d in datasets or [dataset]]
+        self._table_counts = dict.fromkeys(self._datasets, 0)
+        self._name_counts: Dict[str, int] = collections.defaultdict(int)
+        self._lock = threading.Lock()
+        self._expiration = expiration
+        self._ingestion = ingestion
+        self._write_client = write_client
+        self._labels = {
+            RUN_LABEL: RUN_ID,
+            SESSION_LABEL: to_label_value(session or str(uuid.uuid4())),
+            **(labels or {}),
+        }
+
+    def _split_dataset(self, dataset: str) -> Tuple[str, str]:
+        project, _, dataset_id = dataset.rpartition(".")
+        return project or self._project, dataset_id
+
+    @property
+    def labels(self) -> Dict[str, str]:
+        """Returns the labels of all created tables, including the run and session labels"""
+        return self._labels
+
+    @property
+    def datasets(self) -> List[str]:
+        """Returns the fully qualified datasets of the pool (e.g. my-project.bquest)"""
+        return [f"{project}.{dataset}" for project, dataset in self._datasets]
+
+    def _place(self, name: str) -> Tuple[str, str]:
+        """Chooses the project and dataset of a new table definition."""
+        if len(self._datasets) == 1:
+            return self._datasets[0]
+
+        with self._lock:
+            # tables of the same name, e.g. all result tables, are numbered, otherwise they would share a dataset.
+            # The keys are the same when the tests run again, so their tables are placed in the same datasets.
+            self._name_counts[name] += 1
+            key = f"{name}#{self._name_counts[name]}"
+            if self._placement == "least_loaded":
+                chosen = min(self._datasets, key=lambda d: self._table_counts[d])
+            else:
+                # rendezvous hashing keeps most keys in place if datasets are added or removed
+                chosen = max(
+                    self._datasets,
+                    key=lambda d: hashlib.sha256(f"{d[0]}.{d[1]}/{key}".encode()).digest(),
+                )
+            self._table_counts[chosen] += 1
+            return chosen
 
     def from_json(
         self,
         name: str,
         rows: List[Dict[str, Any]],
-        schema: Optional[List[google.cloud.bigquery.SchemaField]] = None,
+        schema: Optional[List[bq.SchemaField]] = None,
+        time_partitioning: Optional[bq.TimePartitioning] = None,
+        clustering_fields: Optional[List[str]] = None,
+        load_format: str = "auto",
     ) -> BQTableJsonDefinition:
-        return BQTableJsonDefinition(name, rows, schema, self._project, self._dataset, self._location)
+        project, dataset = self._place(name)
+        return BQTableJsonDefinition(
+            name,
+            rows,
+            schema,
+            project,
+            dataset,
+            self._location,
+            time_partitioning=time_partitioning,
+            clustering_fields=clustering_fields,
+            labels=self._labels,
+            expiration=self._expiration,
+            load_format=load_format,
+            ingestion=self._ingestion,
+            write_client=self._write_client,
+        )
 
-    def from_df(self, name: str, df: pd.DataFrame) -> BQTableDataframeDefinition:
-        return BQTableDataframeDefinition(name, df, self._project, self._dataset, self._location)
+    def from_df(
+        self,
+        name: str,
+        df: pd.DataFrame,
+        time_partitioning: Optional[bq.TimePartitioning] = None,
+        clustering_fields: Optional[List[str]] = None,
+    ) -> BQTableDataframeDefinition:
+        project, dataset = self._place(name)
+        return BQTableDataframeDefinition(
+            name,
+            df,
+            project,
+            dataset,
+            self._location,
+            time_partitioning=time_partitioning,
+            clustering_fields=clustering_fields,
+            labels=self._labels,
+            expiration=self._expiration,
+            ingestion=self._ingestion,
+            write_client=self._write_client,
+        )
+
+    def from_generator(
+        self,
+        name: str,
+        schema: List[bq.SchemaField],
+        num_rows: int,
+        distributions: Optional[Dict[str, ColumnDistribution]] = None,
+        chunk_size: int = 100_000,
+        seed: Optional[int] = None,
+        time_partitioning: Optional[bq.TimePartitioning] = None,
+        clustering_fields: Optional[List[str]] = None,
+    ) -> BQTableSyntheticDefinition:
+        project, dataset = self._place(name)
+        return BQTableSyntheticDefinition(
+            name,
+            schema,
+            num_rows,
+            distributions,
+            chunk_size,
+            seed,
+            project,
+            dataset,
+            self._location,
+            time_partitioning=time_partitioning,
+            clustering_fields=clustering_fields,
+            labels=self._labels,
+            expiration=self._expiration,
+        )
+
+    def clone(self, base_definition: BQTableDefinition, dml: Optional[List[str]] = None) -> BQTableCloneDefinition:
+        project, dataset = self._place(base_definition.original_table_id)
+        return BQTableCloneDefinition(
+            base_definition, dml, project, dataset, self._location, labels=self._labels, expiration=self._expiration
+        )
+
+    def from_table_sample(
+        self,
+        name: str,
+        source_table_id: Optional[str] = None,
+        percent: Optional[float] = None,
+        where: Optional[str] = None,
+        key: Optional[str] = None,
+        fraction: Optional[float] = None,
+        columns: Optional[List[str]] = None,
+        masks: Optional[Dict[str, str]] = None,
+        limit: Optional[int] = None,
+    ) -> BQTableSampleDefinition:
+        """Defines a table as a sample of an existing table, see BQTableSampleDefinition
+
+        Args:
+            name: table name used in the tested queries
+            source_table_id: fully qualified id of the sampled table, the name if None
+            percent: percentage of storage blocks read with TABLESAMPLE SYSTEM, all blocks if None
+            where: predicate the sampled rows fulfill
+            key: SQL expression of the key of a hash sample, e.g. customer_id
+            fraction: fraction of the key values in the hash sample
+            columns: columns of the sample, all columns if None
+            masks: SQL expressions replacing the values of columns, e.g. {"email": "TO_HEX(SHA256(email))"}
+            limit: maximum number of rows of the sample
+
+        Returns:
+            the definition of the sample
+        """
+        project, dataset = self._place(name)
+        return BQTableSampleDefinition(
+            name,
+            source_table_id or name,
+            project,
+            dataset,
+            self._location,
+            percent=percent,
+            where=where,
+            key=key,
+            fraction=fraction,
+            columns=columns,
+            masks=masks,
+            limit=limit,
+            labels=self._labels,
+            expiration=self._expiration,
+        )
 
     def create_empty(self, name: str) -> BQTableDefinition:
-        return BQTableDefinition(name, self._project, self._dataset, self._location)
+        project, dataset = self._place(name)
+        return BQTableDefinition(
+            name, project, dataset, self._location, labels=self._labels, expiration=self._expiration
+        )
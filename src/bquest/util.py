@@ -1,6 +1,47 @@
 """Utility functions for bquest"""
 
-import sqlvalidator
+import importlib
+import types
+from typing import TYPE_CHECKING, Any
+
+
+class LazyModule(types.ModuleType):
+    """
+    Placeholder for a module which is imported on first attribute access.
+
+    Keeps heavy dependencies like pandas or the BigQuery client out of the import of bquest itself,
+    so collecting tests which never touch BigQuery stays fast.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+
+        Args:
+            name: fully qualified name of the module, e.g. google.cloud.bigquery
+        """
+        super().__init__(name)
+
+    def __getattr__(self, attribute: str) -> Any:
+        # importlib caches the module in sys.modules, so only the first access pays for the import
+        return getattr(importlib.import_module(self.__name__), attribute)
+
+
+def lazy_import(name: str) -> Any:
+    """Returns a placeholder of a module which is imported on first attribute access
+
+    Args:
+        name: fully qualified name of the module
+
+    Returns:
+        the placeholder, typed as Any so that it can stand in for the module
+    """
+    return LazyModule(name)
+
+
+if TYPE_CHECKING:
+    import sqlvalidator
+else:
+    sqlvalidator = lazy_import("sqlvalidator")
 
 
 def is_sql(string: str) -> bool:
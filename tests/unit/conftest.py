@@ -0,0 +1,12 @@
+import pytest
+
+from bquest.scheduler import TableOperationScheduler, get_default_scheduler, set_default_scheduler
+
+
+@pytest.fixture(autouse=True)
+def unthrottled_scheduler():
+    """Keeps unit tests from waiting for the rate limits of the shared table operation scheduler"""
+    default_scheduler = get_default_scheduler()
+    set_default_scheduler(TableOperationScheduler(operations_per_second=1_000_000, burst=1_000_000))
+    yield
+    set_default_scheduler(default_scheduler)
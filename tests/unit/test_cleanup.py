@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+from mock import MagicMock, patch
+
+from bquest.cleanup import TableFilter, collect_garbage
+from bquest.cli import main
+
+pytestmark = pytest.mark.unit
+
+NOW = datetime.datetime.now(datetime.timezone.utc)
+
+
+def _table(table_id: str, labels: dict, age_hours: float) -> MagicMock:
+    return MagicMock(
+        project="myproject",
+        dataset_id="bquest",
+        table_id=table_id,
+        labels=labels,
+        created=NOW - datetime.timedelta(hours=age_hours),
+    )
+
+
+TABLES = [
+    _table("abc_orders_1", {"bquest_run": "r1", "bquest_session": "s1"}, 30),
+    _table("abc_orders_2", {"bquest_run": "r2", "bquest_session": "s1"}, 1),
+    _table("abc_customers_3", {}, 48),
+]
+
+
+class TestTableFilter:
+    def test_requires_a_criterion(self) -> None:
+        with pytest.raises(ValueError):
+            TableFilter()
+
+    def test_matches_all_criteria(self) -> None:
+        assert [t.table_id for t in TABLES if TableFilter(labels={"bquest_run": None}).matches(t)] == [
+            "abc_orders_1",
+            "abc_orders_2",
+        ]
+        assert [t.table_id for t in TABLES if TableFilter(labels={"bquest_run": "r2"}).matches(t)] == ["abc_orders_2"]
+        assert [
+            t.table_id
+            for t in TABLES
+            if TableFilter(older_than=datetime.timedelta(hours=24), prefix="abc_orders").matches(t)
+        ] == ["abc_orders_1"]
+
+
+class TestCollectGarbage:
+    def test_deletes_matching_tables(self) -> None:
+        bq_client = MagicMock()
+        bq_client.list_tables.return_value = iter(TABLES)
+
+        deleted = collect_garbage(bq_client, "myproject.bquest", TableFilter(older_than=datetime.timedelta(hours=24)))
+
+        assert deleted == ["myproject.bquest.abc_orders_1", "myproject.bquest.abc_customers_3"]
+        assert sorted(c[0][0] for c in bq_client.delete_table.call_args_list) == sorted(deleted)
+        assert all(c[1]["not_found_ok"] for c in bq_client.delete_table.call_args_list)
+
+    def test_dry_run_does_not_delete(self) -> None:
+        bq_client = MagicMock()
+        bq_client.list_tables.return_value = iter(TABLES)
+
+        deleted = collect_garbage(bq_client, "myproject.bquest", TableFilter(prefix="abc_"), dry_run=True)
+
+        assert len(deleted) == 3
+        bq_client.delete_table.assert_not_called()
+
+
+class TestCli:
+    @patch("google.cloud.bigquery.Client")
+    def test_gc_sweeps_datasets_by_label(self, mock_client_class: MagicMock, capsys) -> None:
+        bq_client = mock_client_class.return_value
+        bq_client.project = "myproject"
+        bq_client.list_tables.return_value = iter(TABLES)
+
+        main(["gc", "bquest", "--label", "bquest_session=s1", "--workers", "2"])
+
+        bq_client.list_tables.assert_called_once_with("myproject.bquest", page_size=1000)
+        assert bq_client.delete_table.call_count == 2
+        assert "Deleted 2 tables in myproject.bquest." in capsys.readouterr().out
+
+    def test_gc_refuses_to_sweep_without_filter(self) -> None:
+        with pytest.raises(SystemExit):
+            main(["gc", "myproject.bquest"])
@@ -1,7 +1,15 @@
 import pandas as pd
+import pyarrow as pa
 import pytest
+from mock import patch
 
-from bquest.dataframe import assert_frame_equal, standardize_frame_numerics
+from bquest.dataframe import (
+    assert_batches_equal,
+    assert_frame_equal,
+    assert_frame_matches_snapshot,
+    standardize_frame_numerics,
+    write_snapshot,
+)
 
 pytestmark = pytest.mark.unit
 
@@ -120,3 +128,100 @@ class TestDataframeUtils:
         assert_frame_equal(left, right, check_dtype=False)
         with pytest.raises(AssertionError):
             assert_frame_equal(left, right, check_dtype=True)
+
+    def test_assert_batches_equal(self) -> None:
+        batches = [
+            pd.DataFrame({"hash": ["abc-999"], "value": pd.array([3], dtype="Int64")}),
+            pd.DataFrame({"value": pd.array([5, 3], dtype="Int64"), "hash": ["abc-888", "abc-777"]}),
+        ]
+
+        expected = pd.DataFrame({"hash": ["abc-777", "abc-888", "abc-999"], "value": [3, 5, 3]})
+
+        assert_batches_equal(iter(batches), expected)
+
+    def test_assert_batches_equal_recognizes_missing_and_duplicate_rows(self) -> None:
+        batches = [
+            pd.DataFrame({"hash": ["abc-999", "abc-999"], "value": [3, 3]}),
+        ]
+
+        expected = pd.DataFrame({"hash": ["abc-888", "abc-999"], "value": [5, 3]})
+
+        with pytest.raises(AssertionError, match="1 expected rows are missing and 1 rows are unexpected"):
+            assert_batches_equal(batches, expected)
+
+    def test_assert_batches_equal_counts_unexpected_rows_of_all_batches(self) -> None:
+        batches = (pd.DataFrame({"hash": ["abc-999", f"abc-{i}"], "value": [3, i]}) for i in range(100))
+
+        expected = pd.DataFrame({"hash": ["abc-999"], "value": [3]})
+
+        with pytest.raises(AssertionError, match="0 expected rows are missing and 199 rows are unexpected"):
+            assert_batches_equal(batches, expected)
+
+    def test_assert_frame_matches_snapshot(self, tmp_path) -> None:
+        path = str(tmp_path / "snapshots" / "result.parquet")
+        df = pd.DataFrame({"hash": ["abc-999", "abc-888"], "value": [3, 5]})
+
+        assert_frame_matches_snapshot(df, path, update=True)
+
+        assert_frame_matches_snapshot(df.iloc[::-1][["value", "hash"]], path)
+
+    def test_assert_frame_matches_snapshot_skips_loading_on_equal_hashes(self, tmp_path) -> None:
+        path = str(tmp_path / "result.parquet")
+        df = pd.DataFrame({"hash": ["abc-999", "abc-888"], "value": [3, 5]})
+        write_snapshot(df, path)
+
+        with patch("pandas.read_parquet") as read_parquet:
+            assert_frame_matches_snapshot(df, path)
+
+        read_parquet.assert_not_called()
+
+    def test_assert_frame_matches_snapshot_compares_snapshot_on_different_hashes(self, tmp_path) -> None:
+        path = str(tmp_path / "result.parquet")
+        write_snapshot(pd.DataFrame({"hash": ["abc-999"], "target": [1.0]}), path)
+
+        assert_frame_matches_snapshot(pd.DataFrame({"hash": ["abc-999"], "target": [1.0005]}), path, rtol=1e-3)
+        with pytest.raises(AssertionError):
+            assert_frame_matches_snapshot(pd.DataFrame({"hash": ["abc-888"], "target": [1.0]}), path)
+
+    @pytest.mark.parametrize("value, updated", [("1", True), ("TRUE", True), ("False", False), ("0", False)])
+    def test_assert_frame_matches_snapshot_parses_update_env_var(self, tmp_path, monkeypatch, value, updated) -> None:
+        path = str(tmp_path / "result.parquet")
+        monkeypatch.setenv("BQUEST_UPDATE_SNAPSHOTS", value)
+
+        with patch("bquest.dataframe.write_snapshot") as write:
+            if updated:
+                assert_frame_matches_snapshot(pd.DataFrame({"hash": ["abc-999"]}), path)
+            else:
+                with pytest.raises(AssertionError, match="does not exist"):
+                    assert_frame_matches_snapshot(pd.DataFrame({"hash": ["abc-999"]}), path)
+
+        assert write.called == updated
+
+    def test_assert_frame_matches_snapshot_requires_existing_snapshot(self, tmp_path) -> None:
+        with pytest.raises(AssertionError, match="does not exist"):
+            assert_frame_matches_snapshot(pd.DataFrame({"hash": ["abc-999"]}), str(tmp_path / "missing.parquet"))
+
+    def test_assert_frame_equal_compares_arrow_tables(self) -> None:
+        left = pa.table({"hash": ["abc-999", "abc-888", None], "target": [2.0, 1.0, float("nan")]})
+        right = pa.table({"target": [1.0005, None, 2.0], "hash": ["abc-888", None, "abc-999"]})
+        right = right.set_column(0, "target", pa.array([1.0005, float("nan"), 2.0]))
+
+        assert_frame_equal(left, right, rtol=1e-3)
+        with pytest.raises(AssertionError):
+            assert_frame_equal(left, right)
+
+    def test_assert_frame_equal_compares_arrow_table_with_pandas(self) -> None:
+        left = pa.table({"hash": ["abc-999", "abc-888"], "value": pa.array([3, 5], pa.int64())})
+
+        assert_frame_equal(left, pd.DataFrame({"hash": ["abc-888", "abc-999"], "value": [5, 3]}))
+        with pytest.raises(AssertionError):
+            assert_frame_equal(left, pd.DataFrame({"hash": ["abc-888", "abc-999"], "value": [5.0, 3.0]}))
+        assert_frame_equal(left, pd.DataFrame({"hash": ["abc-888", "abc-999"], "value": [5.0, 3.0]}), check_dtype=False)
+
+    def test_assert_frame_equal_compares_polars_frames(self) -> None:
+        pl = pytest.importorskip("polars")
+        left = pl.DataFrame({"hash": ["abc-999", "abc-888"], "value": [3, 5]})
+
+        assert_frame_equal(left, pl.DataFrame({"value": [5, 3], "hash": ["abc-888", "abc-999"]}))
+        with pytest.raises(AssertionError):
+            assert_frame_equal(left, pd.DataFrame({"hash": ["abc-888", "abc-999"], "value": [5, 4]}))
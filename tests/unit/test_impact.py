@@ -0,0 +1,143 @@
+import json
+import os
+from typing import Any, Callable
+
+import pytest
+from mock import MagicMock
+
+from bquest.impact import Fingerprint, ImpactIndex, current_fingerprint, recording
+from bquest.pytest_plugin import ImpactPlugin
+from bquest.runner import SQLFileRunner, SQLRunner
+from bquest.tables import BQTableDefinitionBuilder, BQTableJsonDefinition
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture()
+def sql_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sql").mkdir()
+    path = tmp_path / "sql" / "query.sql"
+    path.write_text("SELECT id FROM `{orders}`")
+    return path
+
+
+def _run_query(bq_client: MagicMock) -> None:
+    orders = BQTableDefinitionBuilder("myproject").from_json("abc.orders", [{"id": 1}])
+    SQLFileRunner(SQLRunner(bq_client), "sql").run("query.sql", [orders], {"orders": orders.fq_table_id})
+
+
+class TestFingerprint:
+    def test_runners_record_files_fixtures_and_substitutions_reproducibly(self, sql_file) -> None:
+        with recording() as first:
+            _run_query(MagicMock())
+        with recording() as second:
+            _run_query(MagicMock())
+
+        assert current_fingerprint() is None
+        assert list(first.files) == ["sql/query.sql"]
+        assert sorted(first.inputs) == ["fixture:abc.orders", "query"]
+        assert first.digest == second.digest
+        assert first.files_unchanged()
+        sql_file.write_text("SELECT 1")
+        assert not first.files_unchanged()
+
+    def test_index_keeps_fingerprints_of_passed_tests(self, sql_file) -> None:
+        fingerprint = Fingerprint()
+        fingerprint.add_file(str(sql_file))
+        index = ImpactIndex("index/impact.json")
+        index.record("test_a", fingerprint, passed=True)
+        index.record("test_b", fingerprint, passed=False)
+        index.save()
+
+        index = ImpactIndex("index/impact.json")
+
+        assert index.get("test_a").digest == fingerprint.digest
+        assert index.is_unchanged("test_a")
+        assert not index.is_unchanged("test_b")
+        assert not index.is_unchanged("test_c")
+
+
+def _run_test(plugin: ImpactPlugin, item: MagicMock, setup: Callable[[], Any], call: Callable[[Any], None]) -> None:
+    """Runs the hooks of the plugin around the setup and the call of a passing test"""
+    hook = plugin.pytest_runtest_setup(item)
+    next(hook)
+    fixture = setup()
+    with pytest.raises(StopIteration):
+        next(hook)
+    hook = plugin.pytest_runtest_call(item)
+    next(hook)
+    call(fixture)
+    with pytest.raises(StopIteration):
+        next(hook)
+    report = plugin.pytest_runtest_makereport(item)
+    next(report)
+    with pytest.raises(StopIteration):
+        report.send(MagicMock(get_result=MagicMock(return_value=MagicMock(when="call", passed=True))))
+
+
+class TestImpactPlugin:
+    def test_plugin_records_bquest_tests_and_skips_them_if_unchanged(self, sql_file, tmp_path) -> None:
+        test_file = tmp_path / "test_query.py"
+        test_file.write_text("def test_query(): ...")
+        item = MagicMock(nodeid="test_query.py::test_query", path=test_file)
+        plugin = ImpactPlugin(ImpactIndex("impact.json"), str(tmp_path))
+
+        _run_test(plugin, item, lambda: None, lambda _: _run_query(MagicMock()))
+        plugin.pytest_sessionfinish(MagicMock(config=MagicMock(spec=[])))
+
+        skipped, changed = MagicMock(nodeid=item.nodeid), MagicMock(nodeid=item.nodeid)
+        ImpactPlugin(ImpactIndex("impact.json"), str(tmp_path)).pytest_collection_modifyitems([skipped])
+        test_file.write_text("def test_query(): assert False")
+        ImpactPlugin(ImpactIndex("impact.json"), str(tmp_path)).pytest_collection_modifyitems([changed])
+
+        skipped.add_marker.assert_called_once()
+        changed.add_marker.assert_not_called()
+
+    def test_plugin_detects_changed_data_files_of_fixtures(self, sql_file, tmp_path) -> None:
+        data_file = tmp_path / "orders.json"
+        data_file.write_text('[{"id": 1}]')
+        test_file = tmp_path / "test_query.py"
+        test_file.write_text("def test_query(): ...")
+        item = MagicMock(nodeid="test_query.py::test_query", path=test_file)
+        plugin = ImpactPlugin(ImpactIndex("impact.json"), str(tmp_path))
+
+        def setup() -> BQTableJsonDefinition:
+            with open(data_file, encoding="UTF-8") as f:
+                return BQTableDefinitionBuilder("myproject").from_json("abc.orders", json.load(f))
+
+        def call(orders: BQTableJsonDefinition) -> None:
+            SQLFileRunner(SQLRunner(MagicMock()), "sql").run("query.sql", [orders], {"orders": orders.fq_table_id})
+
+        _run_test(plugin, item, setup, call)
+        plugin.pytest_sessionfinish(MagicMock(config=MagicMock(spec=[])))
+
+        assert ImpactIndex("impact.json").is_unchanged(item.nodeid)
+        data_file.write_text('[{"id": 2}]')
+        assert not ImpactIndex("impact.json").is_unchanged(item.nodeid)
+
+    def test_tests_with_definitions_of_unknown_files_are_never_unchanged(self, sql_file) -> None:
+        fingerprint = Fingerprint()
+        fingerprint.add_table_definitions([MagicMock(source_files=None, fingerprint="abc", original_table_id="t")])
+        index = ImpactIndex("impact.json")
+        index.record("test_a", fingerprint, passed=True)
+
+        assert not index.is_unchanged("test_a")
+
+    def test_xdist_workers_save_parts_merged_by_the_controller(self, sql_file, tmp_path) -> None:
+        fingerprint = Fingerprint()
+        fingerprint.add_file(str(sql_file))
+        for worker_id in ("gw0", "gw1"):
+            plugin = ImpactPlugin(ImpactIndex("impact.json"), str(tmp_path))
+            plugin._index.record(f"test_{worker_id}", fingerprint, passed=True)
+            plugin.pytest_sessionfinish(MagicMock(config=MagicMock(workerinput={"workerid": worker_id})))
+        assert not os.path.exists("impact.json")
+
+        ImpactPlugin(ImpactIndex("impact.json"), str(tmp_path)).pytest_sessionfinish(
+            MagicMock(config=MagicMock(spec=[]))
+        )
+
+        index = ImpactIndex("impact.json")
+        assert index.is_unchanged("test_gw0")
+        assert index.is_unchanged("test_gw1")
+        assert sorted(os.listdir(tmp_path)) == ["impact.json", "sql"]
@@ -0,0 +1,88 @@
+import pyarrow as pa
+import pytest
+from google.cloud import bigquery as bq
+from google.cloud.bigquery_storage_v1 import types
+from mock import MagicMock
+
+from bquest.ingestion import arrow_to_bq_schema, get_write_client, write_arrow_table
+
+pytestmark = pytest.mark.unit
+
+
+def test_arrow_to_bq_schema_maps_nested_and_repeated_types() -> None:
+    schema = pa.schema(
+        [
+            pa.field("id", pa.int64(), nullable=False),
+            pa.field("name", pa.large_string()),
+            pa.field("created", pa.timestamp("us", "UTC")),
+            pa.field("day", pa.date32()),
+            pa.field("tags", pa.list_(pa.string())),
+            pa.field("address", pa.struct([pa.field("zip", pa.string())])),
+        ]
+    )
+
+    assert arrow_to_bq_schema(schema) == [
+        bq.SchemaField("id", "INTEGER", mode="REQUIRED"),
+        bq.SchemaField("name", "STRING"),
+        bq.SchemaField("created", "TIMESTAMP"),
+        bq.SchemaField("day", "DATE"),
+        bq.SchemaField("tags", "STRING", mode="REPEATED"),
+        bq.SchemaField("address", "RECORD", fields=[bq.SchemaField("zip", "STRING")]),
+    ]
+
+
+def test_arrow_to_bq_schema_rejects_columns_without_bigquery_type() -> None:
+    with pytest.raises(ValueError, match="empty"):
+        arrow_to_bq_schema(pa.schema([pa.field("empty", pa.null())]))
+
+
+def test_write_arrow_table_appends_with_offsets_to_committed_stream() -> None:
+    write_client = MagicMock()
+    write_client.table_path.return_value = "projects/p/datasets/d/tables/t"
+    write_client.create_write_stream.return_value = types.WriteStream(name="stream")
+    requests = []
+
+    def append_rows(request_iterator):
+        requests.extend(request_iterator)
+        return [types.AppendRowsResponse() for _ in requests]
+
+    write_client.append_rows.side_effect = append_rows
+    table = pa.table({"id": list(range(10))})
+
+    write_arrow_table(write_client, "p.d.t", table, max_request_bytes=32)
+
+    stream = write_client.create_write_stream.call_args.kwargs["write_stream"]
+    assert stream.type_ == types.WriteStream.Type.COMMITTED
+    assert [request.offset for request in requests] == [0, 4, 8]
+    assert [request.arrow_rows.rows.row_count for request in requests] == [4, 4, 2]
+    assert requests[0].arrow_rows.writer_schema.serialized_schema
+    assert not requests[1].arrow_rows.writer_schema.serialized_schema
+    write_client.finalize_write_stream.assert_called_once_with(name="stream")
+
+
+def test_write_arrow_table_raises_on_row_errors() -> None:
+    write_client = MagicMock()
+    write_client.create_write_stream.return_value = types.WriteStream(name="stream")
+    write_client.append_rows.return_value = [
+        types.AppendRowsResponse(row_errors=[types.RowError(index=0, message="invalid")])
+    ]
+
+    with pytest.raises(ValueError, match="invalid"):
+        write_arrow_table(write_client, "p.d.t", pa.table({"id": [1]}))
+    write_client.finalize_write_stream.assert_not_called()
+
+
+def test_write_arrow_table_skips_empty_tables() -> None:
+    write_client = MagicMock()
+    write_arrow_table(write_client, "p.d.t", pa.table({"id": pa.array([], pa.int64())}))
+    write_client.create_write_stream.assert_not_called()
+
+
+def test_get_write_client_is_shared_per_credentials(monkeypatch) -> None:
+    write_client_class = MagicMock(side_effect=lambda **_: MagicMock())
+    monkeypatch.setattr("google.cloud.bigquery_storage_v1.BigQueryWriteClient", write_client_class)
+    credentials = MagicMock()
+    assert get_write_client(credentials) is get_write_client(credentials)
+    assert get_write_client(credentials) is not get_write_client(MagicMock())
+    assert get_write_client() is get_write_client()
+    assert write_client_class.call_args_list[0].kwargs == {"credentials": credentials}
@@ -0,0 +1,60 @@
+import datetime
+import decimal
+
+import pytest
+from google.cloud import bigquery as bq
+
+from bquest.parameters import parse_date, to_query_parameter, to_query_parameters
+
+pytestmark = pytest.mark.unit
+
+
+class TestQueryParameters:
+    def test_parse_date_converts_date_strings_only(self) -> None:
+        assert parse_date("20190301") == datetime.date(2019, 3, 1)
+        assert parse_date("2019-03-01") == datetime.date(2019, 3, 1)
+        assert parse_date("prediction_date") == "prediction_date"
+        assert parse_date(3) == 3
+
+    def test_infers_scalar_types(self) -> None:
+        parameters = to_query_parameters(
+            {
+                "flag": True,
+                "threshold": 30,
+                "ratio": 0.5,
+                "price": decimal.Decimal("1.10"),
+                "country": "DE",
+                "day": datetime.date(2019, 3, 1),
+                "local_time": datetime.datetime(2019, 3, 1, 12),
+                "event_time": datetime.datetime(2019, 3, 1, 12, tzinfo=datetime.timezone.utc),
+            }
+        )
+
+        assert [(p.name, p.type_) for p in parameters] == [
+            ("flag", "BOOL"),
+            ("threshold", "INT64"),
+            ("ratio", "FLOAT64"),
+            ("price", "NUMERIC"),
+            ("country", "STRING"),
+            ("day", "DATE"),
+            ("local_time", "DATETIME"),
+            ("event_time", "TIMESTAMP"),
+        ]
+
+    def test_converts_lists_and_dicts_to_arrays_and_structs(self) -> None:
+        countries = to_query_parameter("countries", ["DE", "FR"])
+        limits = to_query_parameter("limits", {"low": 1, "high": 2.5})
+        rows = to_query_parameter("rows", [{"id": 1}, {"id": 2}])
+
+        assert (countries.array_type, countries.values) == ("STRING", ["DE", "FR"])
+        assert limits.struct_types == {"low": "INT64", "high": "FLOAT64"}
+        assert rows.to_api_repr()["parameterType"]["arrayType"]["type"] == "STRUCT"
+
+    def test_passes_query_parameters_through_and_rejects_unknown_types(self) -> None:
+        parameter = bq.ScalarQueryParameter("missing", "STRING", None)
+
+        assert to_query_parameter("missing", parameter) is parameter
+        with pytest.raises(ValueError):
+            to_query_parameter("missing", None)
+        with pytest.raises(ValueError):
+            to_query_parameter("empty", [])
@@ -0,0 +1,95 @@
+import datetime
+import json
+
+import pytest
+from mock import MagicMock
+
+from bquest.performance import PerformanceBaseline, QueryStatistics, ScalingCurve, measure_scaling
+from bquest.runner import SQLRunner
+
+pytestmark = pytest.mark.unit
+
+
+def _statistics(scale: int, exponent: float = 1.0) -> QueryStatistics:
+    return QueryStatistics(int(10 * scale**exponent), 100 * scale, 0)
+
+
+class TestQueryStatistics:
+    def test_from_query_job(self) -> None:
+        start = datetime.datetime(2019, 3, 1, 12, 0, 0)
+        query_job = MagicMock(slot_millis=1500, total_bytes_processed=2048)
+        query_job.query_plan = [
+            MagicMock(shuffle_output_bytes=100, start=start, end=start + datetime.timedelta(seconds=2)),
+            MagicMock(shuffle_output_bytes=None, start=None, end=None),
+        ]
+        query_job.query_plan[0].name = "S00: Input"
+
+        statistics = QueryStatistics.from_query_job(query_job)
+
+        assert statistics.slot_millis == 1500
+        assert statistics.bytes_processed == 2048
+        assert statistics.shuffle_bytes == 100
+        assert statistics.stage_millis == {"S00: Input": 2000}
+
+    def test_sql_runner_profiles_query_without_cache(self) -> None:
+        bq_client = MagicMock()
+        bq_client.query.return_value = MagicMock(slot_millis=10, total_bytes_processed=20, query_plan=[])
+
+        statistics = SQLRunner(bq_client).profile("SELECT 1", [])
+
+        assert statistics.slot_millis == 10
+        assert bq_client.query.call_args[1]["job_config"].use_query_cache is False
+        bq_client.query.return_value.to_dataframe.assert_not_called()
+
+
+class TestScalingCurve:
+    def test_linear_curve(self) -> None:
+        curve = measure_scaling(_statistics, [1000, 10000, 100000])
+
+        assert curve.exponent() == pytest.approx(1.0)
+        curve.assert_linear()
+        curve.assert_linear(metric="bytes_processed")
+
+    def test_quadratic_curve_is_not_linear(self) -> None:
+        curve = measure_scaling(lambda scale: _statistics(scale, exponent=2.0), [1000, 10000])
+
+        with pytest.raises(AssertionError):
+            curve.assert_linear()
+        curve.assert_exponent(2.0)
+
+    def test_budget_is_extrapolated(self) -> None:
+        curve = measure_scaling(_statistics, [1000, 10000])
+
+        assert curve.predict("slot_millis", 1_000_000) == pytest.approx(10_000_000)
+        curve.assert_budget(10_500_000, 1_000_000)
+        with pytest.raises(AssertionError):
+            curve.assert_budget(9_500_000, 1_000_000)
+
+    def test_requires_two_scales(self) -> None:
+        with pytest.raises(ValueError):
+            ScalingCurve([1000], [_statistics(1000)])
+
+
+class TestPerformanceBaseline:
+    def test_first_check_stores_baseline(self, tmp_path) -> None:
+        path = tmp_path / "baselines.json"
+        PerformanceBaseline(str(path)).check("my_test", measure_scaling(_statistics, [10, 100]))
+
+        assert json.loads(path.read_text())["my_test"]["slot_millis"] == {"10": 100, "100": 1000}
+
+    def test_update_creates_directory_of_baselines(self, tmp_path) -> None:
+        path = tmp_path / "baselines" / "performance.json"
+        PerformanceBaseline(str(path), update=True).check("my_test", measure_scaling(_statistics, [10, 100]))
+
+        assert json.loads(path.read_text())["my_test"]["slot_millis"] == {"10": 100, "100": 1000}
+
+    def test_check_flags_regressions(self, tmp_path) -> None:
+        path = str(tmp_path / "baselines.json")
+        PerformanceBaseline(path).check("my_test", measure_scaling(_statistics, [10, 100]))
+        slower = measure_scaling(lambda scale: _statistics(scale, exponent=1.2), [10, 100])
+
+        with pytest.raises(AssertionError, match="slot_millis at scale 100"):
+            PerformanceBaseline(path).check("my_test", slower)
+
+        PerformanceBaseline(path, update=True).check("my_test", slower)
+        PerformanceBaseline(path).check("my_test", slower)
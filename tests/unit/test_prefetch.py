@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+from mock import MagicMock
+
+from bquest.prefetch import FixturePrefetcher, run_pipelined
+from bquest.pytest_plugin import PrefetchPlugin
+from bquest.tables import BQTableDefinitionBuilder
+
+pytestmark = pytest.mark.unit
+
+
+class TestFixturePrefetcher:
+    def test_prefetch_loads_each_definition_once(self) -> None:
+        bq_client = MagicMock()
+        builder = BQTableDefinitionBuilder("myproject", expiration=None)
+        orders = builder.from_json("abc.orders", [{"id": 1}])
+
+        with FixturePrefetcher(bq_client) as prefetcher:
+            futures = prefetcher.prefetch([orders]) + prefetcher.prefetch([orders])
+            tables = [future.result() for future in futures]
+
+        assert tables[0] is tables[1] is orders.load_once(bq_client)
+        assert bq_client.load_table_from_file.call_count == 1
+
+    def test_run_pipelined_loads_next_test_while_current_test_runs(self) -> None:
+        bq_client = MagicMock()
+        builder = BQTableDefinitionBuilder("myproject", expiration=None)
+        first, second = builder.from_json("abc.first", [{"id": 1}]), builder.from_json("abc.second", [{"id": 2}])
+        second_loaded = threading.Event()
+        second_load = second.load_once
+
+        def load_second(client):
+            table = second_load(client)
+            second_loaded.set()
+            return table
+
+        second.load_once = load_second
+
+        def first_test() -> bool:
+            return second_loaded.wait(timeout=5)
+
+        results = run_pipelined(bq_client, [([first], first_test), ([second], lambda: "done")])
+
+        assert results == [True, "done"]
+
+    def test_failed_prefetch_is_raised_by_the_test(self) -> None:
+        bq_client = MagicMock()
+        bq_client.load_table_from_file.side_effect = ValueError("broken fixture")
+        builder = BQTableDefinitionBuilder("myproject", expiration=None)
+        orders = builder.from_json("abc.orders", [{"id": 1}])
+
+        with pytest.raises(ValueError, match="broken fixture"):
+            run_pipelined(bq_client, [([orders], lambda: orders.load_once(bq_client))])
+
+    def test_only_prefetched_definitions_share_their_table(self) -> None:
+        bq_client = MagicMock()
+        builder = BQTableDefinitionBuilder("myproject", expiration=None)
+        orders, customers = builder.from_json("abc.orders", [{"id": 1}]), builder.from_json("abc.customers", [])
+
+        with FixturePrefetcher(bq_client) as prefetcher:
+            prefetcher.prefetch([orders])[0].result()
+        assert orders.load_prefetched(bq_client) is orders.load_prefetched(bq_client)
+        assert bq_client.load_table_from_file.call_count == 1
+
+        assert customers.load_prefetched(bq_client) is not customers.load_prefetched(bq_client)
+        assert bq_client.load_table_from_file.call_count == 3
+
+
+class TestPrefetchPlugin:
+    def test_setup_prefetches_marked_tables_of_upcoming_tests(self) -> None:
+        prefetcher = MagicMock()
+        definitions = [MagicMock() for _ in range(3)]
+        items = []
+        for i, definition in enumerate(definitions):
+            item = MagicMock(nodeid=f"test_{i}")
+            item.iter_markers.return_value = [MagicMock(args=(definition,))]
+            items.append(item)
+        plugin = PrefetchPlugin(look_ahead=1, max_workers=2, prefetcher=prefetcher)
+
+        plugin.pytest_collection_modifyitems(items)
+        plugin.pytest_runtest_setup(items[0])
+        plugin.pytest_unconfigure()
+
+        assert [c[0][0] for c in prefetcher.prefetch.call_args_list] == [(definitions[0],), (definitions[1],)]
+        prefetcher.close.assert_called_once()
@@ -1,9 +1,13 @@
+import datetime
+import os
+import time
 from typing import Any, Dict, List
 
 import pytest
 from mock import MagicMock
 
-from bquest.runner import BQConfigRunner, BQConfigSubstitutor
+from bquest.impact import current_fingerprint, recording
+from bquest.runner import BQConfigPipelineRunner, BQConfigRunner, BQConfigSubstitutor, SQLRunner
 from bquest.tables import BQTable, BQTableDefinition, BQTableDefinitionBuilder, BQTableJsonDefinition
 
 pytestmark = pytest.mark.unit
@@ -79,6 +83,58 @@ class TestBQConfigSubstitutor:
                 source_tables,
             )
 
+    def test_substitution_leaves_original_config_untouched(self, simple_bq_config: Dict[str, Any]) -> None:
+        bq_client = MagicMock()
+        source_tables = [
+            BQTable("abc.my_table", "my_table", bq_client),
+            BQTable("abc_views.myview", "my_view_table", bq_client),
+        ]
+        substitutor = BQConfigSubstitutor(simple_bq_config)
+
+        result = substitutor.substitute(
+            "20190301",
+            "20190308",
+            BQTable("featuretable", "myfeaturetable", bq_client),
+            source_tables,
+        )
+
+        assert result["query"] is simple_bq_config["query"]
+        assert simple_bq_config["start_date"] == "prediction_date"
+        assert simple_bq_config["feature_table_name"] == "abc.feature_table"
+        assert simple_bq_config["source_tables"]["source_table"] == "abc.my_table"
+
+    def test_substitution_replaces_all_keys_of_the_same_source_table(self, simple_bq_config: Dict[str, Any]) -> None:
+        bq_client = MagicMock()
+        simple_bq_config["source_tables"]["view_table"] = "abc.my_table"
+
+        result = BQConfigSubstitutor(simple_bq_config).substitute(
+            "20190301",
+            "20190301",
+            BQTable("featuretable", "myfeaturetable", bq_client),
+            [BQTable("abc.my_table", "my_table", bq_client)],
+        )
+
+        assert result["source_tables"] == {"source_table": "my_table", "view_table": "my_table"}
+
+    def test_substitution_adds_query_parameters_when_enabled(self, simple_bq_config: Dict[str, Any]) -> None:
+        bq_client = MagicMock()
+
+        result = BQConfigSubstitutor(simple_bq_config, allow_partial=True, use_query_parameters=True).substitute(
+            "20190301",
+            "20190308",
+            BQTable("featuretable", "myfeaturetable", bq_client),
+            [],
+            templating_vars={"THRESHOLD": 30},
+        )
+
+        parameters = {p.name: (p.type_, p.value) for p in result["query_parameters"]}
+        assert parameters == {
+            "start_date": ("DATE", datetime.date(2019, 3, 1)),
+            "end_date": ("DATE", datetime.date(2019, 3, 8)),
+            "THRESHOLD": ("INT64", 30),
+        }
+        assert "query_parameters" not in simple_bq_config
+
 
 class TestBQConfigRunner:
     @pytest.fixture()
@@ -103,6 +159,44 @@ class TestBQConfigRunner:
 
         assert result_df == df
 
+    def test_run_config_batches_streams_result_table(
+        self,
+        table_definitions: List[BQTableDefinition],
+        simple_bq_config: Dict[str, Any],
+    ) -> None:
+        substitutor = BQConfigSubstitutor(simple_bq_config)
+        bq_client = MagicMock()
+        batches = [MagicMock(), MagicMock()]
+        bq_client.list_rows.return_value.to_arrow_iterable.return_value = iter(batches)
+        runner = BQConfigRunner(bq_client, MagicMock())
+
+        bqstorage_client = MagicMock()
+
+        result = runner.run_config_batches(
+            "20190301", "20190308", table_definitions, substitutor, as_arrow=True, bqstorage_client=bqstorage_client
+        )
+
+        assert list(result) == batches
+        bq_client.list_rows.return_value.to_arrow_iterable.assert_called_with(
+            bqstorage_client=bqstorage_client, max_stream_count=None
+        )
+        bq_client.query.assert_not_called()
+
+    def test_run_config_lazy_does_not_fetch_result_table(
+        self,
+        table_definitions: List[BQTableDefinition],
+        simple_bq_config: Dict[str, Any],
+    ) -> None:
+        substitutor = BQConfigSubstitutor(simple_bq_config)
+        bq_client = MagicMock()
+        runner = BQConfigRunner(bq_client, MagicMock())
+
+        result = runner.run_config_lazy("20190301", "20190308", table_definitions, substitutor)
+
+        assert ".bquest.abc_feature_table_" in result.fq_table_id
+        bq_client.query.assert_not_called()
+        bq_client.list_rows.assert_not_called()
+
     def test_run_config_passes_args_to_bq_executor_func(
         self,
         table_definitions: List[BQTableDefinition],
@@ -138,6 +232,101 @@ class TestBQConfigRunner:
 
         table.delete.assert_not_called()
 
+    def test_run_config_loads_only_columns_read_by_the_query(self) -> None:
+        table_def_builder = BQTableDefinitionBuilder("myproject")
+        orders = table_def_builder.from_json("abc.orders", [{"id": 1, "price": 2, "note": "x"}])
+        config = {
+            "query": "SELECT id, price FROM `{orders}` WHERE {THRESHOLD} > 0",
+            "source_tables": {"orders": "abc.orders"},
+            "feature_table_name": "abc.feature_table",
+        }
+        bq_executor_func = MagicMock()
+        runner = BQConfigRunner(MagicMock(), bq_executor_func, prune_columns=True)
+
+        runner.run_config_lazy("20190301", "20190308", [orders], BQConfigSubstitutor(config))
+
+        substituted_config = bq_executor_func.call_args[0][0]
+        assert substituted_config["source_tables"]["orders"] == orders.select_columns(["id", "price"]).fq_table_id
+
+    def test_run_config_keeps_all_columns_of_prefetched_definitions(self) -> None:
+        orders = BQTableDefinitionBuilder("myproject").from_json("abc.orders", [{"id": 1, "price": 2, "note": "x"}])
+        orders.mark_prefetched()
+        config = {
+            "query": "SELECT id, price FROM `{orders}`",
+            "source_tables": {"orders": "abc.orders"},
+            "feature_table_name": "abc.feature_table",
+        }
+        bq_executor_func = MagicMock()
+        runner = BQConfigRunner(MagicMock(), bq_executor_func, prune_columns=True)
+
+        runner.run_config_lazy("20190301", "20190308", [orders], BQConfigSubstitutor(config))
+
+        assert bq_executor_func.call_args[0][0]["source_tables"]["orders"] == orders.fq_table_id
+
+    def test_run_config_sweep_loads_source_tables_once(
+        self,
+        table_definitions: List[BQTableDefinition],
+        simple_bq_config: Dict[str, Any],
+    ) -> None:
+        bq_client = MagicMock()
+        bq_client.query.return_value.to_dataframe.side_effect = lambda **_: MagicMock()
+        bq_executor_func = MagicMock()
+        runner = BQConfigRunner(bq_client, bq_executor_func)
+        windows = [("20190301", "20190307"), ("20190308", "20190314"), ("20190301", "20190307")]
+
+        results = runner.run_config_sweep(windows, table_definitions, BQConfigSubstitutor(simple_bq_config))
+
+        assert list(results) == windows[:2]
+        assert bq_client.load_table_from_file.call_count == len(table_definitions)
+        configs = [c[0][0] for c in bq_executor_func.call_args_list]
+        assert sorted((config["start_date"], config["end_date"]) for config in configs) == windows[:2]
+        assert configs[0]["source_tables"] == configs[1]["source_tables"]
+        assert configs[0]["feature_table_name"] != configs[1]["feature_table_name"]
+
+    def test_run_config_sweep_runs_windows_in_the_context_of_the_caller(
+        self,
+        table_definitions: List[BQTableDefinition],
+        simple_bq_config: Dict[str, Any],
+    ) -> None:
+        bq_client = MagicMock()
+        bq_client.query.return_value.to_dataframe.side_effect = lambda **_: MagicMock()
+        fingerprints = []
+        runner = BQConfigRunner(bq_client, lambda *_: fingerprints.append(current_fingerprint()))
+        windows = [("20190301", "20190307"), ("20190308", "20190314")]
+
+        with recording() as first:
+            runner.run_config_sweep(windows, table_definitions, BQConfigSubstitutor(simple_bq_config))
+        with recording() as second:
+            runner.run_config_sweep(windows, table_definitions, BQConfigSubstitutor(simple_bq_config))
+
+        assert fingerprints == [first, first, second, second]
+        assert len([name for name in first.inputs if name.startswith("config")]) == len(windows)
+        assert first.digest == second.digest
+
+    def test_run_config_sweep_runs_windows_sequentially_in_a_session(
+        self,
+        table_definitions: List[BQTableDefinition],
+        simple_bq_config: Dict[str, Any],
+    ) -> None:
+        bq_client = MagicMock()
+        bq_client.query.return_value.to_dataframe.side_effect = lambda **_: MagicMock()
+        bq_client.project = "myproject"
+        bq_client.query.return_value.session_info.session_id = "session-1"
+        running, max_running = [], []
+
+        def bq_executor_func(*_: Any) -> None:
+            running.append(1)
+            max_running.append(len(running))
+            time.sleep(0.01)
+            running.pop()
+
+        runner = BQConfigRunner(bq_client, bq_executor_func, use_session=True)
+        windows = [("20190301", "20190307"), ("20190308", "20190314"), ("20190315", "20190321")]
+
+        runner.run_config_sweep(windows, table_definitions, BQConfigSubstitutor(simple_bq_config), max_workers=3)
+
+        assert max(max_running) == 1
+
     def test_run_config_uses_custom_result_table(self) -> None:
         substitutor = MagicMock()
         runner = BQConfigRunner(MagicMock(), MagicMock())
@@ -154,4 +343,195 @@ class TestBQConfigRunner:
         )
 
         result_table_def.load_to_bq.assert_called()
-        substitutor.substitute.assert_called_with("20190301", "20190308", result_table, [])
+        substitutor.substitute.assert_called_with("20190301", "20190308", result_table, [], None)
+
+
+class TestBQConfigPipelineRunner:
+    @staticmethod
+    def _config(feature_table_name: str, *source_tables: str) -> BQConfigSubstitutor:
+        return BQConfigSubstitutor(
+            {
+                "query": "SELECT 1",
+                "source_tables": {f"source_{i}": table for i, table in enumerate(source_tables)},
+                "feature_table_name": feature_table_name,
+            }
+        )
+
+    def test_run_pipeline_wires_results_into_downstream_configs(self) -> None:
+        bq_client = MagicMock()
+        executed_configs = []
+        runner = BQConfigPipelineRunner(bq_client, lambda config, _: executed_configs.append(config))
+        raw = BQTableDefinitionBuilder("myproject").from_json("abc.raw", [{"foo": "bar"}])
+
+        result = runner.run_pipeline(
+            "20190301",
+            "20190308",
+            [raw],
+            [
+                self._config("abc.report", "abc.left", "abc.right"),
+                self._config("abc.left", "abc.cleaned"),
+                self._config("abc.cleaned", "abc.raw"),
+                self._config("abc.right", "abc.cleaned"),
+            ],
+        )
+
+        configs = {config["feature_table_name"].split(".")[-1].rsplit("_", 5)[0]: config for config in executed_configs}
+        assert list(configs)[0] == "abc_cleaned"
+        assert list(configs)[-1] == "abc_report"
+        assert configs["abc_cleaned"]["source_tables"]["source_0"] == raw.fq_table_id
+        assert configs["abc_left"]["source_tables"]["source_0"] == configs["abc_cleaned"]["feature_table_name"]
+        assert configs["abc_report"]["source_tables"]["source_1"] == configs["abc_right"]["feature_table_name"]
+        assert list(result) == ["abc.report"]
+        assert bq_client.query.call_count == 1
+
+    def test_run_pipeline_records_definitions_and_configs_in_the_fingerprint(self, tmp_path, monkeypatch) -> None:
+        helper_file = tmp_path / "fixtures.py"
+        helper_file.write_text("RAW = [{'foo': 'bar'}]")
+        monkeypatch.setattr("bquest.tables.find_source_files", lambda: [str(helper_file)])
+        raw = BQTableDefinitionBuilder("myproject").from_json("abc.raw", [{"foo": "bar"}])
+        fingerprints = []
+        runner = BQConfigPipelineRunner(MagicMock(), lambda *_: fingerprints.append(current_fingerprint()))
+
+        with recording() as fingerprint:
+            runner.run_pipeline(
+                "20190301",
+                "20190308",
+                [raw],
+                [self._config("abc.cleaned", "abc.raw"), self._config("abc.report", "abc.cleaned")],
+            )
+
+        assert fingerprints == [fingerprint, fingerprint]
+        assert "fixture:abc.raw" in fingerprint.inputs
+        assert len([name for name in fingerprint.inputs if name.startswith("config")]) == 2
+        assert os.path.relpath(helper_file) in fingerprint.files
+        assert fingerprint.complete
+
+    def test_run_pipeline_loads_only_columns_read_by_its_configurations(self) -> None:
+        raw = BQTableDefinitionBuilder("myproject").from_json("abc.raw", [{"id": 1, "price": 2, "note": "x"}])
+        executed_configs = []
+        runner = BQConfigPipelineRunner(
+            MagicMock(), lambda config, _: executed_configs.append(config), prune_columns=True
+        )
+        cleaned = BQConfigSubstitutor(
+            {
+                "query": "SELECT id FROM `{raw}`",
+                "source_tables": {"raw": "abc.raw"},
+                "feature_table_name": "abc.cleaned",
+            }
+        )
+        priced = BQConfigSubstitutor(
+            {
+                "query": "SELECT price FROM `{raw}`",
+                "source_tables": {"raw": "abc.raw"},
+                "feature_table_name": "abc.priced",
+            }
+        )
+
+        runner.run_pipeline("20190301", "20190308", [raw], [cleaned, priced])
+
+        selection = raw.select_columns(["id", "price"])
+        assert selection is not raw
+        assert [config["source_tables"]["raw"] for config in executed_configs] == [selection.fq_table_id] * 2
+
+    def test_run_pipeline_runs_configurations_in_a_session(self) -> None:
+        bq_client = MagicMock()
+        bq_client.project = "myproject"
+        bq_client.query.return_value.session_info.session_id = "session-1"
+        raw = BQTableDefinitionBuilder("myproject").from_json("abc.raw", [{"foo": "bar"}])
+        executed_configs = []
+        runner = BQConfigPipelineRunner(
+            bq_client, lambda config, _: executed_configs.append(config), max_workers=2, use_session=True
+        )
+
+        runner.run_pipeline(
+            "20190301",
+            "20190308",
+            [raw],
+            [self._config("abc.left", "abc.raw"), self._config("abc.right", "abc.raw")],
+        )
+
+        assert [config["connection_properties"][0].value for config in executed_configs] == ["session-1"] * 2
+        assert bq_client.load_table_from_file.call_args.kwargs["job_config"].connection_properties
+
+    def test_run_pipeline_rejects_cycles(self) -> None:
+        runner = BQConfigPipelineRunner(MagicMock(), MagicMock())
+
+        with pytest.raises(ValueError):
+            runner.run_pipeline(
+                "20190301",
+                "20190308",
+                [],
+                [self._config("abc.a", "abc.b"), self._config("abc.b", "abc.a")],
+            )
+
+
+class TestSQLRunner:
+    def test_run_passes_query_parameters_without_changing_the_query(self) -> None:
+        bq_client = MagicMock()
+        sql = (
+            "SELECT * FROM `abc.my_table` WHERE day BETWEEN @start_date AND @end_date AND country IN UNNEST(@countries)"
+        )
+
+        SQLRunner(bq_client).run(
+            sql,
+            [],
+            query_parameters={"start_date": datetime.date(2019, 3, 1), "end_date": "20190308", "countries": ["DE"]},
+        )
+
+        executed_sql = bq_client.query.call_args[0][0]
+        job_config = bq_client.query.call_args[1]["job_config"]
+        assert executed_sql == sql
+        assert [p.name for p in job_config.query_parameters] == ["start_date", "end_date", "countries"]
+
+    def test_run_cte_runs_only_the_cte_slice(self) -> None:
+        bq_client = MagicMock()
+        table_def_builder = BQTableDefinitionBuilder("myproject")
+        upstream = table_def_builder.from_json("filtered", [{"foo": "bar"}])
+        sql = """
+            WITH source AS (SELECT * FROM `abc.my_table`),
+            filtered AS (SELECT * FROM source WHERE foo = 'bar'),
+            counted AS (SELECT COUNT(*) AS n FROM filtered)
+            SELECT * FROM counted
+        """
+
+        SQLRunner(bq_client).run_cte(sql, "counted", [], cte_table_definitions={"filtered": upstream})
+
+        executed_sql = bq_client.query.call_args[0][0]
+        assert executed_sql == (
+            f"WITH `filtered` AS (SELECT * FROM `{upstream.fq_table_id}`),\n"  # noqa: S608
+            "`counted` AS (SELECT COUNT(*) AS n FROM filtered)\n"
+            "SELECT * FROM `counted`"
+        )
+
+    def test_run_loads_only_referenced_columns(self) -> None:
+        bq_client = MagicMock()
+        orders = BQTableDefinitionBuilder("myproject").from_json("abc.orders", [{"id": 1, "price": 2, "note": "x"}])
+
+        SQLRunner(bq_client, prune_columns=True).run(
+            "WITH o AS (SELECT * FROM `{orders}`) SELECT id, SUM(price) FROM o GROUP BY id",
+            [orders],
+            substitutions={"orders": orders.fq_table_id},
+        )
+
+        selection = orders.select_columns(["id", "price"])
+        assert selection is not orders
+        assert bq_client.query.call_args[0][0] == (
+            f"WITH o AS (SELECT * FROM `{selection.fq_table_id}`) SELECT id, SUM(price) FROM o GROUP BY id"  # noqa: S608
+        )
+        loaded_rows = bq_client.load_table_from_file.call_args[0][0].getvalue()
+        assert b"note" not in loaded_rows
+
+    def test_run_in_session_reads_temporary_tables(self) -> None:
+        bq_client = MagicMock()
+        bq_client.project = "myproject"
+        bq_client.query.return_value.session_info.session_id = "session-1"
+        orders = BQTableDefinitionBuilder("myproject").from_json("abc.orders", [{"id": 1}])
+
+        with SQLRunner(bq_client, use_session=True) as runner:
+            runner.run("SELECT id FROM `{orders}`", [orders], substitutions={"orders": orders.fq_table_id})
+            executed_sql = bq_client.query.call_args[0][0]
+            job_config = bq_client.query.call_args[1]["job_config"]
+
+        assert executed_sql == f"SELECT id FROM `_SESSION.{orders.table_name}`"  # noqa: S608
+        assert job_config.connection_properties[0].value == "session-1"
+        assert bq_client.query.call_args[0][0] == "CALL BQ.ABORT_SESSION()"
@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+from google.api_core.exceptions import BadRequest, Conflict, Forbidden, NotFound, ServiceUnavailable, TooManyRequests
+from mock import MagicMock, patch
+from pandas_gbq.gbq import GenericGBQException
+
+from bquest.scheduler import TableOperationScheduler, TokenBucket, is_rate_limit_error
+from bquest.tables import BQTableDefinitionBuilder
+
+pytestmark = pytest.mark.unit
+
+
+class TestTokenBucket:
+    @patch("time.sleep")
+    def test_acquire_waits_once_burst_is_used(self, mock_sleep) -> None:
+        bucket = TokenBucket(rate=1.0, capacity=2)
+        bucket.acquire()
+        bucket.acquire()
+        mock_sleep.assert_not_called()
+
+        with patch("time.monotonic", side_effect=[bucket._updated_at, bucket._updated_at + 1.0]):
+            bucket.acquire()
+        assert mock_sleep.call_args[0][0] == pytest.approx(1.0, abs=1e-3)
+
+
+class TestTableOperationScheduler:
+    def test_is_rate_limit_error(self) -> None:
+        assert is_rate_limit_error(TooManyRequests("slow down"))
+        assert is_rate_limit_error(Forbidden("Exceeded rate limits: too many table update operations"))
+        assert is_rate_limit_error(BadRequest("failed", errors=[{"reason": "rateLimitExceeded"}]))
+        assert not is_rate_limit_error(BadRequest("Syntax error"))
+        assert not is_rate_limit_error(NotFound("table"))
+
+    @patch("time.sleep")
+    def test_run_retries_rate_limited_operations(self, mock_sleep) -> None:
+        operation = MagicMock(side_effect=[TooManyRequests("slow down"), Forbidden("rateLimitExceeded"), "done"])
+
+        result = TableOperationScheduler().run("myproject.bquest", operation)
+
+        assert result == "done"
+        assert [c[0][0] for c in operation.call_args_list] == [0, 1, 2]
+        assert mock_sleep.call_count == 2
+
+    @patch("time.sleep")
+    def test_run_raises_after_max_attempts(self, mock_sleep) -> None:
+        operation = MagicMock(side_effect=TooManyRequests("slow down"))
+
+        with pytest.raises(TooManyRequests):
+            TableOperationScheduler(max_attempts=3).run("myproject.bquest", operation)
+
+        assert operation.call_count == 3
+
+    def test_run_raises_other_errors_immediately(self) -> None:
+        operation = MagicMock(side_effect=NotFound("table"))
+
+        with pytest.raises(NotFound):
+            TableOperationScheduler().run("myproject.bquest", operation)
+
+        assert operation.call_count == 1
+
+    @patch("uuid.uuid4")
+    def test_load_job_picks_up_already_created_job(self, mock_uuid_call) -> None:
+        mock_uuid_call.return_value = "1234"
+        table_def = BQTableDefinitionBuilder("myproject").from_json("mytable", [{"foo": "bar"}])
+        bq_client = MagicMock()
+        bq_client.load_table_from_file.side_effect = Conflict("Already Exists")
+
+        table_def.load_to_bq(bq_client)
+
+        assert bq_client.load_table_from_file.call_args[1]["job_id"] == "bquest_load_mytable_1234_0"
+        bq_client.get_job.assert_called_with("bquest_load_mytable_1234_0", location="EU")
+        bq_client.get_job.return_value.result.assert_called()
+
+    @patch("time.sleep")
+    @patch("uuid.uuid4")
+    def test_load_job_retry_after_lost_response_reuses_job_id(self, mock_uuid_call, mock_sleep) -> None:
+        mock_uuid_call.return_value = "1234"
+        table_def = BQTableDefinitionBuilder("myproject").from_json("mytable", [{"foo": "bar"}])
+        bq_client = MagicMock()
+        bq_client.load_table_from_file.side_effect = [ServiceUnavailable("lost"), Conflict("Already Exists")]
+
+        table_def.load_to_bq(bq_client)
+
+        job_ids = [c[1]["job_id"] for c in bq_client.load_table_from_file.call_args_list]
+        assert job_ids == ["bquest_load_mytable_1234_0", "bquest_load_mytable_1234_0"]
+        bq_client.get_job.assert_called_with("bquest_load_mytable_1234_0", location="EU")
+
+    @patch("time.sleep")
+    @patch("uuid.uuid4")
+    def test_load_job_retry_after_failed_job_starts_new_job(self, mock_uuid_call, mock_sleep) -> None:
+        mock_uuid_call.return_value = "1234"
+        table_def = BQTableDefinitionBuilder("myproject").from_json("mytable", [{"foo": "bar"}])
+        bq_client = MagicMock()
+        failed_job = MagicMock(**{"result.side_effect": TooManyRequests("slow down")})
+        bq_client.load_table_from_file.side_effect = [failed_job, MagicMock()]
+
+        table_def.load_to_bq(bq_client)
+
+        job_ids = [c[1]["job_id"] for c in bq_client.load_table_from_file.call_args_list]
+        assert job_ids == ["bquest_load_mytable_1234_0", "bquest_load_mytable_1234_1"]
+
+    @patch("time.sleep")
+    @patch("pandas_gbq.to_gbq")
+    def test_dataframe_upload_retries_rate_limited_pandas_gbq_errors(self, mock_to_gbq_call, mock_sleep) -> None:
+        table_def = BQTableDefinitionBuilder("myproject").from_df("mytable", pd.DataFrame({"foo": ["bar"]}))
+        error = GenericGBQException("Reason: 429 slow down")
+        error.__cause__ = TooManyRequests("slow down")
+        mock_to_gbq_call.side_effect = [error, None]
+
+        table_def.load_to_bq(MagicMock())
+
+        assert mock_to_gbq_call.call_count == 2
@@ -0,0 +1,67 @@
+import pytest
+from google.cloud import bigquery as bq
+from mock import MagicMock
+
+from bquest.session import BQSession
+from bquest.tables import BQTableDefinitionBuilder
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture()
+def bq_client() -> MagicMock:
+    bq_client = MagicMock()
+    bq_client.project = "myproject"
+    bq_client.query.return_value.session_info.session_id = "session-1"
+    return bq_client
+
+
+def test_session_is_created_once_on_first_use(bq_client: MagicMock) -> None:
+    session = BQSession(bq_client)
+
+    assert session.session_id == "session-1"
+    assert session.session_id == "session-1"
+    assert bq_client.query.call_count == 1
+    assert bq_client.query.call_args[1]["job_config"].create_session
+    job_config = session.apply(bq.QueryJobConfig())
+    assert job_config.connection_properties[0].value == "session-1"
+
+
+def test_close_aborts_only_opened_sessions(bq_client: MagicMock) -> None:
+    with BQSession(bq_client):
+        pass
+    bq_client.query.assert_not_called()
+
+    with BQSession(bq_client) as session:
+        _ = session.session_id
+    assert bq_client.query.call_args[0][0] == "CALL BQ.ABORT_SESSION()"
+
+
+def test_load_creates_temporary_tables_once_per_session(bq_client: MagicMock) -> None:
+    builder = BQTableDefinitionBuilder("myproject")
+    orders = builder.from_json("abc.orders", [{"id": 1}], [bq.SchemaField("id", "INTEGER")])
+    clone = builder.clone(orders, ["DELETE FROM {table} WHERE id = 1"])
+    session = BQSession(bq_client)
+
+    table = session.load(clone)
+
+    assert session.load(clone) is table
+    assert table.fq_test_table_id == f"_SESSION.{clone.table_name}"
+    load_args = bq_client.load_table_from_file.call_args
+    assert load_args[0][1].dataset_id == "_SESSION"
+    assert load_args[1]["job_config"].connection_properties[0].value == "session-1"
+    script = bq_client.query.call_args[0][0]
+    assert script.startswith(f"CREATE OR REPLACE TEMP TABLE `{clone.table_name}` AS SELECT * FROM `_SESSION.")  # noqa: S608
+    assert script.endswith(f"DELETE FROM `{clone.table_name}` WHERE id = 1")  # noqa: S608
+    bq_client.update_table.assert_not_called()
+
+
+def test_reference_tables_rewrites_table_ids(bq_client: MagicMock) -> None:
+    orders = BQTableDefinitionBuilder("my-project").from_json("abc.orders", [])
+    sql = f"SELECT * FROM `{orders.fq_table_id}` JOIN bquest.{orders.table_name} USING (id)"  # noqa: S608
+
+    rewritten = BQSession(bq_client).reference_tables(sql, [orders])
+
+    assert rewritten == (
+        f"SELECT * FROM `_SESSION.{orders.table_name}` JOIN _SESSION.{orders.table_name} USING (id)"  # noqa: S608
+    )
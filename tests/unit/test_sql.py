@@ -0,0 +1,91 @@
+import pytest
+
+from bquest.sql import extract_cte, find_column_references, parse_ctes, tokenize
+
+pytestmark = pytest.mark.unit
+
+QUERY = """
+-- daily orders (with a comment mentioning `orders`)
+WITH orders AS (
+    SELECT * FROM `{orders_table}` WHERE status != ')'
+),
+customers AS (SELECT customer_id, name FROM `{customers_table}`),
+`order_totals` AS (
+    SELECT customer_id, SUM(price) AS total
+    FROM orders
+    GROUP BY customer_id
+),
+report AS (
+    SELECT c.name, t.total FROM order_totals AS t JOIN Customers AS c USING (customer_id)
+)
+SELECT * FROM report
+"""
+
+
+def test_tokenize_skips_comments_and_keeps_strings() -> None:
+    tokens = list(tokenize("SELECT 'a -- b' /* c */ FROM `x.y` # d"))
+    assert [t.text for t in tokens] == ["SELECT", "'a -- b'", "FROM", "`x.y`"]
+
+
+def test_parse_ctes() -> None:
+    ctes, final_statement, recursive = parse_ctes(QUERY)
+
+    assert [cte.name for cte in ctes] == ["orders", "customers", "order_totals", "report"]
+    assert ctes[0].body.strip() == "SELECT * FROM `{orders_table}` WHERE status != ')'"
+    assert ctes[2].dependencies == {"orders"}
+    assert ctes[3].dependencies == {"order_totals", "customers"}
+    assert final_statement.strip() == "SELECT * FROM report"
+    assert not recursive
+
+
+def test_extract_cte_keeps_only_required_ctes() -> None:
+    sql = extract_cte(QUERY, "order_totals")
+
+    assert sql.startswith("WITH `orders` AS (")
+    assert "`customers`" not in sql
+    assert "`report`" not in sql
+    assert sql.endswith("\nSELECT * FROM `order_totals`")
+
+
+def test_extract_cte_replaces_upstream_ctes_with_tables() -> None:
+    sql = extract_cte(QUERY, "report", {"order_totals": "project.bquest.order_totals_1234"})
+
+    assert "{orders_table}" not in sql
+    assert "`order_totals` AS (SELECT * FROM `project.bquest.order_totals_1234`)" in sql
+    assert "`customers` AS (SELECT customer_id, name FROM `{customers_table}`)" in sql
+
+
+def test_extract_cte_rejects_unknown_ctes() -> None:
+    with pytest.raises(ValueError):
+        extract_cte(QUERY, "unknown")
+    with pytest.raises(ValueError):
+        extract_cte("SELECT 1", "orders")
+
+
+def test_find_column_references_resolves_stars_through_ctes() -> None:
+    references = find_column_references(QUERY, ["{orders_table}", "{customers_table}", "{unused_table}"])
+
+    assert set(references) == {"{orders_table}", "{customers_table}"}
+    assert {"customer_id", "price", "status", "name"} <= references["{orders_table}"]
+    assert "discount" not in references["{orders_table}"]
+
+
+def test_find_column_references_reads_all_columns_of_tables_selected_by_stars() -> None:
+    sql = "WITH o AS (SELECT * FROM `p.d.orders_1` WHERE price * 2 > 3) SELECT o.* FROM o"
+
+    assert find_column_references(sql, ["orders_1"]) == {"orders_1": None}
+    assert find_column_references("SELECT COUNT(*) FROM d.orders_1", ["orders_1"])["orders_1"] is not None
+
+
+def test_find_column_references_reads_all_columns_of_tables_used_as_row_values() -> None:
+    assert find_column_references("SELECT TO_JSON_STRING(o) FROM `p.d.orders_1` o", ["orders_1"]) == {"orders_1": None}
+    assert find_column_references("SELECT o FROM p.d.orders_1 AS o", ["orders_1"]) == {"orders_1": None}
+    assert find_column_references("SELECT orders_1 FROM p.d.orders_1", ["orders_1"]) == {"orders_1": None}
+    sql = "WITH x AS (SELECT * FROM p.d.orders_1) SELECT TO_JSON_STRING(y) FROM x AS y"
+    assert find_column_references(sql, ["orders_1"]) == {"orders_1": None}
+
+    references = find_column_references(
+        "SELECT o.id FROM p.d.orders_1 o, p.d.customers_1 c", ["orders_1", "customers_1"]
+    )
+    assert references["orders_1"] is not None
+    assert references["customers_1"] is not None
@@ -0,0 +1,66 @@
+import pyarrow as pa
+import pytest
+from google.cloud import bigquery as bq
+
+from bquest.synthetic import ColumnDistribution, generate_batches
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def schema():
+    return [
+        bq.SchemaField("customer_id", "INTEGER"),
+        bq.SchemaField("score", "FLOAT"),
+        bq.SchemaField("category", "STRING"),
+        bq.SchemaField("order_date", "DATE"),
+        bq.SchemaField("created_at", "TIMESTAMP"),
+        bq.SchemaField("is_active", "BOOLEAN"),
+    ]
+
+
+def test_generate_batches_in_chunks(schema) -> None:
+    batches = list(generate_batches(schema, 25, chunk_size=10, seed=1))
+    assert [batch.num_rows for batch in batches] == [10, 10, 5]
+    assert batches[0].schema.names == [field.name for field in schema]
+    assert batches[0].schema.field("order_date").type == pa.date32()
+    assert batches[0].schema.field("created_at").type == pa.timestamp("us", "UTC")
+
+
+def test_generate_batches_is_reproducible(schema) -> None:
+    first = pa.Table.from_batches(generate_batches(schema, 100, seed=42))
+    second = pa.Table.from_batches(generate_batches(schema, 100, seed=42))
+    assert first.equals(second)
+
+
+def test_generate_batches_respects_distributions(schema) -> None:
+    table = pa.Table.from_batches(
+        generate_batches(
+            schema,
+            1000,
+            distributions={
+                "customer_id": ColumnDistribution(low=10, high=20),
+                "category": ColumnDistribution(values=["a", "b"], weights=[1, 0]),
+                "order_date": ColumnDistribution(cardinality=3),
+                "score": ColumnDistribution(null_fraction=1.0),
+            },
+            seed=1,
+        )
+    )
+    customer_ids = table.column("customer_id").to_pylist()
+    assert min(customer_ids) >= 10
+    assert max(customer_ids) < 20
+    assert set(table.column("category").to_pylist()) == {"a"}
+    assert len(set(table.column("order_date").to_pylist())) <= 3
+    assert table.column("score").null_count == 1000
+
+
+def test_generate_batches_rejects_unknown_columns(schema) -> None:
+    with pytest.raises(ValueError):
+        list(generate_batches(schema, 10, distributions={"unknown": ColumnDistribution()}))
+
+
+def test_generate_batches_rejects_nested_columns() -> None:
+    schema = [bq.SchemaField("movie", "RECORD", fields=[bq.SchemaField("part", "STRING")])]
+    with pytest.raises(ValueError):
+        list(generate_batches(schema, 10))
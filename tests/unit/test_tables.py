@@ -1,10 +1,24 @@
-from typing import Any
+import datetime
+from typing import Any, List
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
+from google.api_core.exceptions import BadRequest, NotFound
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import bigquery as bq
 from mock import MagicMock, patch
 
-from bquest.tables import BQTable, BQTableDefinition, BQTableDefinitionBuilder
+from bquest.tables import (
+    RUN_ID,
+    BQLazyResult,
+    BQTable,
+    BQTableDefinition,
+    BQTableDefinitionBuilder,
+    convert_result,
+    iter_row_batches,
+)
 
 pytestmark = pytest.mark.unit
 
@@ -55,6 +69,90 @@ class TestBigQueryTable:
         assert df["foo"].iloc[0] == "bar"
         bq_client.query.assert_called_with("SELECT * FROM `test_table_id`")
 
+    def test_get_table_as_dataframe_does_not_touch_table_metadata(self) -> None:
+        bq_client = MagicMock()
+        bq_table = BQTable("original_table_id", "test_table_id", bq_client)
+        bq_table.to_df()
+        bq_client.get_table.assert_not_called()
+        bq_client.update_table.assert_not_called()
+
+    def test_get_table_as_dataframe_removes_required_partition_filter_on_demand(self) -> None:
+        bq_client = MagicMock()
+        df = MagicMock()
+        bq_client.query.side_effect = [
+            BadRequest("Cannot query over table without a filter that can be used for partition elimination"),
+            MagicMock(**{"to_dataframe.return_value": df}),
+        ]
+        bq_client.get_table.return_value.to_api_repr.return_value = {"requirePartitionFilter": True}
+        bq_table = BQTable("original_table_id", "test_table_id", bq_client)
+        assert bq_table.to_df() == df
+        bq_client.update_table.assert_called_once()
+
+    def test_iter_batches_streams_table_through_storage_api(self) -> None:
+        bq_client = MagicMock()
+        batches = [MagicMock(), MagicMock()]
+        rows = bq_client.list_rows.return_value
+        rows.to_dataframe_iterable.return_value = iter(batches)
+        bq_table = BQTable("original_table_id", "test_table_id", bq_client)
+        assert list(bq_table.iter_batches(max_stream_count=4)) == batches
+        bq_client.list_rows.assert_called_with("test_table_id")
+        rows.to_dataframe_iterable.assert_called_with(
+            bqstorage_client=rows.client._ensure_bqstorage_client.return_value, max_stream_count=4
+        )
+
+    def test_iter_batches_reads_with_the_credentials_of_the_bigquery_client(self) -> None:
+        credentials = AnonymousCredentials()
+        rows = MagicMock(client=bq.Client(project="myproject", credentials=credentials))
+        with patch("google.cloud.bigquery_storage.BigQueryReadClient") as read_client:
+            list(iter_row_batches(rows, as_arrow=True))
+        assert read_client.call_args.kwargs["credentials"] is credentials
+        rows.to_arrow_iterable.assert_called_with(bqstorage_client=read_client.return_value, max_stream_count=None)
+
+    def test_iter_batches_uses_given_storage_client(self) -> None:
+        bq_client = MagicMock()
+        bqstorage_client = MagicMock()
+        bq_table = BQTable("original_table_id", "test_table_id", bq_client)
+        list(bq_table.iter_batches(as_arrow=True, bqstorage_client=bqstorage_client))
+        bq_client.list_rows.return_value.to_arrow_iterable.assert_called_with(
+            bqstorage_client=bqstorage_client, max_stream_count=None
+        )
+
+    def test_lazy_result_fetches_only_accessed_columns(self) -> None:
+        bq_client = MagicMock()
+        bq_client.get_table.return_value.schema = [bq.SchemaField("foo", "STRING"), bq.SchemaField("bar", "INTEGER")]
+        bq_client.list_rows.return_value.to_dataframe.return_value = pd.DataFrame({"bar": [1, 2]})
+        result = BQTable("original_table_id", "project.dataset.test_table_id", bq_client).lazy()
+
+        assert result.columns == ["foo", "bar"]
+        assert result["bar"].tolist() == [1, 2]
+        bq_client.query.assert_not_called()
+        assert bq_client.list_rows.call_args[1]["selected_fields"] == [bq.SchemaField("bar", "INTEGER")]
+        with pytest.raises(KeyError):
+            result.to_df(["unknown"])
+
+    def test_lazy_result_counts_rows_from_metadata(self) -> None:
+        bq_client = MagicMock()
+        bq_client.get_table.return_value.num_rows = 42
+        result = BQLazyResult("project.dataset.test_table_id", bq_client)
+
+        assert len(result) == 42
+        bq_client.query.assert_not_called()
+        bq_client.list_rows.assert_not_called()
+
+    def test_lazy_result_pushes_filters_and_aggregates_down(self) -> None:
+        bq_client = MagicMock()
+        bq_client.query.return_value.result.return_value.__iter__.return_value = iter([(7,)])
+        result = BQLazyResult("project.dataset.test_table_id", bq_client).filter("price > 0").filter("id < 10")
+
+        assert result.num_rows() == 7
+        bq_client.query.assert_called_with(
+            "SELECT COUNT(*) FROM `project.dataset.test_table_id` WHERE (price > 0) AND (id < 10)"
+        )
+        result.to_df(["id"])
+        bq_client.query.assert_called_with(
+            "SELECT `id` FROM `project.dataset.test_table_id` WHERE (price > 0) AND (id < 10)"
+        )
+
     def test_delete_table(self) -> None:
         bq_client = MagicMock()
         bq_table = BQTable("original_table_id", "project.dataset.test_table_id", bq_client=bq_client)
@@ -81,6 +179,353 @@ class TestBigQueryTable:
             if_exists="replace",
         )
 
+    def test_load_to_bq_creates_partitioned_and_clustered_table_from_json(self, bq_table_def_builder) -> None:
+        table_def = bq_table_def_builder.from_json(
+            "mytable",
+            [{"foo": "bar", "day": "2019-03-01"}],
+            time_partitioning=bq.TimePartitioning(field="day"),
+            clustering_fields=["foo"],
+        )
+        bq_client = MagicMock()
+        table_def.load_to_bq(bq_client=bq_client)
+        load_config = bq_client.load_table_from_file.call_args_list[0][1]["job_config"]
+        assert load_config.time_partitioning.field == "day"
+        assert load_config.clustering_fields == ["foo"]
+
+    @patch("pandas_gbq.to_gbq")
+    def test_load_to_bq_creates_ingestion_time_partitioned_table_from_df(
+        self, mock_to_gbq_call: Any, bq_table_def_builder
+    ) -> None:
+        df = pd.DataFrame({"foo": ["bar"]})
+        table_def = bq_table_def_builder.from_df("mytable", df, time_partitioning=bq.TimePartitioning())
+        bq_client = MagicMock()
+        table_def.load_to_bq(bq_client=bq_client)
+        mock_to_gbq_call.assert_not_called()
+        load_config = bq_client.load_table_from_dataframe.call_args_list[0][1]["job_config"]
+        assert load_config.time_partitioning.field is None
+        assert load_config.time_partitioning.type_ == bq.TimePartitioningType.DAY
+
+    def test_load_to_bq_writes_generated_rows_as_parquet(self, bq_table_def_builder) -> None:
+        schema = [bq.SchemaField("foo", "STRING"), bq.SchemaField("weight", "INTEGER")]
+        table_def = bq_table_def_builder.from_generator("mytable", schema, 25, chunk_size=10, seed=1)
+        bq_client = MagicMock()
+
+        def read_parquet(file, *args, **kwargs):
+            file.seek(0)
+            assert pq.read_table(file).num_rows == 25
+            return MagicMock()
+
+        bq_client.load_table_from_file.side_effect = read_parquet
+        table_def.load_to_bq(bq_client=bq_client)
+        load_config = bq_client.load_table_from_file.call_args_list[0][1]["job_config"]
+        assert load_config.source_format == bq.SourceFormat.PARQUET
+        assert load_config.schema == schema
+
+    def test_load_to_bq_creates_empty_table_without_generated_rows(self, bq_table_def_builder) -> None:
+        schema = [bq.SchemaField("foo", "STRING"), bq.SchemaField("weight", "INTEGER")]
+        table_def = bq_table_def_builder.from_generator("mytable", schema, 0)
+        bq_client = MagicMock()
+        table_def.load_to_bq(bq_client=bq_client)
+        bq_client.load_table_from_file.assert_not_called()
+        table = bq_client.create_table.call_args[0][0]
+        assert table.schema == schema
+        assert table.table_id == table_def.table_name
+
+    def test_load_to_bq_converts_json_rows_with_schema_to_parquet(self, bq_table_def_builder) -> None:
+        schema = [
+            bq.SchemaField("id", "INTEGER", mode="REQUIRED"),
+            bq.SchemaField("created_at", "TIMESTAMP"),
+            bq.SchemaField(
+                "items",
+                "RECORD",
+                mode="REPEATED",
+                fields=[bq.SchemaField("sku", "STRING"), bq.SchemaField("delivery_date", "DATE")],
+            ),
+        ]
+        rows = [
+            {"id": 1, "created_at": "2019-03-01 12:00:00", "items": [{"sku": "a", "delivery_date": "2019-03-02"}]},
+            {"id": 2, "created_at": "2019-03-01T13:00:00+01:00", "items": []},
+        ]
+        table_def = bq_table_def_builder.from_json("abc.orders", rows, schema)
+        bq_client = MagicMock()
+
+        table_def.load_to_bq(bq_client=bq_client)
+
+        source = bq_client.load_table_from_file.call_args[0][0]
+        load_config = bq_client.load_table_from_file.call_args[1]["job_config"]
+        source.seek(0)
+        table = pq.read_table(source)
+        assert load_config.source_format == bq.SourceFormat.PARQUET
+        assert load_config.parquet_options.enable_list_inference
+        assert table.column("created_at").to_pylist() == [
+            datetime.datetime(2019, 3, 1, 12, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2019, 3, 1, 12, tzinfo=datetime.timezone.utc),
+        ]
+        assert table.column("items").to_pylist()[0] == [{"sku": "a", "delivery_date": datetime.date(2019, 3, 2)}]
+
+    def test_load_to_bq_converts_bytes_and_time_like_json_loads(self, bq_table_def_builder) -> None:
+        schema = [
+            bq.SchemaField("payload", "BYTES"),
+            bq.SchemaField("opens_at", "TIME"),
+            bq.SchemaField("slots", "RECORD", mode="REPEATED", fields=[bq.SchemaField("starts_at", "TIME")]),
+        ]
+        rows = [
+            {"payload": "YWJj", "opens_at": "08:30:00", "slots": [{"starts_at": "09:15:30.250000"}]},
+            {"payload": None, "opens_at": None, "slots": []},
+        ]
+        table_def = bq_table_def_builder.from_json("abc.shops", rows, schema)
+        bq_client = MagicMock()
+
+        table_def.load_to_bq(bq_client=bq_client)
+
+        source = bq_client.load_table_from_file.call_args[0][0]
+        assert bq_client.load_table_from_file.call_args[1]["job_config"].source_format == bq.SourceFormat.PARQUET
+        source.seek(0)
+        assert pq.read_table(source).to_pylist() == [
+            {
+                "payload": b"abc",
+                "opens_at": datetime.time(8, 30),
+                "slots": [{"starts_at": datetime.time(9, 15, 30, 250000)}],
+            },
+            {"payload": None, "opens_at": None, "slots": []},
+        ]
+
+    def test_load_to_bq_falls_back_to_json_for_keys_outside_schema(self, bq_table_def_builder) -> None:
+        schema = [
+            bq.SchemaField("id", "INTEGER"),
+            bq.SchemaField("items", "RECORD", mode="REPEATED", fields=[bq.SchemaField("sku", "STRING")]),
+        ]
+        bq_client = MagicMock()
+
+        for rows in ([{"id": 1, "price": 10}], [{"id": 1, "items": [{"sku": "a", "price": 10}]}]):
+            bq_table_def_builder.from_json("abc.orders", rows, schema).load_to_bq(bq_client=bq_client)
+
+            load_config = bq_client.load_table_from_file.call_args[1]["job_config"]
+            assert load_config.source_format == bq.SourceFormat.NEWLINE_DELIMITED_JSON
+            with pytest.raises(pa.ArrowInvalid, match="not in the schema"):
+                bq_table_def_builder.from_json("abc.orders", rows, schema, load_format="parquet").load_to_bq(bq_client)
+
+    def test_load_to_bq_falls_back_to_json_for_values_parquet_cannot_take(self, bq_table_def_builder) -> None:
+        schema = [bq.SchemaField("created_at", "TIMESTAMP")]
+        table_def = bq_table_def_builder.from_json("abc.orders", [{"created_at": "2019-03-01 12:00:00 UTC"}], schema)
+        bq_client = MagicMock()
+
+        table_def.load_to_bq(bq_client=bq_client)
+
+        load_config = bq_client.load_table_from_file.call_args[1]["job_config"]
+        assert load_config.source_format == bq.SourceFormat.NEWLINE_DELIMITED_JSON
+        with pytest.raises(ValueError):
+            bq_table_def_builder.from_json(
+                "abc.orders", [], [bq.SchemaField("price", "NUMERIC")], load_format="parquet"
+            )
+
+    @patch("bquest.tables.write_arrow_table")
+    @patch("bquest.tables.get_write_client")
+    def test_write_api_creates_table_and_writes_json_rows(
+        self, mock_get_write_client: Any, mock_write_arrow_table: Any
+    ) -> None:
+        schema = [bq.SchemaField("id", "INTEGER"), bq.SchemaField("day", "DATE")]
+        builder = BQTableDefinitionBuilder("myproject", ingestion="write_api")
+        table_def = builder.from_json("abc.orders", [{"id": 1, "day": "2019-03-01"}], schema, clustering_fields=["id"])
+        bq_client = MagicMock()
+
+        table_def.load_to_bq(bq_client=bq_client)
+
+        created_table = bq_client.create_table.call_args[0][0]
+        assert created_table.schema == schema
+        assert created_table.clustering_fields == ["id"]
+        assert created_table.labels == builder.labels
+        assert created_table.expires is not None
+        _, fq_table_id, rows = mock_write_arrow_table.call_args[0]
+        assert fq_table_id == table_def.fq_table_id
+        assert rows.to_pylist() == [{"id": 1, "day": datetime.date(2019, 3, 1)}]
+        bq_client.load_table_from_file.assert_not_called()
+        bq_client.update_table.assert_not_called()
+
+    @patch("bquest.tables.write_arrow_table")
+    @patch("bquest.tables.get_write_client")
+    def test_write_api_uses_given_write_client(self, mock_get_write_client: Any, mock_write_arrow_table: Any) -> None:
+        write_client = MagicMock()
+        builder = BQTableDefinitionBuilder("myproject", ingestion="write_api", write_client=write_client)
+
+        builder.from_df("abc.orders", pd.DataFrame({"id": [1]})).load_to_bq(MagicMock())
+
+        assert mock_write_arrow_table.call_args[0][0] is write_client
+        mock_get_write_client.assert_not_called()
+
+    @patch("bquest.tables.write_arrow_table")
+    @patch("bquest.tables.get_write_client")
+    def test_write_api_writes_df_and_falls_back_to_load_job(
+        self, mock_get_write_client: Any, mock_write_arrow_table: Any
+    ) -> None:
+        builder = BQTableDefinitionBuilder("myproject", ingestion="write_api")
+        bq_client = MagicMock()
+
+        builder.from_df("abc.orders", pd.DataFrame({"id": [1, 2], "name": ["a", "b"]})).load_to_bq(bq_client)
+        builder.from_json("abc.orders", [{"id": 1}]).load_to_bq(bq_client)
+
+        assert [field.field_type for field in bq_client.create_table.call_args[0][0].schema] == ["INTEGER", "STRING"]
+        assert mock_write_arrow_table.call_args[0][2].num_rows == 2
+        bq_client.load_table_from_file.assert_called_once()
+        with pytest.raises(ValueError):
+            BQTableDefinitionBuilder("myproject", ingestion="streaming")
+
+    def test_builder_spreads_tables_across_dataset_pool(self) -> None:
+        builder = BQTableDefinitionBuilder("myproject", datasets=["bquest_0", "bquest_1", "otherproject.bquest_2"])
+        table_defs = [builder.from_json(f"abc.mytable_{i}", []) for i in range(30)]
+
+        assert builder.datasets == ["myproject.bquest_0", "myproject.bquest_1", "otherproject.bquest_2"]
+        assert {(t.project, t.dataset) for t in table_defs} == {
+            ("myproject", "bquest_0"),
+            ("myproject", "bquest_1"),
+            ("otherproject", "bquest_2"),
+        }
+        assert len({builder.create_empty("result").dataset for _ in range(30)}) > 1
+        assert len({builder.clone(table_defs[0]).dataset for _ in range(30)}) > 1
+
+    def test_builder_places_tables_consistently(self) -> None:
+        def place(datasets: List[str]) -> List[str]:
+            builder = BQTableDefinitionBuilder("myproject", datasets=datasets)
+            return [builder.create_empty("result").dataset for _ in range(30)]
+
+        datasets = place(["bquest_0", "bquest_1", "bquest_2"])
+        without_last = place(["bquest_0", "bquest_1"])
+
+        assert place(["bquest_0", "bquest_1", "bquest_2"]) == datasets
+        assert all(moved == kept for moved, kept in zip(without_last, datasets, strict=True) if kept != "bquest_2")
+
+    def test_builder_places_tables_in_least_loaded_dataset(self) -> None:
+        builder = BQTableDefinitionBuilder("myproject", datasets=["bquest_0", "bquest_1"], placement="least_loaded")
+        datasets = [builder.create_empty("abc.mytable").dataset for _ in range(4)]
+
+        assert sorted(datasets) == ["bquest_0", "bquest_0", "bquest_1", "bquest_1"]
+
+    @patch("uuid.uuid4")
+    def test_clones_load_base_table_once(self, mock_uuid_call: Any) -> None:
+        mock_uuid_call.side_effect = ["base", "a", "b"]
+        bq_table_def_builder = BQTableDefinitionBuilder("myproject", expiration=None, session="s1")
+        base_def = bq_table_def_builder.from_json("abc.orders", [{"id": 1, "price": 10}])
+        clone_a = bq_table_def_builder.clone(base_def, dml=["UPDATE {table} SET price = 0 WHERE id = 1"])
+        clone_b = bq_table_def_builder.clone(base_def)
+        bq_client = MagicMock()
+
+        table_a = clone_a.load_to_bq(bq_client)
+        clone_b.load_to_bq(bq_client)
+
+        assert bq_client.load_table_from_file.call_count == 1
+        assert table_a.original_table_id == "abc.orders"
+        script = bq_client.query.call_args_list[0][0][0]
+        assert script == (
+            "CREATE OR REPLACE TABLE `myproject.bquest.abc_orders_a` CLONE `myproject.bquest.abc_orders_base` "
+            f'OPTIONS(labels = [("bquest_run", "{RUN_ID}"), ("bquest_session", "s1")]);\n'
+            "UPDATE `myproject.bquest.abc_orders_a` SET price = 0 WHERE id = 1"
+        )
+        assert bq_client.query.call_args_list[0][1]["job_id"] == "bquest_clone_abc_orders_a_0"
+
+    def test_load_to_bq_labels_table_and_sets_expiration(self) -> None:
+        builder = BQTableDefinitionBuilder("myproject", labels={"team": "data"}, session="Nightly #7")
+        table_def = builder.from_json("abc.mytable", [{"foo": "bar"}])
+        bq_client = MagicMock()
+
+        before = datetime.datetime.now(datetime.timezone.utc)
+        # expirations are stored in milliseconds
+        before = before.replace(microsecond=before.microsecond // 1000 * 1000)
+        table_def.load_to_bq(bq_client)
+
+        table, fields = bq_client.update_table.call_args[0]
+        assert fields == ["expires", "labels"]
+        assert table.labels == {"bquest_run": RUN_ID, "bquest_session": "nightly__7", "team": "data"}
+        assert table.expires - before >= datetime.timedelta(days=1)
+
+    def test_create_empty_labels_table_created_by_query(self) -> None:
+        builder = BQTableDefinitionBuilder("myproject", session="s1")
+        table_def = builder.create_empty("result")
+        bq_client = MagicMock()
+
+        table_def.load_to_bq(bq_client)
+        bq_client.update_table.assert_not_called()
+        table_def.label_created_table(bq_client)
+
+        table, fields = bq_client.update_table.call_args[0]
+        assert fields == ["expires", "labels"]
+        assert table.labels == builder.labels
+
+        bq_client.update_table.side_effect = NotFound("result")
+        table_def.label_created_table(bq_client)
+
+    def test_clone_sets_expiration_in_clone_statement(self) -> None:
+        builder = BQTableDefinitionBuilder("myproject", expiration=datetime.timedelta(hours=2))
+        bq_client = MagicMock()
+        builder.clone(builder.from_json("abc.orders", [{"id": 1}])).load_to_bq(bq_client)
+        assert "INTERVAL 7200 SECOND" in bq_client.query.call_args[0][0]
+
+    @patch("uuid.uuid4")
+    def test_table_sample_is_created_server_side(self, mock_uuid_call: Any) -> None:
+        mock_uuid_call.return_value = 1234
+        builder = BQTableDefinitionBuilder("myproject", expiration=None, labels={"team": "x"})
+        bq_client = MagicMock()
+
+        builder.from_table_sample(
+            "sales.orders",
+            "prod.sales.orders",
+            percent=10,
+            where="order_date = '2019-03-01'",
+            key="customer_id",
+            fraction=0.05,
+            masks={"email": "TO_HEX(SHA256(email))"},
+            limit=1000,
+        ).load_to_bq(bq_client)
+
+        sql = bq_client.query.call_args[0][0]
+        assert sql.startswith("CREATE OR REPLACE TABLE `myproject.bquest.sales_orders_1234` OPTIONS(labels = [")
+        assert sql.endswith(
+            "SELECT * REPLACE (TO_HEX(SHA256(email)) AS `email`) FROM `prod.sales.orders` TABLESAMPLE SYSTEM "
+            "(10 PERCENT) WHERE (order_date = '2019-03-01') AND "
+            "MOD(ABS(FARM_FINGERPRINT(CAST(customer_id AS STRING))), 1000000) < 50000 LIMIT 1000"
+        )
+        bq_client.load_table_from_file.assert_not_called()
+
+    def test_table_sample_selects_columns_and_validates_arguments(self) -> None:
+        builder = BQTableDefinitionBuilder("myproject")
+        bq_client = MagicMock()
+
+        builder.from_table_sample("orders", columns=["id", "email"], masks={"email": "NULL"}).load_to_bq(bq_client)
+
+        assert "SELECT `id`, NULL AS `email` FROM `orders`" in bq_client.query.call_args[0][0]
+        with pytest.raises(ValueError):
+            builder.from_table_sample("orders", key="id")
+        with pytest.raises(ValueError):
+            builder.from_table_sample("orders", percent=0)
+        with pytest.raises(ValueError):
+            builder.from_table_sample("orders", columns=["id"], masks={"email": "NULL"})
+
+    def test_select_columns_keeps_clustering_columns_and_is_created_once(self, bq_table_def_builder) -> None:
+        schema = [bq.SchemaField("id", "INTEGER"), bq.SchemaField("name", "STRING"), bq.SchemaField("day", "DATE")]
+        rows = [{"id": 1, "name": "a", "day": "2019-03-01"}]
+        table_def = bq_table_def_builder.from_json("abc.orders", rows, schema, clustering_fields=["day"])
+        df_def = bq_table_def_builder.from_df("abc.orders", pd.DataFrame(rows))
+
+        selection = table_def.select_columns(["ID", "unknown"])
+
+        assert selection.columns == ["id", "day"]
+        assert selection.original_table_id == "abc.orders"
+        assert selection._rows == [{"id": 1, "day": "2019-03-01"}]
+        assert table_def.select_columns(["id"]) is selection
+        assert table_def.select_columns(["id", "name"]) is table_def
+        assert df_def.select_columns(["name"]).columns == ["name"]
+        assert bq_table_def_builder.create_empty("abc.orders").select_columns(["id"]).columns is None
+
     def test_table_definition_name(self) -> None:
         table_def = BQTableDefinition("original_table_name", "abc-project", "dataset", "EU")
         assert table_def.fq_table_id == f"abc-project.dataset.{table_def.table_name}"
+
+    def test_convert_result_formats(self) -> None:
+        result = MagicMock()
+        result.to_arrow.return_value = pa.table({"country": ["DE", "DE", "FR"], "value": [1, 2, 3]})
+
+        assert convert_result(result) is result.to_dataframe.return_value
+        assert convert_result(result, "arrow").num_rows == 3
+        assert isinstance(convert_result(result, "pandas_arrow")["value"].dtype, pd.ArrowDtype)
+        assert isinstance(convert_result(result, "pandas_categorical")["country"].dtype, pd.CategoricalDtype)
+        with pytest.raises(ValueError):
+            convert_result(result, "csv")
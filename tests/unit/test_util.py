@@ -1,6 +1,12 @@
+import subprocess
+import sys
+
 import pytest
 
-from bquest.util import is_sql
+from bquest.util import is_sql, lazy_import
+
+HEAVY_MODULES = ("numpy", "pandas", "pandas_gbq", "pyarrow", "google.cloud.bigquery", "sqlvalidator")
+IMPORT_TIME_BUDGET_MICROSECONDS = 500_000
 
 pytestmark = pytest.mark.unit
 
@@ -44,3 +50,29 @@ def test_is_sql_positives():
           t1.order_date
     """
     assert is_sql(super_complex_query)
+
+
+def test_lazy_import_imports_on_first_attribute_access():
+    """Test lazy_import defers the import until an attribute is accessed"""
+    json = lazy_import("json")
+    assert json.loads("[1]") == [1]
+    with pytest.raises(ModuleNotFoundError):
+        _ = lazy_import("bquest_missing_module").anything
+
+
+def test_import_time_budget():
+    """Test importing bquest neither imports heavy dependencies nor exceeds the startup budget"""
+    modules = ["bquest.cli", "bquest.dataframe", "bquest.performance", "bquest.runner", "bquest.tables", "bquest.util"]
+    check = f"import sys, {', '.join(modules)}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(  # noqa: S603, runs the current interpreter
+        [sys.executable, "-X", "importtime", "-c", check], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ""
+    # lines look like "import time: self [us] | cumulative | package", nested imports are further indented
+    cumulative_microseconds = sum(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[2].rstrip() in [f" {module}" for module in modules]
+    )
+    assert cumulative_microseconds < IMPORT_TIME_BUDGET_MICROSECONDS